@@ -1,31 +1,328 @@
 from __future__ import annotations
-from typing import List, Dict, Any, Optional
+import itertools
+import os
+import time
+from functools import partial
+from collections import deque
+from typing import List, Dict, Any, Optional, Callable, Tuple, Iterator, Iterable, Deque, NamedTuple, TYPE_CHECKING
 from .checks import (
     get_passwd_info, last_logins, check_cron, check_ssh, check_processes,
     check_shell_history, check_auth_logs, check_setuid_and_world_writable,
-    check_systemd_user_units
+    check_systemd_user_units, check_owned_files, check_login_records, check_privileges
 )
-import pwd
+from .snapshot import HostSnapshot
+from .utils import rooted
+from .keys import AUTHORIZED_KEYS_FILES
+from . import metrics
 
-def audit_one_user(username: str, deep: bool = False) -> Dict[str, Any]:
+if TYPE_CHECKING:
+    from .state import StateStore
+
+DEFAULT_CHECK_TIMEOUT = 30.0
+
+# (check name, report key or None to merge the returned dict, callable, cpu_bound)
+CheckSpec = Tuple[str, Optional[str], Callable[[], Any], bool]
+
+# Cost classes, cheapest first: "cheap" checks are lookups in the host
+# snapshot plus at most a few stat() calls, "io" checks open and read a file
+# per user (history, lastlog), "expensive" ones walk a tree or fork a process
+# per user.
+COST_CLASSES = ("cheap", "io", "expensive")
+
+
+class CheckInfo(NamedTuple):
+    cost: str
+    # snapshot parts the check reads (see snapshot.SNAPSHOT_PARTS)
+    sources: Tuple[str, ...]
+    # skipped for accounts that cannot log in and have no home directory
+    login_only: bool
+    # report key for the result, None to merge the returned dict into the report
+    key: Optional[str]
+    # run(username, snap, since, state) -> result
+    run: Callable[..., Any]
+    # runs on the process pool: run must be picklable and is called with the username alone
+    cpu_bound: bool = False
+
+
+def _cached_ssh(username: str, snap: Optional[HostSnapshot], state: Optional["StateStore"]) -> Dict[str, Any]:
+    home = get_passwd_info(username, snap=snap).get("home")
+    if state is None or not home:
+        return check_ssh(username, snap=snap)
+    sshdir = os.path.join(rooted(home), ".ssh")
+    paths = [sshdir] + [os.path.join(sshdir, name) for name in AUTHORIZED_KEYS_FILES]
+    found = state.cached(username, "ssh", paths, lambda: check_ssh(username, snap=snap))
+    if snap and found.get("ssh", {}).get("authorized_keys"):
+        # sharing depends on other accounts' files, so it is never taken from the cache
+        found["ssh"]["authorized_keys"] = snap.keys.annotate(username, found["ssh"]["authorized_keys"])
+    return found
+
+
+# registry in report order; --checks/--skip-checks select from these names
+CHECKS: Dict[str, CheckInfo] = {
+    "passwd": CheckInfo("cheap", ("passwd",), False, "passwd",
+                        lambda u, snap, since, state: get_passwd_info(u, snap=snap)),
+    "last": CheckInfo("io", ("wtmp",), False, "last",
+                      lambda u, snap, since, state: last_logins(u, limit=10, snap=snap)),
+    "logins": CheckInfo("io", ("wtmp",), False, None,
+                        lambda u, snap, since, state: check_login_records(u, snap=snap)),
+    "cron": CheckInfo("cheap", ("cron",), False, None,
+                      lambda u, snap, since, state: check_cron(u, snap=snap, state=state)),
+    "ssh": CheckInfo("cheap", ("keys",), False, None,
+                     lambda u, snap, since, state: _cached_ssh(u, snap, state)),
+    "processes": CheckInfo("cheap", ("procs",), False, None,
+                           lambda u, snap, since, state: check_processes(u, snap=snap)),
+    "history": CheckInfo("io", (), True, None,
+                         lambda u, snap, since, state: check_shell_history(u, snap=snap, state=state, since=since)),
+    "auth": CheckInfo("cheap", ("auth",), False, None,
+                      lambda u, snap, since, state: check_auth_logs(u, since=since, snap=snap, state=state)),
+    # no snapshot on the process pool: the home is resolved in the worker
+    "file_checks": CheckInfo("expensive", (), True, "file_checks", check_setuid_and_world_writable, cpu_bound=True),
+    "privileges": CheckInfo("io", ("privileges", "wtmp"), False, None,
+                            lambda u, snap, since, state: check_privileges(u, snap=snap)),
+    "systemd_user": CheckInfo("expensive", (), True, None,
+                              lambda u, snap, since, state: check_systemd_user_units(u)),
+    "owned_files": CheckInfo("expensive", ("deep_scan",), False, None,
+                             lambda u, snap, since, state: check_owned_files(u, snap=snap)),
+}
+
+NOLOGIN_SHELLS = {"nologin", "false"}
+
+
+def select_checks(only: Optional[Iterable[str]] = None, skip: Optional[Iterable[str]] = None,
+                  deep: bool = False) -> List[str]:
+    """Check names to run in registry order; owned_files is only in the default set with ``deep``.
+
+    passwd is always run: it identifies the report and feeds the findings.
+    """
+    only, skip = list(only or ()), set(skip or ())
+    unknown = [n for n in only + sorted(skip) if n not in CHECKS]
+    if unknown:
+        raise ValueError(f"unknown check(s): {', '.join(unknown)} (available: {', '.join(CHECKS)})")
+    names = only or [n for n in CHECKS if deep or n != "owned_files"]
+    return [n for n in CHECKS if n == "passwd" or (n in names and n not in skip)]
+
+
+def snapshot_parts(checks: Iterable[str]) -> List[str]:
+    """The host-wide sources the given checks read."""
+    return sorted({"passwd"}.union(*(CHECKS[n].sources for n in checks)))
+
+
+def can_log_in(info: Dict[str, Any]) -> bool:
+    """False for system-style accounts: a nologin/false shell and no home directory."""
+    if os.path.basename(info.get("shell") or "") not in NOLOGIN_SHELLS:
+        return True
+    home = info.get("home")
+    return bool(home and os.path.isdir(rooted(home)))
+
+
+def _cost(spec: CheckSpec) -> int:
+    return COST_CLASSES.index(CHECKS[spec[0]].cost)
+
+
+def _short_circuit(plan: List[CheckSpec], info: Dict[str, Any]) -> Tuple[List[CheckSpec], List[str]]:
+    """Drop the login-only checks for accounts that fail the cheap can_log_in() filter."""
+    if can_log_in(info):
+        return plan, []
+    return ([s for s in plan if not CHECKS[s[0]].login_only],
+            [s[0] for s in plan if CHECKS[s[0]].login_only])
+
+
+def _check_plan(username: str, deep: bool, snap: Optional[HostSnapshot],
+                since: Optional[float] = None, state: Optional["StateStore"] = None,
+                checks: Optional[List[str]] = None) -> List[CheckSpec]:
+    """The selected checks (default: select_checks(deep=deep)) for one user, in registry order."""
+    names = set(checks if checks is not None else select_checks(deep=deep))
+    return [(name, info.key,
+             partial(info.run, username) if info.cpu_bound else partial(info.run, username, snap, since, state),
+             info.cpu_bound)
+            for name, info in CHECKS.items() if name in names]
+
+
+def _merge(out: Dict[str, Any], key: Optional[str], value: Any):
+    if key:
+        out[key] = value
+    elif isinstance(value, dict):
+        out.update(value)
+
+
+# (value, None) on success, (None, error message) on failure or "timeout"
+CheckResult = Tuple[Any, Optional[str]]
+
+
+def _run_inline(name: str, username: str, fn: Callable[[], Any], check_timeout: Optional[float],
+                end: Optional[float], starved: bool = False) -> CheckResult:
+    """Run one check on the calling thread.
+
+    It cannot be interrupted, so a check that would start after ``end`` (or
+    whose snapshot source was cut off by it) is not run, and one that overruns
+    ``check_timeout`` has its result dropped; both count as timeouts.
+    """
+    started = time.monotonic()
+    if starved or (end is not None and started >= end):
+        metrics.record(name, username, timeouts=1)
+        return None, "timeout"
+    try:
+        with metrics.track(name, username):
+            value = fn()
+    except Exception as e:
+        return None, str(e) or e.__class__.__name__
+    if check_timeout is not None and time.monotonic() - started > check_timeout:
+        metrics.record(name, username, timeouts=1)
+        return None, "timeout"
+    return value, None
+
+
+def _starved(name: str, snap: Optional[HostSnapshot]) -> bool:
+    return bool(snap and snap.missing.intersection(CHECKS[name].sources))
+
+
+def _report(plan: List[CheckSpec], results: Dict[str, CheckResult], skipped: List[str]) -> Dict[str, Any]:
+    """Merge the results in registry order, so the report shape does not depend on the schedule."""
+    out: Dict[str, Any] = {}
+    errors: Dict[str, str] = {}
+    for name, key, _, _ in plan:
+        value, error = results[name]
+        if error:
+            errors[name] = error
+        else:
+            _merge(out, key, value)
+    if skipped:
+        out["skipped"] = skipped
+    if errors:
+        out["errors"] = errors
+    return out
+
+
+def _audit_inline(username: str, plan: List[CheckSpec], skipped: List[str], snap: Optional[HostSnapshot],
+                  check_timeout: Optional[float], end: Optional[float]) -> Dict[str, Any]:
+    # cheapest first
+    results = {name: _run_inline(name, username, fn, check_timeout, end, _starved(name, snap))
+               for name, _, fn, _ in sorted(plan, key=_cost)}
+    return _report(plan, results, skipped)
+
+
+def audit_one_user(username: str, deep: bool = False, snap: Optional[HostSnapshot] = None,
+                   since: Optional[float] = None, state: Optional["StateStore"] = None,
+                   checks: Optional[List[str]] = None, check_timeout: Optional[float] = None,
+                   deadline: Optional[float] = None) -> Dict[str, Any]:
+    """Run the checks for one user serially; failures and timeouts are reported under ``errors``."""
     if not username:
         return {}
-    out = {}
-    out["passwd"] = get_passwd_info(username)
-    out["last"] = last_logins(username, limit=10)
-    out.update(check_cron(username))
-    out.update(check_ssh(username))
-    out.update(check_processes(username))
-    out.update(check_shell_history(username))
-    out.update(check_auth_logs(username))
-    out.update({"file_checks": check_setuid_and_world_writable(username)})
-    out.update(check_systemd_user_units(username))
-    # Optionally add more deep checks (file owners across filesystem) if deep=True
-    return out
+    end = time.monotonic() + deadline if deadline else None
+    plan, skipped = _short_circuit(_check_plan(username, deep, snap, since, state, checks),
+                                   get_passwd_info(username, snap=snap))
+    return _audit_inline(username, plan, skipped, snap, check_timeout, end)
+
+
+def _tracked(name: str, username: str, fn: Callable[[], Any]) -> Any:
+    with metrics.track(name, username):
+        return fn()
+
+
+def default_jobs() -> int:
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+def audit_all_users(deep: bool = False, jobs: Optional[int] = None,
+                    check_timeout: Optional[float] = DEFAULT_CHECK_TIMEOUT,
+                    deadline: Optional[float] = None, since: Optional[float] = None,
+                    state: Optional["StateStore"] = None, checks: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    return list(iter_audit_all_users(deep=deep, jobs=jobs, check_timeout=check_timeout,
+                                     deadline=deadline, since=since, state=state, checks=checks))
+
+
+def iter_audit_all_users(deep: bool = False, jobs: Optional[int] = None,
+                         check_timeout: Optional[float] = DEFAULT_CHECK_TIMEOUT,
+                         deadline: Optional[float] = None, since: Optional[float] = None,
+                         state: Optional["StateStore"] = None,
+                         checks: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    """Audit every account, yielding each result in username order as soon as it is done.
+
+    Subprocess and I/O bound checks run on a thread pool of ``jobs`` workers,
+    the home-directory scan runs on a process pool. ``check_timeout`` bounds
+    each check from the moment it is queued and ``deadline`` (seconds) the
+    whole run, snapshot included; checks that miss either, or fail, are
+    reported under the user's ``errors`` key. ``since`` (epoch) limits
+    log-based checks to that time window; with a ``state`` store unchanged
+    artifacts are skipped and logs/histories only read their delta.
+
+    ``checks`` (see select_checks) limits the run to those checks, and the
+    snapshot to the sources they read. Only ``jobs`` users are in flight at a
+    time: cheap snapshot lookups run inline before a user's io and expensive
+    checks are queued, and accounts that fail can_log_in() never queue the
+    login-only ones.
+    """
+    end = time.monotonic() + deadline if deadline else None
+    checks = checks if checks is not None else select_checks(deep=deep)
+    # collect the host-wide sources the selected checks need (ps, ss, auth logs, cron, wtmp) once
+    snap = HostSnapshot.collect(since=since, state=state, parts=snapshot_parts(checks), end=end)
+    users = sorted(snap.users)
+    jobs = jobs or default_jobs()
+    if jobs <= 1:
+        for u in users:
+            plan, skipped = _short_circuit(_check_plan(u, deep, snap, since, state, checks),
+                                           get_passwd_info(u, snap=snap))
+            yield {"username": u, "report": _audit_inline(u, plan, skipped, snap, check_timeout, end)}
+        return
+
+    # pools (and multiprocessing) are only imported when actually used
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError as FutureTimeout
+    profiling = metrics.get() is not None
+    threads = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="audit")
+    procs = ProcessPoolExecutor(max_workers=max(1, min(jobs, os.cpu_count() or 1)))
+
+    def submit(u: str):
+        plan, skipped = _short_circuit(_check_plan(u, deep, snap, since, state, checks),
+                                       get_passwd_info(u, snap=snap))
+        results: Dict[str, CheckResult] = {}
+        futs = {}
+        for name, _, fn, cpu_bound in sorted(plan, key=_cost):
+            starved = _starved(name, snap)
+            if CHECKS[name].cost == "cheap" or starved or (end is not None and time.monotonic() >= end):
+                # a dict lookup costs less than a pool round trip; late checks are not queued
+                results[name] = _run_inline(name, u, fn, check_timeout, end, starved)
+                continue
+            if not profiling:
+                fut = (procs if cpu_bound else threads).submit(fn)
+            elif cpu_bound:
+                # the child has its own metrics; it sends its counters back with the result
+                fut = procs.submit(metrics.call_tracked, name, u, fn)
+            else:
+                fut = threads.submit(_tracked, name, u, fn)
+            futs[name] = (fut, time.monotonic(), cpu_bound)
+        return u, plan, skipped, results, futs
 
-def audit_all_users(deep: bool = False) -> List[Dict[str, Any]]:
-    users = [p.pw_name for p in pwd.getpwall() if int(p.pw_uid) >= 0]
-    results = []
-    for u in users:
-        results.append({"username": u, "report": audit_one_user(u, deep=deep)})
-    return results
+    try:
+        queue = iter(users)
+        window: Deque[tuple] = deque(submit(u) for u in itertools.islice(queue, jobs))
+        while window:
+            # popped so finished reports are not kept alive after they are yielded
+            u, plan, skipped, results, futs = window.popleft()
+            nxt = next(queue, None)
+            if nxt is not None:
+                window.append(submit(nxt))
+            for name, (fut, queued, cpu_bound) in futs.items():
+                now = time.monotonic()
+                timeout = None if check_timeout is None else max(0.0, queued + check_timeout - now)
+                if end is not None:
+                    left = max(0.0, end - now)
+                    timeout = left if timeout is None else min(timeout, left)
+                try:
+                    value = fut.result(timeout=timeout)
+                    if profiling and cpu_bound:
+                        value, sample = value
+                        metrics.get().merge(name, u, sample)
+                    results[name] = (value, None)
+                except FutureTimeout:
+                    fut.cancel()
+                    results[name] = (None, "timeout")
+                    metrics.record(name, u, timeouts=1)
+                except Exception as e:
+                    results[name] = (None, str(e) or e.__class__.__name__)
+                    if cpu_bound:
+                        # thread-side failures were already counted by track()
+                        metrics.record(name, u, errors=1)
+            yield {"username": u, "report": _report(plan, results, skipped)}
+    finally:
+        threads.shutdown(wait=False, cancel_futures=True)
+        procs.shutdown(wait=False, cancel_futures=True)
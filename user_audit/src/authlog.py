@@ -0,0 +1,184 @@
+from __future__ import annotations
+import glob
+import os
+import re
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Any, Iterator, Optional
+from . import metrics
+
+# Streaming auth log reader: walks the current log backwards block by block and
+# only opens rotated (auth.log.1, auth.log.2.gz, ...) files when more lines are
+# needed, so memory is bounded by the requested tail rather than the log size.
+
+BLOCK_SIZE = 64 * 1024
+DEFAULT_TAIL_LINES = 20000
+FIRST_READ_BYTES = 4 * 1024 * 1024
+
+_SYSLOG_TS = re.compile(r"^([A-Z][a-z]{2})\s+(\d{1,2}) (\d{2}):(\d{2}):(\d{2})")
+_ISO_TS = re.compile(r"^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(\.\d+)?([+-]\d{2}:?\d{2}|Z)?")
+_MONTHS = {m: i for i, m in enumerate(
+    ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], 1)}
+
+_EVENTS = [
+    (re.compile(r"Accepted (\S+) for (\S+) from (\S+)"), "accepted"),
+    (re.compile(r"Failed (\S+) for invalid user (\S+) from (\S+)"), "failed"),
+    (re.compile(r"Failed (\S+) for (\S+) from (\S+)"), "failed"),
+    (re.compile(r"Invalid user (\S*) from (\S+)"), "invalid_user"),
+]
+
+
+def parse_since(value: Optional[str]) -> Optional[float]:
+    """'90m', '24h', '7d' or plain seconds -> epoch cut-off (None = no window); ValueError otherwise."""
+    if not value:
+        return None
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+    text = value.strip().lower()
+    mult = units.get(text[-1:])
+    try:
+        seconds = float(text[:-1]) * mult if mult else float(text)
+    except ValueError:
+        seconds = -1.0
+    if not 0 <= seconds < float("inf"):
+        raise ValueError(f"invalid time window {value!r} (expected e.g. 90m, 24h, 7d or seconds)")
+    return time.time() - seconds
+
+
+def line_time(line: str, now: Optional[float] = None) -> Optional[float]:
+    """Epoch seconds of a syslog or ISO-8601 prefixed line, None if unknown."""
+    m = _SYSLOG_TS.match(line)
+    if m:
+        mon = _MONTHS.get(m.group(1))
+        if not mon:
+            return None
+        now = now or time.time()
+        year = time.localtime(now).tm_year
+        try:
+            ts = datetime(year, mon, int(m.group(2)), int(m.group(3)), int(m.group(4)), int(m.group(5))).timestamp()
+        except ValueError:
+            return None
+        # syslog has no year: anything "in the future" belongs to last year
+        if ts > now + 86400:
+            ts = datetime(year - 1, mon, int(m.group(2)), int(m.group(3)), int(m.group(4)), int(m.group(5))).timestamp()
+        return ts
+    m = _ISO_TS.match(line)
+    if m:
+        stamp = m.group(1) + (m.group(3) or "").replace("Z", "+00:00")
+        try:
+            return datetime.fromisoformat(stamp).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+def parse_event(line: str) -> Optional[Dict[str, Any]]:
+    """Structured sshd event (user, source ip, result, method) or None."""
+    for rx, result in _EVENTS:
+        m = rx.search(line)
+        if not m:
+            continue
+        if result == "invalid_user":
+            return {"user": m.group(1), "ip": m.group(2), "result": result, "method": None}
+        return {"user": m.group(2), "ip": m.group(3), "result": result, "method": m.group(1)}
+    return None
+
+
+def rotated_files(path: str) -> List[str]:
+    """The log itself followed by its rotations, newest first."""
+    def num(p: str) -> int:
+        m = re.match(re.escape(path) + r"\.(\d+)(\.gz)?$", p)
+        return int(m.group(1)) if m else -1
+    rotations = sorted((p for p in glob.glob(path + ".*") if num(p) >= 0), key=num)
+    return ([path] if os.path.exists(path) else []) + rotations
+
+
+def reverse_lines(path: str, block_size: int = BLOCK_SIZE) -> Iterator[str]:
+    """Yield lines of ``path`` newest first without reading the whole file."""
+    if path.endswith(".gz"):
+        # gzip can't seek backwards; stream it once into a bounded window
+        import gzip
+        lines: deque = deque(maxlen=DEFAULT_TAIL_LINES)
+        try:
+            with gzip.open(path, "rt", errors="ignore") as fh:
+                for line in fh:
+                    metrics.add_bytes(len(line))
+                    lines.append(line.rstrip("\n"))
+        except Exception:
+            return
+        while lines:
+            yield lines.pop()
+        return
+    try:
+        fh = open(path, "rb")
+    except Exception:
+        return
+    with fh:
+        fh.seek(0, os.SEEK_END)
+        pos = fh.tell()
+        rest = b""
+        while pos > 0:
+            step = min(block_size, pos)
+            pos -= step
+            fh.seek(pos)
+            chunk = fh.read(step) + rest
+            metrics.add_bytes(step)
+            parts = chunk.split(b"\n")
+            rest = parts[0]
+            for raw in reversed(parts[1:]):
+                if raw:
+                    yield raw.decode("utf-8", "ignore")
+        if rest:
+            yield rest.decode("utf-8", "ignore")
+
+
+def tail_log(path: str, max_lines: int = DEFAULT_TAIL_LINES, since: Optional[float] = None) -> List[str]:
+    """Last ``max_lines`` lines of a log and its rotations, oldest first.
+
+    Rotated files are only opened when the newer ones run out; with ``since``
+    reading stops at the first line older than the window.
+    """
+    out: List[str] = []
+    now = time.time()
+    for p in rotated_files(path):
+        for line in reverse_lines(p):
+            if since is not None:
+                ts = line_time(line, now)
+                if ts is not None and ts < since:
+                    out.reverse()
+                    return out
+            out.append(line)
+            if len(out) >= max_lines:
+                out.reverse()
+                return out
+    out.reverse()
+    return out
+
+
+def read_auth_lines(path: str, since: Optional[float] = None, state=None,
+                    user: Optional[str] = None) -> List[str]:
+    """Tail of an auth log; with a StateStore only the lines appended since the last
+    run (``user``: the last run for that user alone) are read, added to the tail
+    kept from that run.
+
+    Lines of a rotated-away log stay in the kept tail, as tail_log() would
+    still find them in the rotation.
+    """
+    if state is None:
+        return tail_log(path, since=since)
+    lines, _ = state.follow(path, lambda data, _: data.decode("utf-8", "ignore").splitlines(),
+                            keep=DEFAULT_TAIL_LINES, user=user, first_read_limit=FIRST_READ_BYTES)
+    if since is not None:
+        now = time.time()
+        lines = [l for l in lines if (line_time(l, now) or since) >= since]
+    return lines
+
+
+def user_events(lines: List[str], username: str) -> List[Dict[str, Any]]:
+    events = []
+    for line in lines:
+        ev = parse_event(line)
+        if ev and ev["user"] == username:
+            ev["time"] = line_time(line)
+            events.append(ev)
+    return events
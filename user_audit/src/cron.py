@@ -0,0 +1,163 @@
+from __future__ import annotations
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Callable, TYPE_CHECKING
+from .utils import read_file_safe, rooted
+
+if TYPE_CHECKING:
+    from .state import StateStore
+
+# Cron / timer inventory built once per run: every crontab, cron.d file,
+# periodic script directory and systemd timer is parsed into entries
+# (owner, schedule, command) indexed by the user the job runs as. With a
+# StateStore (--incremental) files unchanged since the last run are not
+# re-read or re-parsed.
+
+SYSTEM_CRONTAB = "/etc/crontab"
+CRON_D = "/etc/cron.d"
+USER_SPOOLS = ["/var/spool/cron/crontabs", "/var/spool/cron"]
+PERIODIC_DIRS = {
+    "/etc/cron.hourly": "@hourly",
+    "/etc/cron.daily": "@daily",
+    "/etc/cron.weekly": "@weekly",
+    "/etc/cron.monthly": "@monthly",
+}
+SYSTEMD_DIRS = ["/etc/systemd/system", "/run/systemd/system", "/usr/lib/systemd/system", "/lib/systemd/system"]
+
+_ENV_LINE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*\s*=")
+
+
+def parse_crontab(text: str, source: str, owner: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Entries of a crontab; without ``owner`` the system format (user column) is assumed."""
+    entries = []
+    for lineno, raw in enumerate(text.splitlines(), 1):
+        line = raw.strip()
+        if not line or line.startswith("#") or _ENV_LINE.match(line):
+            continue
+        parts = line.split()
+        if parts[0].startswith("@"):
+            nsched = 1
+        elif len(parts) >= 5:
+            nsched = 5
+        else:
+            continue
+        schedule = " ".join(parts[:nsched])
+        rest = parts[nsched:]
+        user = owner
+        if owner is None:
+            if not rest:
+                continue
+            user, rest = rest[0], rest[1:]
+        if not rest:
+            continue
+        entries.append({
+            "source": source,
+            "lineno": lineno,
+            "owner": user,
+            "schedule": schedule,
+            "command": " ".join(rest),
+            "content": raw,
+        })
+    return entries
+
+
+def _unit_fields(text: str) -> Dict[str, Dict[str, List[str]]]:
+    """Minimal systemd unit parser: section -> key -> values (keys may repeat)."""
+    sections: Dict[str, Dict[str, List[str]]] = {}
+    current = sections.setdefault("", {})
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line or line[0] in "#;":
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            current = sections.setdefault(line[1:-1], {})
+            continue
+        key, sep, val = line.partition("=")
+        if sep:
+            current.setdefault(key.strip(), []).append(val.strip())
+    return sections
+
+
+def _find_unit(name: str) -> Optional[str]:
+    for d in SYSTEMD_DIRS:
+        p = rooted(os.path.join(d, name))
+        if os.path.isfile(p):
+            return p
+    return None
+
+
+class CronInventory:
+    def __init__(self, state: Optional["StateStore"] = None):
+        self.entries: List[Dict[str, Any]] = []
+        self.by_user: Dict[str, List[Dict[str, Any]]] = {}
+        self._state = state
+
+    @classmethod
+    def load(cls, timers: bool = True, state: Optional["StateStore"] = None) -> "CronInventory":
+        inv = cls(state)
+        if os.path.isfile(rooted(SYSTEM_CRONTAB)):
+            p = rooted(SYSTEM_CRONTAB)
+            inv._add(inv._parsed(p, lambda: parse_crontab(read_file_safe(p), SYSTEM_CRONTAB)))
+        for p in _files(CRON_D):
+            inv._add(inv._parsed(p, lambda: parse_crontab(read_file_safe(p), p)))
+        seen = set()
+        for spool in USER_SPOOLS:
+            for p in _files(spool):
+                owner = os.path.basename(p)
+                if owner in seen:
+                    continue
+                seen.add(owner)
+                inv._add(inv._parsed(p, lambda: parse_crontab(read_file_safe(p), p, owner=owner)))
+        for d, schedule in PERIODIC_DIRS.items():
+            for p in _files(d):
+                # run-parts skips names with dots (e.g. .placeholder, *.dpkg-old)
+                if "." in os.path.basename(p) or not os.access(p, os.X_OK):
+                    continue
+                inv._add([{"source": d, "lineno": 0, "owner": "root", "schedule": schedule,
+                           "command": p, "content": p}])
+        if timers:
+            inv._load_timers()
+        return inv
+
+    def _parsed(self, path: str, parse: Callable[[], Any]) -> Any:
+        """``parse()`` of ``path``, from the state cache while the file is unchanged."""
+        if self._state is None:
+            return parse()
+        return self._state.cached(path, "cron", [path], parse)
+
+    def _add(self, entries: List[Dict[str, Any]]):
+        for e in entries:
+            self.entries.append(e)
+            self.by_user.setdefault(e["owner"], []).append(e)
+
+    def _load_timers(self):
+        seen = set()
+        for d in SYSTEMD_DIRS:
+            for p in _files(d):
+                name = os.path.basename(p)
+                if not name.endswith(".timer") or name in seen:
+                    continue
+                seen.add(name)
+                timer = self._parsed(p, lambda: _unit_fields(read_file_safe(p))).get("Timer", {})
+                schedule = "; ".join(f"{k}={v}" for k in ("OnCalendar", "OnBootSec", "OnUnitActiveSec",
+                                                          "OnUnitInactiveSec", "OnActiveSec", "OnStartupSec")
+                                     for v in timer.get(k, []))
+                unit = (timer.get("Unit") or [name[:-len(".timer")] + ".service"])[-1]
+                service_path = _find_unit(unit)
+                service = (self._parsed(service_path, lambda: _unit_fields(read_file_safe(service_path)))
+                           .get("Service", {}) if service_path else {})
+                owner = (service.get("User") or ["root"])[-1]
+                command = "; ".join(service.get("ExecStart", [])) or unit
+                self._add([{"source": p, "lineno": 0, "owner": owner, "schedule": schedule or "-",
+                            "command": command, "content": f"{schedule or '-'} {command}"}])
+
+    def for_user(self, username: str) -> List[Dict[str, Any]]:
+        return list(self.by_user.get(username, []))
+
+
+def _files(d: str) -> List[str]:
+    try:
+        return sorted(str(p) for p in Path(rooted(d)).iterdir() if p.is_file())
+    except OSError:
+        return []
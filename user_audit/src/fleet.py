@@ -0,0 +1,325 @@
+from __future__ import annotations
+import asyncio
+import hmac
+import json
+import os
+import socket
+import time
+from typing import Dict, List, Any, Optional, AsyncIterator, Tuple
+from . import __version__
+from .constants import DEFAULT_AGENT_PORT
+
+# Fleet mode. `user-audit agent` serves this host's audit over a TCP or Unix
+# socket; `user-audit fleet` fans out to many agents with asyncio and merges
+# their streams into one cross-host view.
+#
+# Protocol: newline-delimited JSON both ways. The client sends one request
+# object per line and may send several over the same connection:
+#   {"op": "ping"}                       -> {"ok": true, "host": ..., "version": ...}
+#   {"op": "audit", "deep": false, "checks": [...], "skip_checks": [...], ...}
+#                                        -> one {"username", "report", "suspicious"}
+#                                           line per user, then {"done": true, ...}
+# Any failure is answered with {"error": "..."}.
+
+# reports are single lines and can be large
+STREAM_LIMIT = 64 * 1024 * 1024
+DEFAULT_CONCURRENCY = 32
+DEFAULT_FLEET_TIMEOUT = 300.0
+# distinct (deep, since, checks) audits kept by an agent at once
+MAX_CACHED_AUDITS = 8
+
+
+def _encode(obj: Any) -> bytes:
+    return json.dumps(obj, separators=(",", ":"), default=str).encode("utf-8") + b"\n"
+
+
+def parse_target(spec: str) -> Tuple[str, Optional[str], Optional[int]]:
+    """'host', 'host:port', '[v6]:port' or a unix socket path -> (name, host or path, port)."""
+    spec = spec.strip()
+    if spec.startswith("unix:"):
+        spec = spec[len("unix:"):]
+    if spec.startswith("/"):
+        return spec, spec, None
+    if spec.startswith("["):
+        host, _, rest = spec[1:].partition("]")
+        port = rest.lstrip(":")
+    elif spec.count(":") == 1:
+        host, _, port = spec.partition(":")
+    else:
+        host, port = spec, ""
+    return spec, host, int(port) if port else DEFAULT_AGENT_PORT
+
+
+def read_hosts(path: str) -> List[Tuple[str, Optional[str], Optional[int]]]:
+    targets, seen = [], set()
+    with open(path, "r", encoding="utf-8") as fh:
+        for line in fh:
+            line = line.split("#", 1)[0].strip()
+            if line and line not in seen:
+                seen.add(line)
+                targets.append(parse_target(line))
+    return targets
+
+
+# -- agent ------------------------------------------------------------------
+
+class Agent:
+    def __init__(self, deep: bool = False, jobs: Optional[int] = None, cache_ttl: float = 60.0,
+                 max_field_bytes: Optional[int] = None, token: Optional[str] = None):
+        self.deep = deep
+        self.jobs = jobs
+        self.cache_ttl = cache_ttl
+        self.max_field_bytes = max_field_bytes
+        self.token = token
+        self.hostname = socket.gethostname()
+        # (deep, since, checks) -> (finished_at, encoded lines); one audit at a time
+        self._cache: Dict[Tuple[bool, Optional[str], Optional[Tuple[str, ...]]], Tuple[float, List[bytes]]] = {}
+        self._lock = asyncio.Lock()
+
+    def _audit(self, deep: bool, since: Optional[str], checks: Optional[Tuple[str, ...]] = None) -> List[bytes]:
+        from .audit import iter_audit_all_users
+        from .authlog import parse_since
+        from .cli import gather_suspicious
+        from .ndjson import shrink
+        lines = []
+        for item in iter_audit_all_users(deep=deep, jobs=self.jobs, since=parse_since(since),
+                                         checks=list(checks) if checks is not None else None):
+            item["suspicious"] = gather_suspicious(item["report"])
+            lines.append(_encode(shrink(item, self.max_field_bytes)))
+        return lines
+
+    async def _lines(self, deep: bool, since: Optional[str],
+                     checks: Optional[Tuple[str, ...]] = None) -> Tuple[List[bytes], bool]:
+        key = (deep, since, checks)
+        async with self._lock:
+            now = time.monotonic()
+            # expired audits are dropped, not just ignored
+            self._cache = {k: v for k, v in self._cache.items() if now - v[0] < self.cache_ttl}
+            hit = self._cache.get(key)
+            if hit:
+                return hit[1], True
+            while len(self._cache) >= MAX_CACHED_AUDITS:
+                del self._cache[min(self._cache, key=lambda k: self._cache[k][0])]
+            lines = await asyncio.get_running_loop().run_in_executor(None, self._audit, deep, since, checks)
+            self._cache[key] = (time.monotonic(), lines)
+            return lines, False
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                raw = await reader.readline()
+                if not raw:
+                    break
+                try:
+                    req = json.loads(raw)
+                except ValueError:
+                    writer.write(_encode({"error": "bad request"}))
+                    await writer.drain()
+                    continue
+                if self.token and not hmac.compare_digest(str(req.get("token", "")), self.token):
+                    writer.write(_encode({"error": "unauthorized"}))
+                    await writer.drain()
+                    break
+                await self._dispatch(req, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, req: Dict[str, Any], writer: asyncio.StreamWriter):
+        op = req.get("op")
+        if op == "ping":
+            writer.write(_encode({"ok": True, "host": self.hostname, "version": __version__}))
+        elif op == "audit":
+            started = time.monotonic()
+            try:
+                deep = bool(req.get("deep", self.deep))
+                checks, skip = req.get("checks"), req.get("skip_checks")
+                if checks is not None or skip is not None:
+                    # resolved here, so the default set follows this agent's deep setting
+                    from .audit import select_checks
+                    checks = tuple(select_checks(checks, skip, deep=deep))
+                lines, cached = await self._lines(deep, req.get("since"), checks)
+            except Exception as e:
+                writer.write(_encode({"error": f"audit failed: {e}"}))
+            else:
+                for line in lines:
+                    writer.write(line)
+                    await writer.drain()
+                writer.write(_encode({"done": True, "host": self.hostname, "count": len(lines),
+                                      "cached": cached, "elapsed": round(time.monotonic() - started, 3)}))
+        else:
+            writer.write(_encode({"error": f"unknown op {op!r}"}))
+        await writer.drain()
+
+
+async def serve(agent: Agent, listen: str):
+    """Serve ``agent`` on 'host:port' or a unix socket path until cancelled."""
+    _, host, port = parse_target(listen)
+    if port is None:
+        if os.path.exists(host):
+            os.unlink(host)
+        # the reports are sensitive: the socket is created owner-only, with no
+        # window between bind and chmod
+        old = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(agent.handle, path=host, limit=STREAM_LIMIT)
+        finally:
+            os.umask(old)
+    else:
+        server = await asyncio.start_server(agent.handle, host=host or None, port=port, limit=STREAM_LIMIT)
+    async with server:
+        await server.serve_forever()
+
+
+# -- collector --------------------------------------------------------------
+
+class AgentClient:
+    """One persistent connection to an agent, reused for every request."""
+
+    def __init__(self, target: Tuple[str, Optional[str], Optional[int]], timeout: float = DEFAULT_FLEET_TIMEOUT,
+                 token: Optional[str] = None):
+        self.name, self.host, self.port = target
+        self.timeout = timeout
+        self.token = token
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def _connect(self):
+        if self._writer is not None and not self._writer.is_closing():
+            return
+        if self.port is None:
+            conn = asyncio.open_unix_connection(self.host, limit=STREAM_LIMIT)
+        else:
+            conn = asyncio.open_connection(self.host, self.port, limit=STREAM_LIMIT)
+        self._reader, self._writer = await asyncio.wait_for(conn, self.timeout)
+
+    async def _readline(self) -> Dict[str, Any]:
+        raw = await asyncio.wait_for(self._reader.readline(), self.timeout)
+        if not raw:
+            raise ConnectionError("agent closed the connection")
+        msg = json.loads(raw)
+        if "error" in msg:
+            raise RuntimeError(msg["error"])
+        return msg
+
+    async def _send(self, request: Dict[str, Any]):
+        await self._connect()
+        if self.token:
+            request = dict(request, token=self.token)
+        self._writer.write(_encode(request))
+        await self._writer.drain()
+
+    async def call(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        await self._send(request)
+        return await self._readline()
+
+    async def stream(self, request: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """Send ``request`` and yield response lines up to and including the final "done"."""
+        await self._send(request)
+        while True:
+            msg = await self._readline()
+            yield msg
+            if msg.get("done"):
+                return
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+            self._writer = None
+
+
+class FleetView:
+    """Cross-host merge of agent streams; keeps summaries, not full reports."""
+
+    def __init__(self, keep_reports: bool = False):
+        self.hosts: Dict[str, Dict[str, Any]] = {}
+        self.findings: List[str] = []
+        # fingerprint -> ["host/user", ...]
+        self.keys: Dict[str, List[str]] = {}
+        self.key_types: Dict[str, str] = {}
+        self.keep_reports = keep_reports
+        self.reports: Dict[str, List[Dict[str, Any]]] = {}
+
+    def host(self, name: str) -> Dict[str, Any]:
+        return self.hosts.setdefault(name, {"users": 0, "suspicious": 0, "error": None})
+
+    def add(self, name: str, item: Dict[str, Any]):
+        h = self.host(name)
+        h["users"] += 1
+        user = item.get("username", "?")
+        sus = item.get("suspicious") or []
+        h["suspicious"] += len(sus)
+        self.findings.extend(f"{name}: {s}" for s in sus)
+        report = item.get("report") or {}
+        for k in (report.get("ssh") or {}).get("authorized_keys") or []:
+            fp = k.get("fingerprint")
+            if fp:
+                self.key_types[fp] = k.get("type", "")
+                accounts = self.keys.setdefault(fp, [])
+                if not accounts or accounts[-1] != f"{name}/{user}":
+                    accounts.append(f"{name}/{user}")
+        if self.keep_reports:
+            self.reports.setdefault(name, []).append(item)
+
+    def shared_keys(self, min_accounts: int = 2) -> List[Dict[str, Any]]:
+        """Keys authorized for more than one account, most widely spread first."""
+        out = []
+        for fp, accounts in self.keys.items():
+            if len(accounts) >= min_accounts:
+                hosts = {a.rsplit("/", 1)[0] for a in accounts}
+                out.append({"fingerprint": fp, "type": self.key_types.get(fp, ""), "hosts": len(hosts),
+                            "accounts": sorted(accounts)})
+        out.sort(key=lambda k: (-k["hosts"], -len(k["accounts"]), k["fingerprint"]))
+        return out
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = {"hosts": self.hosts, "shared_keys": self.shared_keys(), "suspicious": self.findings}
+        if self.keep_reports:
+            out["reports"] = self.reports
+        return out
+
+
+async def collect(targets: List[Tuple[str, Optional[str], Optional[int]]], view: FleetView,
+                  concurrency: int = DEFAULT_CONCURRENCY, timeout: float = DEFAULT_FLEET_TIMEOUT,
+                  deep: Optional[bool] = None, since: Optional[str] = None, token: Optional[str] = None,
+                  checks: Optional[List[str]] = None, skip_checks: Optional[List[str]] = None) -> FleetView:
+    """Audit every target; ``deep`` None leaves the choice to each agent's own --deep.
+
+    ``checks``/``skip_checks`` are sent as given and resolved by each agent
+    against its own deep setting (see audit.select_checks).
+    """
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(target):
+        client = AgentClient(target, timeout=timeout, token=token)
+        h = view.host(client.name)
+        async with sem:
+            started = time.monotonic()
+            try:
+                hello = await client.call({"op": "ping"})
+                h["hostname"] = hello.get("host")
+                request: Dict[str, Any] = {"op": "audit", "since": since}
+                if deep is not None:
+                    request["deep"] = deep
+                if checks is not None:
+                    request["checks"] = checks
+                if skip_checks is not None:
+                    request["skip_checks"] = skip_checks
+                async for msg in client.stream(request):
+                    if msg.get("done"):
+                        h["cached"] = msg.get("cached", False)
+                    else:
+                        view.add(client.name, msg)
+            except (OSError, ConnectionError, asyncio.TimeoutError, ValueError, RuntimeError) as e:
+                h["error"] = str(e) or type(e).__name__
+            finally:
+                h["elapsed"] = round(time.monotonic() - started, 3)
+                await client.close()
+
+    await asyncio.gather(*(one(t) for t in targets))
+    return view
@@ -0,0 +1,168 @@
+from __future__ import annotations
+import hashlib
+import os
+import re
+from typing import Dict, List, Any, Optional, Tuple, TYPE_CHECKING
+from . import metrics
+from .matcher import SHELL_RULES
+
+if TYPE_CHECKING:
+    from .state import StateStore
+
+# Shell history reader: only the tail of a history file is read (growing the
+# window until enough commands, or commands older than --since, are in it),
+# bash `#<epoch>` and zsh extended-history timestamps are kept, and repeated
+# commands collapse into one entry with a count and a hash. Suspicious
+# commands are located by the byte offset of their last use in the file.
+
+DEFAULT_HISTORY_COMMANDS = 500
+TAIL_BLOCK = 64 * 1024
+MAX_TAIL_BYTES = 16 * 1024 * 1024
+
+_BASH_TS = re.compile(r"^#(\d{9,11})$")
+_ZSH_EXT = re.compile(r"^: (\d{9,11}):\d+;(.*)$")
+
+
+def _hash(cmd: str) -> str:
+    return hashlib.sha256(cmd.encode("utf-8", "ignore")).hexdigest()[:16]
+
+
+def split_lines(data: bytes, base: int = 0) -> Tuple[List[str], List[int]]:
+    """Decoded lines of ``data`` and the file offset of each, ``base`` being the offset of data[0]."""
+    lines: List[str] = []
+    offsets: List[int] = []
+    pos = base
+    for raw in data.split(b"\n"):
+        lines.append(raw.decode("utf-8", "ignore").rstrip("\r"))
+        offsets.append(pos)
+        pos += len(raw) + 1
+    if lines and not lines[-1]:
+        # the text after the final newline
+        lines.pop()
+        offsets.pop()
+    return lines, offsets
+
+
+def parse_history(lines: List[str], offsets: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    """[{"time", "cmd", "offset"}] oldest first from bash (optionally #epoch-stamped), zsh extended or plain lines.
+
+    ``offset`` is the file offset of the command's first line (None without ``offsets``).
+    """
+    entries: List[Dict[str, Any]] = []
+    stamp: Optional[int] = None
+    continued = False
+    for i, line in enumerate(lines):
+        if continued and entries:
+            # zsh writes multi-line commands as backslash-continued lines
+            entries[-1]["cmd"] += "\n" + line.rstrip("\\")
+            continued = line.endswith("\\")
+            continue
+        offset = offsets[i] if offsets else None
+        m = _ZSH_EXT.match(line)
+        if m:
+            entries.append({"time": int(m.group(1)), "cmd": m.group(2).rstrip("\\"), "offset": offset})
+            continued = m.group(2).endswith("\\")
+            continue
+        m = _BASH_TS.match(line)
+        if m:
+            stamp = int(m.group(1))
+            continue
+        if line.strip():
+            entries.append({"time": stamp, "cmd": line, "offset": offset})
+        stamp = None
+    return entries
+
+
+def _tail_lines(path: str, max_commands: int, since: Optional[float]) -> Dict[str, Any]:
+    """Parse a growing tail of ``path`` until it holds enough commands or reaches ``since``/the start."""
+    try:
+        size = os.path.getsize(path)
+        fh = open(path, "rb")
+    except OSError:
+        return {"entries": [], "bytes": 0, "complete": True}
+    with fh:
+        block = TAIL_BLOCK
+        while True:
+            start = max(0, size - block)
+            fh.seek(start)
+            data = fh.read(size - start)
+            metrics.add_bytes(len(data))
+            base = start
+            if start:
+                # drop the partial first line
+                cut = data.find(b"\n") + 1
+                data, base = data[cut:], start + cut
+            lines, offsets = split_lines(data, base)
+            if start:
+                # ...and a timestamp or continuation whose command was cut off
+                skip = 0
+                while skip < len(lines) and (lines[skip].endswith("\\") or _BASH_TS.match(lines[skip])):
+                    skip += 1
+                lines, offsets = lines[skip:], offsets[skip:]
+            entries = parse_history(lines, offsets)
+            first = next((e["time"] for e in entries if e["time"] is not None), None)
+            if (start == 0 or len(entries) > max_commands or block >= MAX_TAIL_BYTES
+                    or (since and first is not None and first < since)):
+                return {"entries": entries, "bytes": len(data), "complete": start == 0}
+            block *= 4
+
+
+def summarize(entries: List[Dict[str, Any]], max_commands: int, since: Optional[float]) -> Dict[str, Any]:
+    """Window the entries (last ``max_commands`` and newer than ``since``) and de-duplicate them."""
+    if since:
+        # untimestamped commands cannot be placed in time and are kept
+        entries = [e for e in entries if e["time"] is None or e["time"] >= since]
+    window = entries[-max_commands:] if max_commands else entries
+    unique: Dict[str, Dict[str, Any]] = {}
+    # file offset of each command's most recent use
+    offsets: Dict[str, Optional[int]] = {}
+    for e in window:
+        u = unique.pop(e["cmd"], None)
+        if u is None:
+            u = {"cmd": e["cmd"], "hash": _hash(e["cmd"]), "count": 0, "last": None}
+        u["count"] += 1
+        u["last"] = e["time"] if e["time"] is not None else u["last"]
+        offsets[e["cmd"]] = e.get("offset")
+        # re-insert so iteration order is by most recent use
+        unique[e["cmd"]] = u
+    commands = list(unique.values())
+    suspicious = []
+    flagged = set()
+    # one pass over all commands; Match.line is the 1-based index into commands
+    for m in SHELL_RULES.scan_lines(u["cmd"] for u in commands):
+        if m.line in flagged:
+            continue
+        flagged.add(m.line)
+        u = commands[m.line - 1]
+        suspicious.append({"indicator": m.indicator.strip(), "hash": u["hash"], "last": u["last"],
+                           "offset": offsets[u["cmd"]], "column": m.column})
+    return {
+        "commands": commands,
+        "total": len(window),
+        "unique": len(commands),
+        "truncated": len(entries) > len(window),
+        "suspicious": suspicious,
+    }
+
+
+def read_history(path: str, max_commands: int = DEFAULT_HISTORY_COMMANDS, since: Optional[float] = None,
+                 state: Optional["StateStore"] = None, user: Optional[str] = None) -> Dict[str, Any]:
+    """Bounded, de-duplicated view of one history file.
+
+    With ``state`` only the commands added since the last run (``user``: the
+    last run for that user alone) are read; the commands kept from that run
+    fill the rest of the window.
+    """
+    if state is not None:
+        # one more than the window, so "truncated" is still reported on later runs
+        keep = max_commands + 1 if max_commands else None
+        entries, read = state.follow(path, lambda data, start: parse_history(*split_lines(data, start)),
+                                     keep=keep, user=user, first_read_limit=MAX_TAIL_BYTES, restart_drops=True)
+        out = summarize(entries, max_commands, since)
+        out["bytes_read"] = read
+    else:
+        tail = _tail_lines(path, max_commands, since)
+        out = summarize(tail["entries"], max_commands, since)
+        out["bytes_read"] = tail["bytes"]
+        out["truncated"] = out["truncated"] or not tail["complete"]
+    return out
@@ -0,0 +1,259 @@
+from __future__ import annotations
+import base64
+import binascii
+import hashlib
+import os
+import struct
+from typing import Dict, List, Any, Optional, Tuple, TYPE_CHECKING
+from .utils import read_file_safe
+
+if TYPE_CHECKING:
+    from .state import StateStore
+
+# authorized_keys parsing: every key blob is base64-decoded once to get its
+# SHA256 fingerprint (as printed by ssh-keygen -l), type, bit length and
+# options. Reports keep the fingerprint, never the key text, and a
+# fingerprint -> users index finds keys shared between accounts.
+
+AUTHORIZED_KEYS_FILES = ("authorized_keys", "authorized_keys2")
+WEAK_RSA_BITS = 2048
+
+KEY_TYPES = (
+    "ssh-rsa", "ssh-dss", "ssh-ed25519", "ssh-ed448",
+    "ecdsa-sha2-nistp256", "ecdsa-sha2-nistp384", "ecdsa-sha2-nistp521",
+    "sk-ssh-ed25519@openssh.com", "sk-ecdsa-sha2-nistp256@openssh.com",
+)
+CERT_SUFFIX = "-cert-v01@openssh.com"
+_CURVE_BITS = {"nistp256": 256, "nistp384": 384, "nistp521": 521}
+# public key fields after the type string (certificates add a nonce first)
+_KEY_FIELDS = {
+    "ssh-rsa": 2, "ssh-dss": 4, "ssh-ed25519": 1, "ssh-ed448": 1,
+    "ecdsa-sha2-nistp256": 2, "ecdsa-sha2-nistp384": 2, "ecdsa-sha2-nistp521": 2,
+    "sk-ssh-ed25519@openssh.com": 2, "sk-ecdsa-sha2-nistp256@openssh.com": 3,
+}
+# sshd refuses smaller RSA moduli, so such a line cannot be a usable key
+MIN_RSA_BITS = 1024
+
+
+def _is_key_type(tok: str) -> bool:
+    return tok in KEY_TYPES or tok.endswith(CERT_SUFFIX)
+
+
+def _ssh_string(blob: bytes, pos: int) -> Tuple[bytes, int]:
+    (n,) = struct.unpack_from(">I", blob, pos)
+    end = pos + 4 + n
+    if end > len(blob):
+        raise ValueError("truncated key blob")
+    return blob[pos + 4:end], end
+
+
+def _bits(ktype: str, blob: bytes) -> int:
+    """Bit length from the fully parsed key blob; ValueError if it is truncated or malformed."""
+    cert = ktype.endswith(CERT_SUFFIX)
+    base = ktype[:-len(CERT_SUFFIX)] if cert else ktype
+    if base not in _KEY_FIELDS:
+        raise ValueError("unsupported key type")
+    fields = []
+    try:
+        _, pos = _ssh_string(blob, 0)
+        if cert:
+            _nonce, pos = _ssh_string(blob, pos)
+        for _ in range(_KEY_FIELDS[base]):
+            field, pos = _ssh_string(blob, pos)
+            fields.append(field)
+    except struct.error:
+        raise ValueError("truncated key blob")
+    # a certificate continues with serial, principals, validity, signature...
+    if not cert and pos != len(blob):
+        raise ValueError("trailing data in key blob")
+    if base == "ssh-rsa":
+        bits = int.from_bytes(fields[1], "big").bit_length()
+        if bits < MIN_RSA_BITS:
+            raise ValueError(f"RSA modulus too short ({bits} bits)")
+        return bits
+    if base == "ssh-dss":
+        bits = int.from_bytes(fields[0], "big").bit_length()
+        if bits < MIN_RSA_BITS:
+            raise ValueError(f"DSA modulus too short ({bits} bits)")
+        return bits
+    if "ed25519" in base or base == "ssh-ed448":
+        size = 32 if "ed25519" in base else 57
+        if len(fields[0]) != size:
+            raise ValueError("bad public key length")
+        return 256 if size == 32 else 456
+    curve = base.split("-")[-1].split("@")[0]
+    coord = (_CURVE_BITS[curve] + 7) // 8
+    point = fields[1]
+    if fields[0].decode("ascii", "replace") != curve or not (
+            (len(point) == 1 + 2 * coord and point[:1] == b"\x04")
+            or (len(point) == 1 + coord and point[:1] in (b"\x02", b"\x03"))):
+        raise ValueError("bad curve point")
+    return _CURVE_BITS[curve]
+
+
+def _split_options(line: str) -> Tuple[str, str]:
+    """Split the leading options field (commas, double-quoted values) from the rest of the line."""
+    quoted = False
+    for i, ch in enumerate(line):
+        if ch == '"' and (i == 0 or line[i - 1] != "\\"):
+            quoted = not quoted
+        elif ch in " \t" and not quoted:
+            return line[:i], line[i:].lstrip()
+    return line, ""
+
+
+def _parse_options(field: str) -> Dict[str, Any]:
+    opts: Dict[str, Any] = {}
+    parts, cur, quoted = [], [], False
+    for i, ch in enumerate(field):
+        if ch == '"' and (i == 0 or field[i - 1] != "\\"):
+            quoted = not quoted
+        if ch == "," and not quoted:
+            parts.append("".join(cur))
+            cur = []
+        else:
+            cur.append(ch)
+    parts.append("".join(cur))
+    for part in filter(None, parts):
+        name, sep, value = part.partition("=")
+        name = name.lower()
+        if not sep:
+            opts[name] = True
+            continue
+        value = value[1:-1].replace('\\"', '"') if value.startswith('"') and value.endswith('"') else value
+        # permitopen / environment may repeat
+        if name in opts and name in ("permitopen", "permitlisten", "environment"):
+            prev = opts[name]
+            opts[name] = (prev if isinstance(prev, list) else [prev]) + [value]
+        else:
+            opts[name] = value
+    return opts
+
+
+def parse_key_line(line: str) -> Optional[Dict[str, Any]]:
+    """One authorized_keys line -> key info; None for blanks/comments, {"error": ...} if unparseable."""
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    options: Dict[str, Any] = {}
+    first = line.split(None, 1)[0]
+    if not _is_key_type(first):
+        field, line = _split_options(line)
+        options = _parse_options(field)
+    parts = line.split(None, 2)
+    if len(parts) < 2 or not _is_key_type(parts[0]):
+        return {"error": "no key type"}
+    ktype, b64 = parts[0], parts[1]
+    try:
+        blob = base64.b64decode(b64, validate=True)
+        embedded, _ = _ssh_string(blob, 0)
+    except (binascii.Error, struct.error, ValueError):
+        return {"error": "bad base64 key blob", "type": ktype}
+    if embedded.decode("ascii", "replace") != ktype:
+        return {"error": "key type does not match blob", "type": ktype}
+    try:
+        bits = _bits(ktype, blob)
+    except ValueError as e:
+        return {"error": str(e), "type": ktype}
+    fp = base64.b64encode(hashlib.sha256(blob).digest()).decode("ascii").rstrip("=")
+    return {
+        "fingerprint": f"SHA256:{fp}",
+        "type": ktype,
+        "bits": bits,
+        "comment": parts[2] if len(parts) > 2 else "",
+        "options": options,
+    }
+
+
+def parse_authorized_keys(text: str) -> Tuple[List[Dict[str, Any]], List[int]]:
+    """(keys, line numbers that could not be parsed)."""
+    keys, invalid = [], []
+    for lineno, line in enumerate((text or "").splitlines(), 1):
+        k = parse_key_line(line)
+        if k is None:
+            continue
+        if "error" in k:
+            invalid.append(lineno)
+            continue
+        k["line"] = lineno
+        keys.append(k)
+    return keys, invalid
+
+
+def key_problems(k: Dict[str, Any]) -> List[str]:
+    """Weak algorithms / sizes and forced commands on one parsed key."""
+    out = []
+    if k["type"] == "ssh-dss":
+        out.append("DSA key (deprecated)")
+    elif k["type"] == "ssh-rsa" and k.get("bits") and k["bits"] < WEAK_RSA_BITS:
+        out.append(f"weak RSA key ({k['bits']} bits)")
+    command = k.get("options", {}).get("command")
+    if command:
+        out.append(f"forced command '{command}'")
+    return out
+
+
+def read_user_keys(home: str) -> Dict[str, Any]:
+    """Parse every authorized_keys file under ``home``/.ssh."""
+    keys, invalid, files = [], [], []
+    for name in AUTHORIZED_KEYS_FILES:
+        path = os.path.join(home, ".ssh", name)
+        if not os.path.isfile(path):
+            continue
+        files.append(path)
+        parsed, bad = parse_authorized_keys(read_file_safe(path))
+        for k in parsed:
+            k["file"] = name
+        keys.extend(parsed)
+        invalid.extend(f"{name}:{n}" for n in bad)
+    return {"keys": keys, "invalid": invalid, "files": files}
+
+
+class KeyIndex:
+    def __init__(self):
+        self.by_user: Dict[str, Dict[str, Any]] = {}
+        self.by_fingerprint: Dict[str, List[str]] = {}
+
+    @classmethod
+    def load(cls, homes: Dict[str, str], state: Optional["StateStore"] = None) -> "KeyIndex":
+        """``homes`` maps username -> home; homes shared by several accounts are read once.
+
+        With ``state``, a home whose .ssh directory and key files are unchanged
+        since the last run reuses the stored parse instead of re-reading them.
+        """
+        idx = cls()
+        parsed: Dict[str, Dict[str, Any]] = {}
+        for user, home in homes.items():
+            if not home:
+                continue
+            if home not in parsed:
+                if state is None:
+                    parsed[home] = read_user_keys(home)
+                else:
+                    sshdir = os.path.join(home, ".ssh")
+                    paths = [sshdir] + [os.path.join(sshdir, name) for name in AUTHORIZED_KEYS_FILES]
+                    parsed[home] = state.cached(home, "keys", paths, lambda: read_user_keys(home))
+            idx.add(user, parsed[home])
+        return idx
+
+    def add(self, username: str, entry: Dict[str, Any]):
+        self.by_user[username] = entry
+        for fp in {k["fingerprint"] for k in entry["keys"]}:
+            self.by_fingerprint.setdefault(fp, []).append(username)
+
+    def for_user(self, username: str) -> Optional[Dict[str, Any]]:
+        return self.by_user.get(username)
+
+    def annotate(self, username: str, keys: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Copies of ``keys`` with the other accounts that authorize the same key."""
+        out = []
+        for k in keys:
+            k = {f: v for f, v in k.items() if f != "shared_with"}
+            others = [u for u in self.by_fingerprint.get(k["fingerprint"], ()) if u != username]
+            if others:
+                k["shared_with"] = sorted(others)
+            out.append(k)
+        return out
+
+    def shared(self) -> Dict[str, List[str]]:
+        return {fp: users for fp, users in self.by_fingerprint.items() if len(users) > 1}
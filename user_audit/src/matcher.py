@@ -0,0 +1,73 @@
+from __future__ import annotations
+import re
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+# All indicators of a rule set are compiled into one alternation regex with a
+# named group per indicator, so content is scanned once regardless of how many
+# indicators there are (instead of one `in` scan per indicator).
+
+
+class Match(NamedTuple):
+    indicator: str
+    label: str
+    line: int      # 1-based line number
+    column: int    # 0-based offset within the line
+    offset: int    # 0-based offset within the scanned text
+
+
+class RuleSet:
+    def __init__(self, rules: Iterable[Tuple[str, str]], ignore_case: bool = False):
+        """``rules`` is a list of (indicator substring, label)."""
+        self.rules: List[Tuple[str, str]] = list(rules)
+        alternation = "|".join(f"(?P<r{i}>{re.escape(ind)})" for i, (ind, _) in enumerate(self.rules))
+        self._rx = re.compile(alternation, re.IGNORECASE if ignore_case else 0)
+
+    def _match(self, m: "re.Match", line: int, line_start: int, base: int = 0) -> Match:
+        indicator, label = self.rules[int(m.lastgroup[1:])]
+        return Match(indicator, label, line, m.start() - line_start, base + m.start())
+
+    def search(self, text: str) -> Optional[Match]:
+        """First match in ``text`` (stops scanning there)."""
+        m = self._rx.search(text)
+        if not m:
+            return None
+        line_start = text.rfind("\n", 0, m.start()) + 1
+        return self._match(m, text.count("\n", 0, m.start()) + 1, line_start)
+
+    def scan(self, text: str) -> Iterator[Match]:
+        """Every match in ``text`` with line numbers, in one pass."""
+        line, line_start, pos = 1, 0, 0
+        for m in self._rx.finditer(text):
+            nl = text.count("\n", pos, m.start())
+            if nl:
+                line += nl
+                line_start = text.rfind("\n", pos, m.start()) + 1
+            pos = m.start()
+            yield self._match(m, line, line_start)
+
+    def scan_lines(self, lines: Iterable[str]) -> Iterator[Match]:
+        """Like scan() but over a stream of lines (e.g. an open file)."""
+        offset = 0
+        for lineno, text in enumerate(lines, 1):
+            for m in self._rx.finditer(text):
+                yield self._match(m, lineno, 0, offset)
+            offset += len(text) + (0 if text.endswith("\n") else 1)
+
+    def labels(self, text: str) -> Dict[str, Match]:
+        """First match per label."""
+        found: Dict[str, Match] = {}
+        for m in self.scan(text):
+            found.setdefault(m.label, m)
+            if len(found) == len({l for _, l in self.rules}):
+                break
+        return found
+
+
+SHELL_RULES = RuleSet([(s, "command") for s in
+                       ["nc ", "netcat", "curl ", "wget ", "python -c", "bash -i", "perl -e", "openssl s_client"]],
+                      ignore_case=True)
+CRON_RULES = RuleSet([(s, "downloader") for s in
+                      ["curl ", "wget ", "nc ", "netcat", "bash -i", "python -c", "perl -e"]])
+AUTH_RULES = RuleSet([("failed password", "failure"), ("invalid user", "failure"),
+                      ("accepted password", "success"), ("accepted publickey", "success")],
+                     ignore_case=True)
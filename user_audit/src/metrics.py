@@ -0,0 +1,164 @@
+from __future__ import annotations
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Opt-in instrumentation (`--profile`, `--metrics-json`, `--metrics-prom`).
+# Each check runs inside track(check, user), which records wall and CPU time;
+# run_cmd and the file readers attribute subprocesses, timeouts and bytes read
+# to whatever check is running on the current thread. While disabled every
+# hook is a single global lookup.
+
+FIELDS = ("calls", "wall", "cpu", "bytes_read", "subprocesses", "timeouts", "errors")
+
+_metrics: Optional["Metrics"] = None
+_local = threading.local()
+
+
+def _empty() -> Dict[str, float]:
+    return {f: 0 for f in FIELDS}
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (check, user) -> counters; user is None for host-wide work
+        self.samples: Dict[Tuple[str, Optional[str]], Dict[str, float]] = {}
+
+    def add(self, check: str, user: Optional[str], **values: float):
+        with self._lock:
+            s = self.samples.setdefault((check, user), _empty())
+            for k, v in values.items():
+                s[k] += v
+
+    def merge(self, check: str, user: Optional[str], sample: Dict[str, float]):
+        self.add(check, user, **{k: v for k, v in sample.items() if k in FIELDS})
+
+    # -- aggregation --------------------------------------------------------
+
+    def by_check(self) -> List[Tuple[str, Dict[str, float]]]:
+        """Per-check totals, most expensive (wall time) first."""
+        totals: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            for (check, _), s in self.samples.items():
+                t = totals.setdefault(check, _empty())
+                for k in FIELDS:
+                    t[k] += s[k]
+        return sorted(totals.items(), key=lambda kv: kv[1]["wall"], reverse=True)
+
+    def by_user(self) -> Dict[str, Dict[str, float]]:
+        totals: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            for (_, user), s in self.samples.items():
+                t = totals.setdefault(user or "(host)", _empty())
+                for k in FIELDS:
+                    t[k] += s[k]
+        return totals
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "checks": {c: _rounded(s) for c, s in self.by_check()},
+            "users": {u: _rounded(s) for u, s in sorted(self.by_user().items())},
+        }
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition (node_exporter textfile collector format)."""
+        names = {
+            "calls": ("user_audit_check_calls_total", "Number of times a check ran"),
+            "wall": ("user_audit_check_wall_seconds_total", "Wall-clock seconds spent in a check"),
+            "cpu": ("user_audit_check_cpu_seconds_total", "CPU seconds spent in a check"),
+            "bytes_read": ("user_audit_check_bytes_read_total", "Bytes read from files and subprocesses"),
+            "subprocesses": ("user_audit_check_subprocesses_total", "Subprocesses spawned"),
+            "timeouts": ("user_audit_check_timeouts_total", "Subprocess or check timeouts"),
+            "errors": ("user_audit_check_errors_total", "Errors raised or returned"),
+        }
+        rows = self.by_check()
+        out = []
+        for field in FIELDS:
+            name, help_text = names[field]
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} counter")
+            for check, s in rows:
+                out.append(f'{name}{{check="{check}"}} {s[field]:.6g}')
+        return "\n".join(out) + "\n"
+
+
+def _rounded(s: Dict[str, float]) -> Dict[str, float]:
+    return {k: (round(v, 6) if isinstance(v, float) else v) for k, v in s.items()}
+
+
+def enable() -> Metrics:
+    global _metrics
+    _metrics = Metrics()
+    return _metrics
+
+
+def disable():
+    global _metrics
+    _metrics = None
+
+
+def get() -> Optional[Metrics]:
+    return _metrics
+
+
+def _current() -> Optional[Tuple[str, Optional[str]]]:
+    return getattr(_local, "scope", None)
+
+
+@contextmanager
+def track(check: str, user: Optional[str] = None) -> Iterator[None]:
+    m = _metrics
+    if m is None:
+        yield
+        return
+    prev = _current()
+    _local.scope = (check, user)
+    wall, cpu = time.perf_counter(), time.thread_time()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        _local.scope = prev
+        m.add(check, user, calls=1, wall=time.perf_counter() - wall,
+              cpu=time.thread_time() - cpu, errors=1 if failed else 0)
+
+
+def _scoped_add(**values: float):
+    m = _metrics
+    if m is None:
+        return
+    scope = _current() or ("(untracked)", None)
+    m.add(scope[0], scope[1], **values)
+
+
+def add_bytes(n: int):
+    if _metrics is not None and n:
+        _scoped_add(bytes_read=n)
+
+
+def record_subprocess(rc: int, out_bytes: int = 0):
+    if _metrics is not None:
+        _scoped_add(subprocesses=1, bytes_read=out_bytes,
+                    timeouts=1 if rc == 124 else 0, errors=1 if rc not in (0, 124) else 0)
+
+
+def record(check: str, user: Optional[str], **values: float):
+    """Count something against a check from outside it (e.g. a scheduler timeout)."""
+    if _metrics is not None:
+        _metrics.add(check, user, **values)
+
+
+def call_tracked(check: str, user: Optional[str], fn: Callable[[], Any]) -> Tuple[Any, Dict[str, float]]:
+    """Run ``fn`` in a worker process and return (result, counters) for the parent to merge."""
+    enable()
+    try:
+        with track(check, user):
+            result = fn()
+        return result, _metrics.samples.get((check, user), _empty())
+    finally:
+        disable()
@@ -0,0 +1,234 @@
+from __future__ import annotations
+import hashlib
+import json
+import re
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, List, Any, Optional
+
+# Typed, slotted report model. The checks still return plain dicts; a report
+# that has to be kept (whole-document --json/--output for --all) is converted
+# once into these objects, which hold the high-cardinality parts (processes,
+# sockets, keys, cron entries) as small slotted records with interned strings
+# instead of nested dicts and ps/ss-style lines. to_dict() rebuilds the
+# existing JSON shape; dumps()/loads() are a compact positional encoding.
+
+MODEL_VERSION = 1
+
+# slots=True needs Python 3.10; older interpreters get regular dataclasses
+_slotted = dataclass(slots=True) if sys.version_info >= (3, 10) else dataclass
+
+_intern = sys.intern
+_SOCKET_ROW = re.compile(r'^(\S+) (\S+) (\S+) (\S+) users:\(\("(.*)",pid=(\d+),fd=(\d+)\)\)$')
+
+
+def _digest(text: str) -> Dict[str, Any]:
+    data = text.encode("utf-8", "ignore")
+    return {"sha256": hashlib.sha256(data).hexdigest(), "bytes": len(data)}
+
+
+@_slotted
+class ProcessInfo:
+    pid: int
+    ppid: int
+    cmd: str
+    cpu: float
+    mem: float
+
+    @classmethod
+    def from_row(cls, row: str) -> "ProcessInfo":
+        """Parse a `pid ppid cmd %cpu %mem` line (the ProcTable/ps column order)."""
+        parts = row.split(None, 2)
+        try:
+            cmd, cpu, mem = parts[2].rsplit(None, 2)
+            return cls(int(parts[0]), int(parts[1]), _intern(cmd), float(cpu), float(mem))
+        except (ValueError, IndexError):
+            # unparseable lines are kept verbatim (pid -1)
+            return cls(-1, -1, row, 0.0, 0.0)
+
+    def to_row(self) -> str:
+        if self.pid < 0:
+            return self.cmd
+        return f"{self.pid} {self.ppid} {self.cmd} {self.cpu} {self.mem}"
+
+
+@_slotted
+class SocketInfo:
+    proto: str
+    state: str
+    local: str
+    remote: str
+    process: str
+    pid: int
+    fd: int
+
+    @classmethod
+    def from_row(cls, row: str) -> "SocketInfo":
+        m = _SOCKET_ROW.match(row)
+        if not m:
+            # unparseable lines are kept verbatim (pid -1)
+            return cls("", "", row, "", "", -1, -1)
+        proto, state, local, remote, name, pid, fd = m.groups()
+        return cls(_intern(proto), _intern(state), _intern(local), _intern(remote), _intern(name), int(pid), int(fd))
+
+    def to_row(self) -> str:
+        if self.pid < 0:
+            return self.local
+        return (f"{self.proto} {self.state} {self.local} {self.remote} "
+                f"users:((\"{self.process}\",pid={self.pid},fd={self.fd}))")
+
+
+@_slotted
+class KeyInfo:
+    fingerprint: str
+    type: str
+    bits: Optional[int]
+    comment: str
+    options: Dict[str, Any]
+    line: int
+    file: str
+    shared_with: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "KeyInfo":
+        return cls(d["fingerprint"], _intern(d.get("type", "")), d.get("bits"), d.get("comment", ""),
+                   d.get("options") or {}, d.get("line", 0), _intern(d.get("file", "")),
+                   [_intern(u) for u in d.get("shared_with") or ()])
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = {"fingerprint": self.fingerprint, "type": self.type, "bits": self.bits, "comment": self.comment,
+             "options": self.options, "line": self.line, "file": self.file}
+        if self.shared_with:
+            d["shared_with"] = self.shared_with
+        return d
+
+
+@_slotted
+class CronEntry:
+    source: str
+    lineno: int
+    owner: str
+    schedule: str
+    # without keep_raw the command is dropped and content is the line's sha256 digest
+    command: Optional[str]
+    content: Any = None
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any], keep_raw: bool = True) -> "CronEntry":
+        content = d.get("content")
+        return cls(_intern(d.get("source", "")), d.get("lineno", 0), _intern(d.get("owner", "")),
+                   _intern(d.get("schedule", "")), d.get("command", "") if keep_raw else None,
+                   content if keep_raw else _digest(content or ""))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"source": self.source, "lineno": self.lineno, "owner": self.owner, "schedule": self.schedule,
+                "command": self.command, "content": self.content}
+
+
+@_slotted
+class Finding:
+    username: str
+    message: str
+
+    def __str__(self) -> str:
+        return self.message
+
+
+@_slotted
+class UserReport:
+    username: str
+    processes: List[ProcessInfo] = field(default_factory=list)
+    sockets: List[SocketInfo] = field(default_factory=list)
+    keys: List[KeyInfo] = field(default_factory=list)
+    crons: List[CronEntry] = field(default_factory=list)
+    findings: List[Finding] = field(default_factory=list)
+    # remaining report sections in their original shape and order; typed
+    # sections keep a None placeholder so to_dict() preserves key order
+    sections: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, username: str, report: Dict[str, Any], findings: Optional[List[str]] = None,
+                  keep_raw: bool = True) -> "UserReport":
+        """Convert a check-result dict; without ``keep_raw`` file contents are replaced by their sha256."""
+        username = _intern(username)
+        r = cls(username)
+        for key, value in report.items():
+            if key == "processes":
+                r.processes = [ProcessInfo.from_row(row) for row in value or ()]
+                value = None
+            elif key == "network_connections":
+                r.sockets = [SocketInfo.from_row(row) for row in value or ()]
+                value = None
+            elif key == "crons":
+                r.crons = [CronEntry.from_dict(c, keep_raw) for c in value or ()]
+                value = None
+            elif key == "ssh" and isinstance(value, dict) and "authorized_keys" in value:
+                r.keys = [KeyInfo.from_dict(k) for k in value["authorized_keys"] or ()]
+                value = {k: (None if k == "authorized_keys" else v) for k, v in value.items()}
+            elif not keep_raw and key == "history" and isinstance(value, dict):
+                # commands already carry their hash; drop the text
+                value = {p: dict(h, commands=[{f: v for f, v in c.items() if f != "cmd"} for c in h.get("commands") or ()])
+                         if isinstance(h, dict) else h for p, h in value.items()}
+            elif not keep_raw and key == "auth" and isinstance(value, list):
+                value = [dict(a, content=_digest(a.get("content") or "")) for a in value]
+            r.sections[_intern(key)] = value
+        r.findings = [Finding(username, msg) for msg in findings or ()]
+        return r
+
+    @property
+    def passwd(self) -> Dict[str, Any]:
+        return self.sections.get("passwd") or {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The report in the dict/JSON shape the checks produce."""
+        out: Dict[str, Any] = {}
+        for key, value in self.sections.items():
+            if key == "processes":
+                value = [p.to_row() for p in self.processes]
+            elif key == "network_connections":
+                value = [s.to_row() for s in self.sockets]
+            elif key == "crons":
+                value = [c.to_dict() for c in self.crons]
+            elif key == "ssh" and isinstance(value, dict) and "authorized_keys" in value:
+                value = dict(value, authorized_keys=[k.to_dict() for k in self.keys])
+            out[key] = value
+        return out
+
+    # -- compact encoding ---------------------------------------------------
+    # one JSON array per report with records as positional lists; about half
+    # the size of the dict shape and decoded without per-key lookups
+
+    def to_row(self) -> List[Any]:
+        return [
+            MODEL_VERSION, self.username,
+            [[p.pid, p.ppid, p.cmd, p.cpu, p.mem] for p in self.processes],
+            [[s.proto, s.state, s.local, s.remote, s.process, s.pid, s.fd] for s in self.sockets],
+            [[k.fingerprint, k.type, k.bits, k.comment, k.options, k.line, k.file, k.shared_with] for k in self.keys],
+            [[c.source, c.lineno, c.owner, c.schedule, c.command, c.content] for c in self.crons],
+            [f.message for f in self.findings],
+            self.sections,
+        ]
+
+    @classmethod
+    def from_row(cls, row: List[Any]) -> "UserReport":
+        version, username, procs, socks, keys, crons, findings, sections = row
+        if version != MODEL_VERSION:
+            raise ValueError(f"unsupported report encoding version {version}")
+        username = _intern(username)
+        return cls(
+            username,
+            [ProcessInfo(p[0], p[1], _intern(p[2]), p[3], p[4]) for p in procs],
+            [SocketInfo(*map(_intern, s[:5]), s[5], s[6]) for s in socks],
+            [KeyInfo(k[0], _intern(k[1]), *k[2:6], _intern(k[6]), k[7]) for k in keys],
+            [CronEntry(_intern(c[0]), c[1], _intern(c[2]), _intern(c[3]), c[4], c[5]) for c in crons],
+            [Finding(username, f) for f in findings],
+            {_intern(k): v for k, v in sections.items()},
+        )
+
+
+def dumps(report: UserReport) -> bytes:
+    return json.dumps(report.to_row(), separators=(",", ":"), default=str).encode("utf-8")
+
+
+def loads(data: bytes) -> UserReport:
+    return UserReport.from_row(json.loads(data))
@@ -0,0 +1,66 @@
+from __future__ import annotations
+import gzip
+import hashlib
+import json
+import sys
+from typing import Any, Optional, IO
+
+# Streaming report writer: one JSON object per line, written as soon as a
+# user's audit completes, instead of one indented document at the very end.
+
+
+def shrink(obj: Any, max_bytes: Optional[int] = None, hash_large: bool = False) -> Any:
+    """Truncate (or replace by their sha256) strings longer than ``max_bytes``."""
+    if max_bytes is None:
+        return obj
+    if isinstance(obj, str):
+        if len(obj) <= max_bytes:
+            return obj
+        data = obj.encode("utf-8", "ignore")
+        if len(data) <= max_bytes:
+            return obj
+        if hash_large:
+            return {"sha256": hashlib.sha256(data).hexdigest(), "bytes": len(data)}
+        return data[:max_bytes].decode("utf-8", "ignore") + f"...[{len(data) - max_bytes} bytes truncated]"
+    if isinstance(obj, dict):
+        return {k: shrink(v, max_bytes, hash_large) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [shrink(v, max_bytes, hash_large) for v in obj]
+    return obj
+
+
+class NDJSONWriter:
+    def __init__(self, path: str, max_field_bytes: Optional[int] = None, hash_large: bool = False,
+                 compress: Optional[bool] = None):
+        """``path`` '-' writes to stdout; ``compress`` defaults to path ending in .gz."""
+        self.max_field_bytes = max_field_bytes
+        self.hash_large = hash_large
+        self.count = 0
+        if compress is None:
+            compress = path.endswith(".gz")
+        self._owned = path != "-"
+        if not self._owned:
+            self._fh: IO = gzip.GzipFile(fileobj=sys.stdout.buffer, mode="wb") if compress else sys.stdout.buffer
+        elif compress:
+            self._fh = gzip.open(path, "wb")
+        else:
+            self._fh = open(path, "wb")
+
+    def write(self, record: Any):
+        record = shrink(record, self.max_field_bytes, self.hash_large)
+        self._fh.write(json.dumps(record, separators=(",", ":"), default=str).encode("utf-8") + b"\n")
+        self.count += 1
+        if not self._owned:
+            self._fh.flush()
+
+    def close(self):
+        if self._owned or isinstance(self._fh, gzip.GzipFile):
+            self._fh.close()
+        else:
+            self._fh.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
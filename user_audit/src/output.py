@@ -1,20 +1,51 @@
 from __future__ import annotations
-from typing import List, Dict, Any
-from rich.console import Console
-from rich.panel import Panel
-from rich.table import Table
-from rich.markdown import Markdown
+from typing import List, Dict, Any, IO, Iterable
+import hashlib
 import json
+import os
 from pathlib import Path
 
-console = Console()
+# rich and pyfiglet are only imported when something is actually rendered, so
+# machine-readable runs (--json / --ndjson / --output off a TTY) never pay for them.
 
-def print_banner(appname: str, version: str):
+BANNER_FONT = "slant"
+_console = None
+
+def get_console():
+    global _console
+    if _console is None:
+        from rich.console import Console
+        _console = Console()
+    return _console
+
+def _banner_cache_path(appname: str, font: str) -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    key = hashlib.sha1(f"{font}:{appname}".encode()).hexdigest()[:12]
+    return Path(base) / "user-audit" / f"banner-{key}.txt"
+
+def render_banner(appname: str, font: str = BANNER_FONT) -> str:
+    """FIGlet text for ``appname``, rendered once and cached on disk."""
+    cache = _banner_cache_path(appname, font)
+    try:
+        return cache.read_text()
+    except OSError:
+        pass
     from pyfiglet import Figlet
-    f = Figlet(font="slant")
-    console.print(Panel(f.renderText(appname), subtitle=f"v{version}"))
+    text = Figlet(font=font).renderText(appname)
+    try:
+        cache.parent.mkdir(parents=True, exist_ok=True)
+        cache.write_text(text)
+    except OSError:
+        pass
+    return text
+
+def print_banner(appname: str, version: str):
+    from rich.panel import Panel
+    get_console().print(Panel(render_banner(appname), subtitle=f"v{version}"))
 
 def print_user_summary(report: Dict[str, Any]):
+    from rich.table import Table
+    console = get_console()
     passwd = report.get("passwd", {})
     username = passwd.get("username") or "?"
     table = Table(title=f"User: {username}", show_lines=False)
@@ -36,21 +67,51 @@ def print_user_summary(report: Dict[str, Any]):
     console.print(table)
 
 def print_full_report(report: Dict[str, Any], username: str):
+    from rich.panel import Panel
+    console = get_console()
     print_user_summary(report)
     console.print(Panel("Cron entries", title="Crons"))
     for c in report.get("crons", []):
-        console.print(Panel(c.get("content","-")[:2000], title=c.get("source","cron")))
+        console.print(Panel(c.get("content","-")[:2000], title=f"{c.get('source','cron')} [{c.get('schedule','')}]"))
 
     console.print(Panel("SSH files", title="SSH"))
     ssh = report.get("ssh", {})
     if ssh:
         ak = ssh.get("authorized_keys")
         if ak:
-            console.print(Markdown("**authorized_keys (head)**"))
-            console.print(Panel(ak[:2000]))
+            from rich.table import Table
+            keys = Table(title="authorized_keys")
+            for h in ("Line", "Type", "Bits", "Fingerprint", "Options", "Comment", "Shared with"):
+                keys.add_column(h)
+            for k in ak:
+                opts = ",".join(n if v is True else f"{n}={v}" for n, v in (k.get("options") or {}).items())
+                keys.add_row(f"{k.get('file')}:{k.get('line')}", k.get("type", ""), str(k.get("bits") or "-"),
+                             k.get("fingerprint", ""), opts[:80], k.get("comment", ""),
+                             ", ".join(k.get("shared_with") or []))
+            console.print(keys)
         else:
             console.print("No authorized_keys found.")
 
+    console.print(Panel("Groups and sudo rules", title="Privileges"))
+    priv = report.get("privileges") or {}
+    if priv:
+        console.print(f"Groups: {', '.join(priv.get('groups') or []) or '-'}")
+        if priv.get("sudo"):
+            from rich.table import Table
+            sudo = Table(title="sudo")
+            for h in ("Source", "Via", "Run as", "Commands", "NOPASSWD"):
+                sudo.add_column(h)
+            for r in priv["sudo"]:
+                sudo.add_row(r["source"], r["via"], r["runas"], r["commands"][:80], "yes" if r["nopasswd"] else "")
+            console.print(sudo)
+        elif not priv.get("sudoers_readable"):
+            console.print("sudoers not readable (run as root for sudo rules).")
+        shadow = priv.get("shadow") or {}
+        ageing = priv.get("ageing") or {}
+        console.print(f"Password: {shadow.get('password', 'unknown')}, "
+                      f"age {ageing.get('password_age_days', '-')} days, "
+                      f"last login {ageing.get('days_since_login') if ageing.get('days_since_login') is not None else '-'} days ago")
+
     console.print(Panel("Processes (head)", title="Processes"))
     procs = report.get("processes", []) or []
     console.print(Panel("\n".join(procs[:50]) or "-", title="ps -u"))
@@ -59,10 +120,13 @@ def print_full_report(report: Dict[str, Any], username: str):
     n = report.get("network_connections", [])
     console.print(Panel("\n".join(n[:50]) or "-"))
 
-    console.print(Panel("Shell histories (head)", title="History"))
+    console.print(Panel("Shell histories (most recent commands)", title="History"))
     histories = report.get("history", {}) or {}
-    for path, content in histories.items():
-        console.print(Panel(f"[bold]{path}[/bold]\n" + (content[-2000:] if content else "-")))
+    for path, h in histories.items():
+        h = h or {}
+        recent = [f"{c['count']:>4}x  {c.get('cmd', c['hash'])}" for c in (h.get("commands") or [])[-50:]]
+        title = f"{path} ({h.get('unique', 0)} unique of {h.get('total', 0)})"
+        console.print(Panel("\n".join(recent) or "-", title=title))
 
     console.print(Panel("Auth logs (head)", title="Auth"))
     auths = report.get("auth", []) or []
@@ -78,6 +142,96 @@ def print_full_report(report: Dict[str, Any], username: str):
     for p in (fc.get("world_writable") or [])[:30]:
         console.print(p)
 
+def print_profile(rows: List[Any], console=None):
+    """Ranked per-check metrics; plain text on stderr when there is no rich console."""
+    header = ["Check", "Calls", "Wall s", "CPU s", "Bytes read", "Subprocs", "Timeouts", "Errors"]
+    cells = [[check, str(int(s["calls"])), f"{s['wall']:.3f}", f"{s['cpu']:.3f}", str(int(s["bytes_read"])),
+              str(int(s["subprocesses"])), str(int(s["timeouts"])), str(int(s["errors"]))] for check, s in rows]
+    if console is None:
+        import sys
+        widths = [max(len(r[i]) for r in [header] + cells) for i in range(len(header))]
+        for r in [header] + cells:
+            print("  ".join(c.ljust(w) for c, w in zip(r, widths)), file=sys.stderr)
+        return
+    from rich.table import Table
+    table = Table(title="Check profile (by wall time)")
+    for h in header:
+        table.add_column(h, justify="left" if h == "Check" else "right")
+    for r in cells:
+        table.add_row(*r)
+    console.print(table)
+
+def print_fleet(merged: Dict[str, Any]):
+    """Per-host table, keys shared across accounts and the merged findings."""
+    from rich.table import Table
+    console = get_console()
+    table = Table(title="Fleet Audit Summary")
+    for h in ("Host", "Users", "Suspicious", "Seconds", "Error"):
+        table.add_column(h)
+    for name, h in sorted(merged.get("hosts", {}).items()):
+        table.add_row(name, str(h.get("users", 0)), str(h.get("suspicious", 0)),
+                      str(h.get("elapsed", "-")), h.get("error") or "")
+    console.print(table)
+    shared = merged.get("shared_keys") or []
+    if shared:
+        keys = Table(title="Keys authorized for more than one account")
+        for h in ("Fingerprint", "Type", "Hosts", "Accounts"):
+            keys.add_column(h)
+        for k in shared[:50]:
+            accounts = k["accounts"]
+            shown = ", ".join(accounts[:5]) + (f" (+{len(accounts) - 5})" if len(accounts) > 5 else "")
+            keys.add_row(k["fingerprint"], k["type"], str(k["hosts"]), shown)
+        console.print(keys)
+    findings = merged.get("suspicious") or []
+    if findings:
+        console.print("\n[bold red]Suspicious findings:[/bold red]")
+        for s in findings:
+            console.print(f" - {s}")
+    else:
+        console.print("\n[green]No immediate suspicious findings detected.[/green]")
+
+def print_diff(diff: Dict[str, Any]):
+    """Only what changed since the baseline."""
+    import time
+    console = get_console()
+    when = time.strftime("%Y-%m-%d %H:%M", time.localtime(diff.get("baseline_created") or 0))
+    console.print(f"\n[bold]Changes since baseline of {diff.get('baseline_host')} ({when}):[/bold]")
+    for u in diff.get("added_users", []):
+        console.print(f" [green]+ user {u}[/green]")
+    for u in diff.get("removed_users", []):
+        console.print(f" [red]- user {u}[/red]")
+    for u, change in sorted(diff.get("changed", {}).items()):
+        console.print(f" [yellow]~ {u}[/yellow]")
+        if change.get("sections"):
+            console.print(f"     changed: {', '.join(change['sections'])}")
+        for kind, labels in change.get("new", {}).items():
+            for label in labels:
+                console.print(f"     + {kind}: {label}")
+        for kind, n in change.get("removed", {}).items():
+            console.print(f"     - {n} {kind} removed")
+    if not (diff.get("added_users") or diff.get("removed_users") or diff.get("changed")):
+        console.print(" [green]no changes[/green]")
+
 def save_json(report: Any, path: str):
     p = Path(path)
     p.write_text(json.dumps(report, indent=2))
+
+def write_json_list(items: Iterable[Any], outs: List[IO[str]]):
+    """Write a JSON array item by item to every stream in ``outs``, laid out like json.dump(indent=2)."""
+    first = True
+    for out in outs:
+        out.write("[")
+    for item in items:
+        # strings never hold raw newlines, so re-indenting by line is safe
+        text = json.dumps(item, indent=2, default=str).replace("\n", "\n  ")
+        for out in outs:
+            out.write(("\n  " if first else ",\n  ") + text)
+        first = False
+    for out in outs:
+        out.write("]" if first else "\n]")
+
+def dump_json(report: Any):
+    """Plain JSON on stdout, for machine-readable runs."""
+    import sys
+    json.dump(report, sys.stdout, indent=2, default=str)
+    sys.stdout.write("\n")
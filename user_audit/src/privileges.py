@@ -0,0 +1,286 @@
+from __future__ import annotations
+import glob
+import os
+import re
+import time
+from typing import Dict, List, Any, Optional, Set, Tuple
+from .utils import read_file_safe, rooted
+
+# Privilege index built in one pass over /etc/group, /etc/gshadow,
+# /etc/shadow (when readable) and /etc/sudoers with its #include /
+# #includedir files: per-user group memberships, the sudo rules that apply
+# to each user, the groups each user administers (gshadow), and password
+# ageing, so per-user lookups are dict hits.
+
+GROUP = "/etc/group"
+GSHADOW = "/etc/gshadow"
+SHADOW = "/etc/shadow"
+SUDOERS = "/etc/sudoers"
+
+# membership in these is root-equivalent or close to it
+PRIVILEGED_GROUPS = {"root", "sudo", "wheel", "admin", "adm", "docker", "lxd", "disk", "shadow", "libvirt"}
+MAX_INCLUDE_DEPTH = 8
+
+_INCLUDE = re.compile(r"^[#@](include|includedir)\s+(.+)$")
+_ALIAS = re.compile(r"^(User_Alias|Runas_Alias|Host_Alias|Cmnd_Alias)\s+(.*)$")
+# a trailing comment; "#123" is a uid, not a comment
+_COMMENT = re.compile(r"\s+#(?!\d).*$")
+_TAG = re.compile(r"\b(NOPASSWD|PASSWD|NOEXEC|EXEC|SETENV|NOSETENV|LOG_INPUT|NOLOG_INPUT|LOG_OUTPUT|NOLOG_OUTPUT):")
+
+
+def _logical_lines(text: str):
+    """(first line number, line) with backslash continuations joined and blank lines skipped."""
+    buf, start = "", 0
+    for n, raw in enumerate(text.splitlines(), 1):
+        line = raw.strip()
+        if not buf:
+            start = n
+        if line.endswith("\\"):
+            buf += line[:-1] + " "
+            continue
+        line = (buf + line).strip()
+        buf = ""
+        if line:
+            yield start, line
+
+
+def _int(value: str) -> Optional[int]:
+    value = value.strip()
+    return int(value) if value.lstrip("-").isdigit() else None
+
+
+def _split_list(value: str) -> List[str]:
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+class PrivilegeIndex:
+    def __init__(self):
+        self.groups: Dict[str, Dict[str, Any]] = {}
+        self.gid_names: Dict[int, str] = {}
+        self.user_groups: Dict[str, Set[str]] = {}
+        # username -> groups whose gshadow entry names them administrator
+        self.admin_of: Dict[str, Set[str]] = {}
+        self.shadow: Optional[Dict[str, Dict[str, Any]]] = None
+        self.sudoers_readable = False
+        self.sudoers_files: List[str] = []
+        self.sudo_rules: List[Dict[str, Any]] = []
+        self.user_aliases: Dict[str, List[str]] = {}
+        # username -> applicable rules, filled by resolve()
+        self.sudo_by_user: Dict[str, List[Dict[str, Any]]] = {}
+
+    @classmethod
+    def load(cls, users: Dict[str, Tuple[int, int]]) -> "PrivilegeIndex":
+        """``users`` maps username -> (uid, primary gid)."""
+        idx = cls()
+        idx._load_groups()
+        idx._load_gshadow()
+        idx._load_shadow()
+        idx._load_sudoers(rooted(SUDOERS), 0)
+        idx.resolve(users)
+        return idx
+
+    # -- loaders ------------------------------------------------------------
+
+    def _load_groups(self):
+        for line in read_file_safe(rooted(GROUP)).splitlines():
+            f = line.split(":")
+            if len(f) < 4 or line.startswith("#"):
+                continue
+            try:
+                gid = int(f[2])
+            except ValueError:
+                continue
+            members = set(_split_list(f[3]))
+            self.groups[f[0]] = {"gid": gid, "members": members}
+            self.gid_names.setdefault(gid, f[0])
+            for m in members:
+                self.user_groups.setdefault(m, set()).add(f[0])
+
+    def _load_gshadow(self):
+        # gshadow can list members (and group admins) that /etc/group does not
+        for line in read_file_safe(rooted(GSHADOW)).splitlines():
+            f = line.split(":")
+            if len(f) < 4 or f[0] not in self.groups:
+                continue
+            for a in _split_list(f[2]):
+                self.admin_of.setdefault(a, set()).add(f[0])
+            for m in _split_list(f[3]):
+                self.groups[f[0]]["members"].add(m)
+                self.user_groups.setdefault(m, set()).add(f[0])
+
+    def _load_shadow(self):
+        path = rooted(SHADOW)
+        if not os.access(path, os.R_OK):
+            return
+        self.shadow = {}
+        for line in read_file_safe(path).splitlines():
+            f = line.split(":")
+            if len(f) < 8:
+                continue
+            pw = f[1]
+            self.shadow[f[0]] = {
+                "password": "none" if pw == "" else "locked" if pw.startswith(("!", "*")) else "set",
+                "last_change": _int(f[2]),
+                "max_days": _int(f[4]),
+                "inactive_days": _int(f[6]),
+                "expires": _int(f[7]),
+            }
+
+    def _load_sudoers(self, path: str, depth: int):
+        if depth > MAX_INCLUDE_DEPTH or path in self.sudoers_files:
+            return
+        if not os.access(path, os.R_OK):
+            return
+        if depth == 0:
+            self.sudoers_readable = True
+        self.sudoers_files.append(path)
+        text = read_file_safe(path)
+        for lineno, line in _logical_lines(text):
+            m = _INCLUDE.match(line)
+            if m:
+                target = m.group(2).strip().strip('"')
+                # relative includes are relative to the including file; %h is the host name
+                target = target.replace("%h", os.uname().nodename)
+                if target.startswith("/"):
+                    target = rooted(target)
+                else:
+                    target = os.path.join(os.path.dirname(path), target)
+                if m.group(1) == "includedir":
+                    # sudo skips names containing '.' or ending in '~'
+                    for p in sorted(glob.glob(os.path.join(target, "*"))):
+                        name = os.path.basename(p)
+                        if "." not in name and not name.endswith("~") and os.path.isfile(p):
+                            self._load_sudoers(p, depth + 1)
+                else:
+                    self._load_sudoers(target, depth + 1)
+                continue
+            if line.startswith("#") and not line[1:2].isdigit():
+                continue
+            line = _COMMENT.sub("", line)
+            m = _ALIAS.match(line)
+            if m:
+                if m.group(1) == "User_Alias":
+                    for part in m.group(2).split(":"):
+                        name, _, members = part.partition("=")
+                        self.user_aliases[name.strip()] = _split_list(members)
+                continue
+            if line.startswith("Defaults") or "=" not in line:
+                continue
+            self._add_rule(path, lineno, line)
+
+    def _add_rule(self, path: str, lineno: int, line: str):
+        # "User_List Host_List = (Runas) TAGS: Commands"; lists may have spaces after commas
+        left, _, spec = line.partition("=")
+        tokens = re.sub(r"\s*,\s*", ",", left.strip()).split()
+        users = _split_list(tokens[0]) if tokens else []
+        spec = spec.strip()
+        runas = ""
+        if spec.startswith("("):
+            runas, _, spec = spec[1:].partition(")")
+        tags = set(_TAG.findall(spec))
+        commands = _TAG.sub("", spec).strip()
+        self.sudo_rules.append({
+            "source": f"{path}:{lineno}",
+            "users": users,
+            "runas": runas.strip() or "root",
+            "commands": commands,
+            "nopasswd": "NOPASSWD" in tags,
+            "all_commands": any(c.strip() == "ALL" for c in commands.split(",")),
+            "rule": line,
+        })
+
+    # -- resolution ---------------------------------------------------------
+
+    def _expand(self, entry: str, seen: Optional[Set[str]] = None) -> List[Tuple[str, str]]:
+        """One User_List entry -> [(kind, value)] with aliases expanded ('user', 'group', 'uid', 'gid', 'all')."""
+        negated = entry.startswith("!")
+        if negated:
+            # negation only narrows an earlier match; never grants by itself
+            return []
+        if entry == "ALL":
+            return [("all", "")]
+        if entry.startswith("%#"):
+            return [("gid", entry[2:])]
+        if entry.startswith("%"):
+            return [("group", entry[1:].lstrip(":"))]
+        if entry.startswith("#"):
+            return [("uid", entry[1:])]
+        if entry in self.user_aliases:
+            seen = seen or set()
+            if entry in seen:
+                return []
+            seen.add(entry)
+            return [x for member in self.user_aliases[entry] for x in self._expand(member, seen)]
+        return [("user", entry)]
+
+    def resolve(self, users: Dict[str, Tuple[int, int]]):
+        """Attach each sudo rule to the users it applies to (directly, via group, alias or ALL)."""
+        for name, (_, gid) in users.items():
+            primary = self.gid_names.get(gid)
+            if primary:
+                self.user_groups.setdefault(name, set()).add(primary)
+        group_members: Dict[str, Set[str]] = {}
+        for name, groups in self.user_groups.items():
+            for g in groups:
+                group_members.setdefault(g, set()).add(name)
+        uid_names = {str(uid): name for name, (uid, _) in users.items()}
+        for rule in self.sudo_rules:
+            matched: Dict[str, str] = {}
+            for entry in rule["users"]:
+                for kind, value in self._expand(entry):
+                    if kind == "all":
+                        for name in users:
+                            matched.setdefault(name, "ALL")
+                    elif kind == "user":
+                        matched.setdefault(value, "user")
+                    elif kind == "uid" and value in uid_names:
+                        matched.setdefault(uid_names[value], "uid")
+                    elif kind in ("group", "gid"):
+                        group = self.gid_names.get(int(value)) if kind == "gid" and value.isdigit() else value
+                        for name in group_members.get(group or "", ()):
+                            matched.setdefault(name, f"group {group}")
+            for name, via in matched.items():
+                self.sudo_by_user.setdefault(name, []).append({
+                    "source": rule["source"], "via": via, "runas": rule["runas"], "commands": rule["commands"],
+                    "nopasswd": rule["nopasswd"], "all_commands": rule["all_commands"]})
+
+    # -- lookups ------------------------------------------------------------
+
+    def groups_of(self, username: str) -> List[str]:
+        return sorted(self.user_groups.get(username, ()))
+
+    def admin_groups_of(self, username: str) -> List[str]:
+        """Groups ``username`` can add members to (gpasswd) as a gshadow administrator."""
+        return sorted(self.admin_of.get(username, ()))
+
+    def sudo_of(self, username: str) -> List[Dict[str, Any]]:
+        return list(self.sudo_by_user.get(username, ()))
+
+    def shadow_of(self, username: str) -> Optional[Dict[str, Any]]:
+        return self.shadow.get(username) if self.shadow is not None else None
+
+
+def staleness(shadow: Optional[Dict[str, Any]], last_login: Optional[float], threshold_days: int,
+              now: Optional[float] = None, privileged: bool = False) -> Dict[str, Any]:
+    """Password age and days since last login against ``threshold_days``.
+
+    A ``privileged`` account with no login on record at all is stale too,
+    unless its password is locked (e.g. root on most distributions).
+    """
+    now = now or time.time()
+    today = int(now // 86400)
+    out: Dict[str, Any] = {"threshold_days": threshold_days, "reasons": []}
+    if shadow and shadow.get("last_change"):
+        out["password_age_days"] = today - shadow["last_change"]
+        if shadow["password"] == "set" and out["password_age_days"] > threshold_days:
+            out["reasons"].append(f"password unchanged for {out['password_age_days']} days")
+    if last_login:
+        out["days_since_login"] = int((now - last_login) // 86400)
+        if out["days_since_login"] > threshold_days:
+            out["reasons"].append(f"no login for {out['days_since_login']} days")
+    else:
+        out["days_since_login"] = None
+        if privileged and (shadow or {}).get("password") != "locked":
+            out["reasons"].append("privileged account has never logged in")
+    out["stale"] = bool(out["reasons"])
+    return out
@@ -0,0 +1,186 @@
+from __future__ import annotations
+import os
+import socket
+import struct
+from typing import Dict, List, Any, Optional
+
+# Pure /proc collector: one pass over every pid plus the kernel socket tables,
+# replacing the `ps -u` / `ss -tunap` shell-outs and their text parsing.
+
+NET_TABLES = [("tcp", "tcp", False), ("tcp6", "tcp", True), ("udp", "udp", False), ("udp6", "udp", True)]
+
+TCP_STATES = {
+    "01": "ESTAB", "02": "SYN-SENT", "03": "SYN-RECV", "04": "FIN-WAIT-1",
+    "05": "FIN-WAIT-2", "06": "TIME-WAIT", "07": "UNCONN", "08": "CLOSE-WAIT",
+    "09": "LAST-ACK", "0A": "LISTEN", "0B": "CLOSING",
+}
+
+try:
+    CLK_TCK = os.sysconf("SC_CLK_TCK")
+except (ValueError, OSError, AttributeError):
+    CLK_TCK = 100
+
+
+def _addr(hexaddr: str, v6: bool) -> str:
+    ip, port = hexaddr.split(":")
+    raw = bytes.fromhex(ip)
+    if v6:
+        # four host-order 32-bit words
+        raw = b"".join(struct.pack(">I", w) for w in struct.unpack("<4I", raw))
+        host = "[" + socket.inet_ntop(socket.AF_INET6, raw) + "]"
+    else:
+        host = socket.inet_ntop(socket.AF_INET, raw[::-1])
+    return f"{host}:{int(port, 16)}"
+
+
+def read_net_sockets(proc_root: str = "/proc") -> Dict[int, Dict[str, Any]]:
+    """Return socket inode -> {proto, state, local, remote} for tcp/udp (v4+v6)."""
+    socks: Dict[int, Dict[str, Any]] = {}
+    for table, proto, v6 in NET_TABLES:
+        try:
+            with open(os.path.join(proc_root, "net", table), "r") as fh:
+                next(fh, None)
+                for line in fh:
+                    f = line.split()
+                    if len(f) < 10:
+                        continue
+                    inode = int(f[9])
+                    if not inode:
+                        continue
+                    state = TCP_STATES.get(f[3], f[3]) if proto == "tcp" else ("UNCONN" if f[3] == "07" else "ESTAB")
+                    socks[inode] = {
+                        "proto": proto,
+                        "state": state,
+                        "local": _addr(f[1], v6),
+                        "remote": _addr(f[2], v6),
+                    }
+        except Exception:
+            continue
+    return socks
+
+
+def _read(path: str) -> str:
+    try:
+        with open(path, "r", errors="ignore") as fh:
+            return fh.read()
+    except Exception:
+        return ""
+
+
+class ProcTable:
+    def __init__(self, proc_root: str = "/proc"):
+        self.proc_root = proc_root
+        self.procs: Dict[int, Dict[str, Any]] = {}
+        self.pids_by_uid: Dict[int, List[int]] = {}
+        self.sockets_by_pid: Dict[int, List[Dict[str, Any]]] = {}
+
+    @classmethod
+    def collect(cls, proc_root: str = "/proc") -> "ProcTable":
+        table = cls(proc_root)
+        table._scan()
+        return table
+
+    def _scan(self):
+        root = self.proc_root
+        socks = read_net_sockets(root)
+        uptime = 0.0
+        try:
+            uptime = float(_read(os.path.join(root, "uptime")).split()[0])
+        except Exception:
+            pass
+        mem_total = 0
+        for line in _read(os.path.join(root, "meminfo")).splitlines():
+            if line.startswith("MemTotal:"):
+                mem_total = int(line.split()[1])
+                break
+        try:
+            entries = os.listdir(root)
+        except OSError:
+            return
+        for name in entries:
+            if not name.isdigit():
+                continue
+            pid = int(name)
+            base = os.path.join(root, name)
+            info = self._read_status(base)
+            if info is None:
+                continue
+            info["pid"] = pid
+            cmd = _read(os.path.join(base, "cmdline")).replace("\0", " ").strip()
+            info["cmd"] = cmd or f"[{info.get('name', '')}]"
+            info["cpu"], info["mem"] = self._usage(base, info.get("rss", 0), uptime, mem_total)
+            self.procs[pid] = info
+            self.pids_by_uid.setdefault(info["uid"], []).append(pid)
+            if socks:
+                self._read_fds(pid, base, socks)
+
+    @staticmethod
+    def _read_status(base: str) -> Optional[Dict[str, Any]]:
+        info: Dict[str, Any] = {"ppid": 0, "rss": 0}
+        try:
+            with open(os.path.join(base, "status"), "r", errors="ignore") as fh:
+                for line in fh:
+                    key, _, val = line.partition(":")
+                    if key == "Name":
+                        info["name"] = val.strip()
+                    elif key == "PPid":
+                        info["ppid"] = int(val)
+                    elif key == "Uid":
+                        info["uid"] = int(val.split()[0])
+                    elif key == "VmRSS":
+                        info["rss"] = int(val.split()[0])
+        except Exception:
+            return None
+        return info if "uid" in info else None
+
+    @staticmethod
+    def _usage(base: str, rss_kb: int, uptime: float, mem_total: int):
+        # same definitions as ps: cpu time over lifetime, rss over MemTotal
+        cpu = 0.0
+        try:
+            stat = _read(os.path.join(base, "stat"))
+            fields = stat[stat.rindex(")") + 2:].split()
+            ticks = int(fields[11]) + int(fields[12])
+            elapsed = uptime - int(fields[19]) / CLK_TCK
+            if elapsed > 0:
+                cpu = 100.0 * ticks / CLK_TCK / elapsed
+        except Exception:
+            pass
+        mem = 100.0 * rss_kb / mem_total if mem_total else 0.0
+        return round(cpu, 1), round(mem, 1)
+
+    def _read_fds(self, pid: int, base: str, socks: Dict[int, Dict[str, Any]]):
+        fd_dir = os.path.join(base, "fd")
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:
+            return
+        for fd in fds:
+            try:
+                target = os.readlink(os.path.join(fd_dir, fd))
+            except OSError:
+                continue
+            if not target.startswith("socket:["):
+                continue
+            sock = socks.get(int(target[8:-1]))
+            if sock:
+                self.sockets_by_pid.setdefault(pid, []).append(dict(sock, fd=int(fd)))
+
+    # -- lookups ------------------------------------------------------------
+
+    def processes(self, uid: Optional[int]) -> List[str]:
+        rows = []
+        for pid in self.pids_by_uid.get(uid, []):
+            p = self.procs[pid]
+            # same column order as `ps -u <user> -o pid,ppid,cmd,%cpu,%mem`
+            rows.append(f"{pid} {p['ppid']} {p['cmd']} {p['cpu']} {p['mem']}")
+        return rows
+
+    def connections(self, uid: Optional[int]) -> List[str]:
+        rows = []
+        for pid in self.pids_by_uid.get(uid, []):
+            name = self.procs[pid].get("name", "")
+            for s in self.sockets_by_pid.get(pid, []):
+                rows.append(f"{s['proto']} {s['state']} {s['local']} {s['remote']} "
+                            f"users:((\"{name}\",pid={pid},fd={s['fd']}))")
+        return rows
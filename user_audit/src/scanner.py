@@ -0,0 +1,158 @@
+from __future__ import annotations
+import os
+import stat
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple
+from .constants import DEFAULT_HOME_SCAN_LIMIT_MB
+
+# scandir-based tree scanner for setuid / world-writable files. DirEntry keeps
+# the d_type from readdir so directories are recognised without a stat call;
+# only regular files are lstat'ed. Top-level subtrees are walked in parallel,
+# the walk never leaves the starting device and never enters pseudo or network
+# filesystems.
+
+PSEUDO_FS = {
+    "proc", "sysfs", "devtmpfs", "devpts", "cgroup", "cgroup2", "securityfs", "debugfs",
+    "tracefs", "pstore", "bpf", "configfs", "fusectl", "mqueue", "hugetlbfs", "autofs",
+    "binfmt_misc", "efivarfs", "rpc_pipefs", "nsfs", "squashfs",
+}
+NETWORK_FS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "sshfs", "fuse.sshfs", "9p", "afs", "ceph", "glusterfs", "lustre"}
+SKIP_FS = PSEUDO_FS | NETWORK_FS
+
+DEFAULT_WORKERS = 4
+
+
+@lru_cache(maxsize=1)
+def mount_table() -> Dict[str, str]:
+    """Mount point -> filesystem type, from /proc/self/mounts."""
+    mounts: Dict[str, str] = {}
+    try:
+        with open("/proc/self/mounts", "r") as fh:
+            for line in fh:
+                parts = line.split()
+                if len(parts) >= 3:
+                    # mount points escape spaces as \040
+                    mounts[parts[1].replace("\\040", " ")] = parts[2]
+    except OSError:
+        pass
+    return mounts
+
+
+def skipped_mounts() -> set:
+    return {m for m, fs in mount_table().items() if fs in SKIP_FS}
+
+
+def local_mounts() -> List[str]:
+    return sorted(m for m, fs in mount_table().items() if fs not in SKIP_FS)
+
+
+class _Budget:
+    def __init__(self, limit_bytes: Optional[int], end: Optional[float] = None):
+        self.limit = limit_bytes
+        # time.monotonic() deadline, checked every 256 files
+        self.end = end
+        self.used = 0
+        self.files = 0
+        self.exhausted = False
+        self._lock = threading.Lock()
+
+    def charge(self, size: int) -> bool:
+        with self._lock:
+            self.used += size
+            self.files += 1
+            if self.limit is not None and self.used > self.limit:
+                self.exhausted = True
+            elif self.end is not None and not self.files % 256 and time.monotonic() > self.end:
+                self.exhausted = True
+            return not self.exhausted
+
+
+def _record(path: str, st: os.stat_result, sink: Dict[int, Dict[str, List[str]]],
+            lock: threading.Lock, by_owner: bool):
+    key = st.st_uid if by_owner else -1
+    with lock:
+        bucket = sink.setdefault(key, {"setuid": [], "world_writable": []})
+        if st.st_mode & stat.S_ISUID:
+            bucket["setuid"].append(path)
+        if st.st_mode & stat.S_IWOTH:
+            bucket["world_writable"].append(path)
+
+
+def _walk(top: str, dev: int, skip: set, budget: _Budget, sink: Dict[int, Dict[str, List[str]]],
+          lock: threading.Lock, by_owner: bool, recurse: bool = True):
+    stack = [top]
+    while stack and not budget.exhausted:
+        path = stack.pop()
+        try:
+            it = os.scandir(path)
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                if budget.exhausted:
+                    return
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recurse and entry.path not in skip and entry.stat(follow_symlinks=False).st_dev == dev:
+                            stack.append(entry.path)
+                        continue
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if st.st_mode & (stat.S_ISUID | stat.S_IWOTH):
+                    _record(entry.path, st, sink, lock, by_owner)
+                budget.charge(st.st_size)
+
+
+def _scan(roots: List[str], limit_bytes: Optional[int], workers: int,
+          by_owner: bool, end: Optional[float] = None) -> Tuple[Dict[int, Dict[str, List[str]]], _Budget]:
+    from concurrent.futures import ThreadPoolExecutor
+    skip = skipped_mounts()
+    budget = _Budget(limit_bytes, end)
+    sink: Dict[int, Dict[str, List[str]]] = {}
+    lock = threading.Lock()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futs = []
+        for root in roots:
+            try:
+                dev = os.lstat(root).st_dev
+                entries = list(os.scandir(root))
+            except OSError:
+                continue
+            # files directly under the root, then every top-level subtree as its own job
+            futs.append(pool.submit(_walk, root, dev, skip, budget, sink, lock, by_owner, False))
+            for entry in entries:
+                try:
+                    if (entry.is_dir(follow_symlinks=False) and entry.path not in skip
+                            and entry.stat(follow_symlinks=False).st_dev == dev):
+                        futs.append(pool.submit(_walk, entry.path, dev, skip, budget, sink, lock, by_owner))
+                except OSError:
+                    continue
+        for f in futs:
+            f.result()
+    for bucket in sink.values():
+        bucket["setuid"].sort()
+        bucket["world_writable"].sort()
+    return sink, budget
+
+
+def scan_home(home: str, limit_mb: Optional[int] = DEFAULT_HOME_SCAN_LIMIT_MB,
+              workers: int = DEFAULT_WORKERS) -> Dict[str, Any]:
+    """setuid / world-writable files under ``home``, stopping after ``limit_mb`` of file data."""
+    limit = limit_mb * 1024 * 1024 if limit_mb else None
+    sink, budget = _scan([home], limit, workers, by_owner=False)
+    found = sink.get(-1, {"setuid": [], "world_writable": []})
+    found["scanned_files"] = budget.files
+    found["truncated"] = budget.exhausted
+    return found
+
+
+def scan_by_owner(roots: Optional[List[str]] = None, workers: int = DEFAULT_WORKERS,
+                  end: Optional[float] = None) -> Dict[int, Dict[str, List[str]]]:
+    """One pass over every local filesystem, findings bucketed by owner uid; stops at ``end`` (monotonic)."""
+    sink, _ = _scan(roots or local_mounts(), None, workers, by_owner=True, end=end)
+    return sink
@@ -0,0 +1,188 @@
+from __future__ import annotations
+import re
+import pwd
+import time
+from typing import Dict, List, Any, Optional, Iterable, TYPE_CHECKING
+from .utils import run_cmd, passwd_entries, rooted, live_root, get_root
+from .procfs import ProcTable
+from .authlog import read_auth_lines, parse_event, line_time
+from .scanner import scan_by_owner
+from .wtmp import LoginIndex
+from .cron import CronInventory
+from .keys import KeyIndex
+from .privileges import PrivilegeIndex
+from . import metrics
+
+if TYPE_CHECKING:
+    from .state import StateStore
+
+# Host-wide sources are collected once per run and indexed by uid/username so
+# the per-user checks only do dictionary lookups.
+
+AUTH_LOGS = ["/var/log/auth.log", "/var/log/secure"]
+# host-wide sources in collection order; deep_scan only with --deep
+SNAPSHOT_PARTS = ("passwd", "procs", "auth", "cron", "keys", "privileges", "wtmp", "deep_scan")
+AUTH_MARKERS = ("Failed password", "Accepted password")
+
+_WORD = re.compile(r"[A-Za-z0-9_.][A-Za-z0-9_.-]*\$?")
+
+
+def _index_lines(lines: List[str], names: set) -> Dict[str, List[int]]:
+    """Map each known username to the indexes of the lines mentioning it."""
+    idx: Dict[str, List[int]] = {}
+    for i, line in enumerate(lines):
+        seen = set()
+        for w in _WORD.findall(line):
+            if w in names and w not in seen:
+                seen.add(w)
+                idx.setdefault(w, []).append(i)
+    return idx
+
+
+class HostSnapshot:
+    def __init__(self):
+        self.users: Dict[str, pwd.struct_passwd] = {}
+        self.proc_table = ProcTable()
+        self.journal: str = ""
+        self.auth_lines: Dict[str, List[str]] = {}
+        self.auth_common: Dict[str, List[int]] = {}
+        self.auth_index: Dict[str, Dict[str, List[int]]] = {}
+        self.auth_events: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+        self.cron = CronInventory()
+        self.keys = KeyIndex()
+        self.privileges = PrivilegeIndex()
+        self.logins = LoginIndex()
+        self.owned_files: Optional[Dict[int, Dict[str, List[str]]]] = None
+        # parts not (completely) loaded because the run deadline passed
+        self.missing: set = set()
+
+    @classmethod
+    def collect(cls, since: Optional[float] = None, state: Optional["StateStore"] = None,
+                deep: bool = False, parts: Optional[Iterable[str]] = None,
+                end: Optional[float] = None) -> "HostSnapshot":
+        """Load the host-wide sources; ``parts`` limits them to what the selected checks read.
+
+        Parts not started before ``end`` (time.monotonic()) are left out and listed in ``missing``.
+        """
+        snap = cls()
+
+        def late() -> bool:
+            return end is not None and time.monotonic() > end
+
+        wanted = set(SNAPSHOT_PARTS if deep else SNAPSHOT_PARTS[:-1]) if parts is None else set(parts)
+        with metrics.track("snapshot:passwd"):
+            snap._load_passwd()
+        for part, load in (("procs", snap._load_procs),
+                           ("auth", lambda: snap._load_auth(since=since, state=state, end=end)),
+                           ("cron", lambda: snap._load_cron(state=state)),
+                           ("keys", lambda: snap._load_keys(state=state)),
+                           ("privileges", snap._load_privileges),
+                           ("wtmp", snap._load_wtmp)):
+            if part not in wanted:
+                continue
+            if late():
+                snap.missing.add(part)
+                continue
+            with metrics.track(f"snapshot:{part}"):
+                load()
+        if "deep_scan" in wanted:
+            if late():
+                snap.missing.add("deep_scan")
+                return snap
+            # one whole-filesystem pass instead of a walk per user; stops at the deadline
+            with metrics.track("snapshot:deep_scan"):
+                snap.owned_files = scan_by_owner(None if live_root() else [get_root()], end=end)
+            if late():
+                snap.missing.add("deep_scan")
+        return snap
+
+    # -- collectors ---------------------------------------------------------
+
+    def _load_passwd(self):
+        for p in passwd_entries():
+            if int(p.pw_uid) < 0:
+                continue
+            self.users.setdefault(p.pw_name, p)
+
+    def _load_procs(self):
+        self.proc_table = ProcTable.collect(rooted("/proc"))
+
+    def _load_auth(self, lines: int = 200, since: Optional[float] = None, state: Optional["StateStore"] = None,
+                   end: Optional[float] = None):
+        if live_root():
+            window = f" --since @{int(since)}" if since else ""
+            rc, out, err = run_cmd(f"journalctl -u ssh -n {lines}{window} --no-pager", timeout=4)
+            if rc == 0 and out:
+                self.journal = out
+        names = set(self.users)
+        for p in map(rooted, AUTH_LOGS):
+            text = read_auth_lines(p, since=since, state=state)
+            if not text:
+                continue
+            self.auth_lines[p] = text
+            events: Dict[str, List[Dict[str, Any]]] = {}
+            for i, line in enumerate(text):
+                if end is not None and not i % 1024 and time.monotonic() > end:
+                    # a partial index would look like "no events"; leave auth out instead
+                    self.missing.add("auth")
+                    return
+                ev = parse_event(line)
+                if ev:
+                    ev["time"] = line_time(line)
+                    events.setdefault(ev["user"], []).append(ev)
+            self.auth_events[p] = events
+            self.auth_common[p] = [i for i, l in enumerate(text) if any(m in l for m in AUTH_MARKERS)]
+            self.auth_index[p] = _index_lines(text, names)
+
+    def _load_cron(self, state: Optional["StateStore"] = None):
+        self.cron = CronInventory.load(state=state)
+
+    def _load_keys(self, state: Optional["StateStore"] = None):
+        self.keys = KeyIndex.load({name: rooted(p.pw_dir) for name, p in self.users.items()}, state=state)
+
+    def _load_privileges(self):
+        self.privileges = PrivilegeIndex.load({n: (p.pw_uid, p.pw_gid) for n, p in self.users.items()})
+
+    def _load_wtmp(self, limit: int = 10):
+        self.logins = LoginIndex.load(limit=limit)
+
+    # -- lookups ------------------------------------------------------------
+
+    def passwd(self, username: str) -> Optional[pwd.struct_passwd]:
+        return self.users.get(username)
+
+    def uid_of(self, username: str) -> Optional[int]:
+        p = self.users.get(username)
+        return p.pw_uid if p else None
+
+    def last(self, username: str, limit: int = 10) -> List[Dict[str, Any]]:
+        return self.logins.last(username, limit)
+
+    def failed_logins(self, username: str) -> Dict[str, Any]:
+        return self.logins.failed(username)
+
+    def processes(self, username: str) -> List[str]:
+        return self.proc_table.processes(self.uid_of(username))
+
+    def connections(self, username: str) -> List[str]:
+        return self.proc_table.connections(self.uid_of(username))
+
+    def crons(self, username: str) -> List[Dict[str, Any]]:
+        return self.cron.for_user(username)
+
+    def auth(self, username: str) -> List[Dict[str, Any]]:
+        results = []
+        if self.journal:
+            results.append({"source": "journalctl:ssh", "content": self.journal})
+        for p, text in self.auth_lines.items():
+            # only the last 5000 chars are kept, so never look further back
+            # than 2500 (non-empty, newline-joined) lines per source
+            common = self.auth_common.get(p, [])[-2500:]
+            mine = self.auth_index.get(p, {}).get(username, [])[-2500:]
+            idx = sorted(set(common) | set(mine))
+            filtered = "\n".join(text[i] for i in idx)
+            if filtered:
+                results.append({"source": p, "content": filtered[-5000:],
+                                "events": list(self.auth_events.get(p, {}).get(username, []))})
+        return results
+
@@ -0,0 +1,217 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+from .constants import DEFAULT_STATE_DIR
+from . import metrics
+
+# On-disk state for incremental runs (`--incremental`): remembers a signature
+# (inode, size, mtime, content hash) for every artifact we look at plus the
+# last result of cacheable checks, so unchanged inputs are skipped, and a read
+# offset and the last parsed lines of append-only files, so those are only
+# read from where the last run stopped and still report what came before.
+
+STATE_FILE = "state.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    path TEXT PRIMARY KEY,
+    inode INTEGER, size INTEGER, mtime_ns INTEGER, ctime_ns INTEGER,
+    hash TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    username TEXT, check_name TEXT, sig TEXT, result TEXT,
+    PRIMARY KEY (username, check_name)
+);
+CREATE TABLE IF NOT EXISTS streams (
+    path TEXT, consumer TEXT, inode INTEGER, offset INTEGER, kept TEXT,
+    PRIMARY KEY (path, consumer)
+);
+"""
+
+# Read offsets of append-only files belong to a consumer: host-wide runs
+# (--all, fleet agents) share one, each single-user run (--user NAME) has its
+# own, so a `--user` run never moves the offset an `--all` run resumes from.
+HOST_CONSUMER = "all"
+
+
+def _consumer(user: Optional[str]) -> str:
+    return HOST_CONSUMER if user is None else f"user:{user}"
+
+# (inode, size, mtime_ns, ctime_ns); ctime also moves on chmod/chown
+Stat = Tuple[int, int, int, int]
+
+
+def _stat(path: str) -> Optional[Stat]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns
+
+
+def _hash(path: str) -> str:
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b""):
+                h.update(chunk)
+    except OSError:
+        return ""
+    return h.hexdigest()
+
+
+class StateStore:
+    def __init__(self, state_dir: str = DEFAULT_STATE_DIR):
+        os.makedirs(state_dir, mode=0o700, exist_ok=True)
+        self.path = os.path.join(state_dir, STATE_FILE)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # -- artifact signatures ------------------------------------------------
+
+    def _row(self, path: str):
+        with self._lock:
+            return self._db.execute(
+                "SELECT inode, size, mtime_ns, ctime_ns, hash FROM artifacts WHERE path = ?", (path,)).fetchone()
+
+    def _save(self, path: str, st: Optional[Stat], digest: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO artifacts (path, inode, size, mtime_ns, ctime_ns, hash) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (path, *st, digest))
+
+    def signature(self, path: str) -> str:
+        """Content+mode signature of ``path``; only re-hashes when its stat changed."""
+        st = _stat(path)
+        if st is None:
+            return "-"
+        row = self._row(path)
+        if row and tuple(row[:4]) == st and row[4]:
+            return row[4]
+        try:
+            mode = os.stat(path).st_mode
+            if os.path.isdir(path):
+                # directories: the listing is the content
+                digest = hashlib.sha256("\0".join(sorted(os.listdir(path))).encode()).hexdigest()
+            else:
+                digest = _hash(path)
+        except OSError:
+            return "-"
+        digest = f"{mode:o}:{digest}"
+        self._save(path, st, digest)
+        return digest
+
+    def cached(self, username: str, check: str, paths: Iterable[str], fn: Callable[[], Any]) -> Any:
+        """Return the stored result of ``check`` if none of ``paths`` changed, else run ``fn``."""
+        sig = hashlib.sha256("\0".join(f"{p}={self.signature(p)}" for p in paths).encode()).hexdigest()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT sig, result FROM results WHERE username = ? AND check_name = ?", (username, check)).fetchone()
+        if row and row[0] == sig:
+            try:
+                return json.loads(row[1])
+            except ValueError:
+                pass
+        result = fn()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (username, check_name, sig, result) VALUES (?, ?, ?, ?)",
+                (username, check, sig, json.dumps(result, default=str)))
+        return result
+
+    # -- append-only files --------------------------------------------------
+
+    def _stream(self, path: str, consumer: str):
+        with self._lock:
+            return self._db.execute(
+                "SELECT inode, offset, kept FROM streams WHERE path = ? AND consumer = ?", (path, consumer)).fetchone()
+
+    def read_new(self, path: str, user: Optional[str] = None,
+                 first_read_limit: Optional[int] = None) -> Tuple[bytes, int, bool]:
+        """Bytes appended to ``path`` since the last host-wide run (or ``user``'s last
+        single-user run), their offset in the file and whether it is a fresh read.
+
+        A different inode or a shrunk file (rotation/truncation) restarts at 0;
+        a fresh read of a file larger than ``first_read_limit`` bytes only
+        returns its tail.
+        """
+        consumer = _consumer(user)
+        st = _stat(path)
+        if st is None:
+            return b"", 0, True
+        row = self._stream(path, consumer)
+        resumed = bool(row and row[0] == st[0] and row[1] <= st[1])
+        start = row[1] if resumed else 0
+        if not resumed and first_read_limit and st[1] > first_read_limit:
+            start = st[1] - first_read_limit
+        try:
+            with open(path, "rb") as fh:
+                fh.seek(start)
+                data = fh.read()
+            metrics.add_bytes(len(data))
+        except OSError:
+            return b"", 0, True
+        if start and not resumed:
+            # skip the partial first line of a tail read
+            data = data[data.find(b"\n") + 1:]
+            start = st[1] - len(data)
+        # never resume in the middle of a line
+        end = data.rfind(b"\n") + 1
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO streams (path, consumer, inode, offset) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (path, consumer) DO UPDATE SET inode = excluded.inode, offset = excluded.offset",
+                (path, consumer, st[0], start + end))
+        return data[:end], start, not resumed
+
+    def follow(self, path: str, parse: Callable[[bytes, int], List[Any]], keep: Optional[int] = None,
+               user: Optional[str] = None, first_read_limit: Optional[int] = None,
+               restart_drops: bool = False) -> Tuple[List[Any], int]:
+        """Items of ``path`` as a full read would see them, at the cost of reading only its delta.
+
+        The items ``parse(data, offset)`` returns for the new bytes (see
+        read_new) are added to those kept by the same consumer's earlier
+        runs, and the last ``keep`` of them are kept for the next run.
+        ``restart_drops`` forgets the kept items when the file was rewritten
+        rather than rotated away. Returns the items and the number of bytes read.
+        """
+        consumer = _consumer(user)
+        data, start, fresh = self.read_new(path, user, first_read_limit)
+        row = self._stream(path, consumer)
+        kept: List[Any] = []
+        if row and row[2] and not (fresh and restart_drops):
+            try:
+                kept = json.loads(row[2])
+            except ValueError:
+                pass
+        items = kept + parse(data, start)
+        if keep:
+            items = items[-keep:]
+        with self._lock:
+            self._db.execute("UPDATE streams SET kept = ? WHERE path = ? AND consumer = ?",
+                             (json.dumps(items, default=str), path, consumer))
+        return items, len(data)
+
+
+def open_state(state_dir: Optional[str]) -> Optional[StateStore]:
+    """Best-effort: None (non-incremental run) if the state dir is unusable."""
+    try:
+        return StateStore(state_dir or DEFAULT_STATE_DIR)
+    except (OSError, sqlite3.Error):
+        return None
@@ -1,27 +1,99 @@
 from __future__ import annotations
 import subprocess, shlex, os, pwd
-from typing import Tuple, Optional
+from typing import Tuple, Optional, List, Dict
+from . import metrics
+
+# Root prefix for every host path the checks read: "/" on a live host, or a
+# fixture tree (see bench.make_fake_root) via --root / $USER_AUDIT_ROOT. Off
+# the live root, accounts come from <root>/etc/passwd and commands that can
+# only query the running system (journalctl, systemctl) are skipped.
+_root = os.environ.get("USER_AUDIT_ROOT") or "/"
+
+def set_root(path: Optional[str]):
+    global _root
+    _root = os.path.abspath(path) if path else "/"
+    # inherited by worker processes however they are started
+    os.environ["USER_AUDIT_ROOT"] = _root
+
+def get_root() -> str:
+    return _root
+
+def live_root() -> bool:
+    return _root == "/"
+
+def rooted(path: str) -> str:
+    """``path`` (absolute, as seen on the audited host) under the configured root."""
+    if _root == "/" or not path:
+        return path
+    return os.path.join(_root, path.lstrip("/"))
+
+# root -> ((mtime_ns, size) of its etc/passwd, entries, by name); parsed once
+# per process and re-read only when the file changes
+_passwd_cache: Dict[str, Tuple[Optional[Tuple[int, int]], List[pwd.struct_passwd], Dict[str, pwd.struct_passwd]]] = {}
+
+def _root_passwd() -> Tuple[List[pwd.struct_passwd], Dict[str, pwd.struct_passwd]]:
+    path = rooted("/etc/passwd")
+    try:
+        st = os.stat(path)
+        sig = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        sig = None
+    hit = _passwd_cache.get(_root)
+    if hit and hit[0] == sig:
+        return hit[1], hit[2]
+    entries, by_name = [], {}
+    for line in read_file_safe(path).splitlines():
+        f = line.split(":")
+        if len(f) < 7 or line.startswith("#"):
+            continue
+        try:
+            p = pwd.struct_passwd((f[0], f[1], int(f[2]), int(f[3]), f[4], f[5], f[6]))
+        except ValueError:
+            continue
+        entries.append(p)
+        by_name.setdefault(p.pw_name, p)
+    _passwd_cache[_root] = (sig, entries, by_name)
+    return entries, by_name
+
+def passwd_entries() -> List[pwd.struct_passwd]:
+    if _root == "/":
+        return pwd.getpwall()
+    return list(_root_passwd()[0])
+
+def getpwnam(username: str) -> pwd.struct_passwd:
+    """pwd.getpwnam honouring the root prefix; raises KeyError like pwd."""
+    if _root == "/":
+        return pwd.getpwnam(username)
+    p = _root_passwd()[1].get(username)
+    if p is None:
+        raise KeyError(username)
+    return p
 
 def run_cmd(cmd: str, timeout: int = 5) -> Tuple[int, str, str]:
     """Run shell command, return (rc, stdout, stderr)."""
     try:
         proc = subprocess.run(shlex.split(cmd), capture_output=True, text=True, timeout=timeout)
+        metrics.record_subprocess(proc.returncode, len(proc.stdout))
         return proc.returncode, proc.stdout.strip(), proc.stderr.strip()
     except subprocess.TimeoutExpired:
+        metrics.record_subprocess(124)
         return 124, "", "timeout"
     except Exception as e:
+        metrics.record_subprocess(1)
         return 1, "", str(e)
 
 def read_file_safe(path: str) -> str:
     try:
         with open(path, "r", errors="ignore") as fh:
-            return fh.read()
+            text = fh.read()
+        metrics.add_bytes(len(text))
+        return text
     except Exception:
         return ""
 
 def exists_user(username: str) -> bool:
     try:
-        pwd.getpwnam(username)
+        getpwnam(username)
         return True
     except KeyError:
         return False
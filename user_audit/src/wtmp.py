@@ -0,0 +1,155 @@
+from __future__ import annotations
+import ipaddress
+import struct
+import time
+from collections import deque
+from typing import Dict, List, Any, Optional
+from . import metrics
+from .utils import rooted
+
+# Native readers for the binary login records, replacing `last` / `lastlog`:
+# wtmp/btmp are read once in fixed-size chunks and indexed per user, lastlog
+# is a sparse array indexed by uid so a lookup is a single seek.
+
+WTMP_PATH = "/var/log/wtmp"
+BTMP_PATH = "/var/log/btmp"
+LASTLOG_PATH = "/var/log/lastlog"
+
+# struct utmp (glibc, 64-bit Linux): type, pid, line, id, user, host, exit,
+# session, tv_sec, tv_usec, addr_v6, unused
+UTMP = struct.Struct("<hxxi32s4s32s256shhiii16s20s")
+# struct lastlog: ll_time, ll_line, ll_host
+LASTLOG = struct.Struct("<i32s256s")
+
+BOOT_TIME = 2
+USER_PROCESS = 7
+DEAD_PROCESS = 8
+
+CHUNK_RECORDS = 4096
+
+
+def _str(raw: bytes) -> str:
+    return raw.split(b"\0", 1)[0].decode("utf-8", "ignore")
+
+
+def _addr(raw: bytes) -> Optional[str]:
+    if not raw.strip(b"\0"):
+        return None
+    try:
+        if raw[4:] == b"\0" * 12:
+            return str(ipaddress.IPv4Address(raw[:4]))
+        return str(ipaddress.IPv6Address(raw))
+    except ValueError:
+        return None
+
+
+def iter_records(path: str):
+    """Yield parsed utmp records from ``path`` (wtmp, btmp or utmp)."""
+    size = UTMP.size
+    try:
+        fh = open(path, "rb")
+    except OSError:
+        return
+    with fh:
+        while True:
+            chunk = fh.read(size * CHUNK_RECORDS)
+            if not chunk:
+                break
+            metrics.add_bytes(len(chunk))
+            usable = len(chunk) - len(chunk) % size
+            for rec in UTMP.iter_unpack(chunk[:usable]):
+                ut_type, pid, line, _id, user, host, _term, _exit, _session, sec, usec, addr, _ = rec
+                yield {
+                    "type": ut_type,
+                    "pid": pid,
+                    "line": _str(line),
+                    "user": _str(user),
+                    "host": _str(host),
+                    "time": sec + usec / 1e6,
+                    "addr": _addr(addr),
+                }
+
+
+def format_session(s: Dict[str, Any]) -> str:
+    """One `last`-style line for a session dict."""
+    login = time.strftime("%a %b %d %H:%M", time.localtime(s["login"]))
+    if s.get("logout") is None:
+        end = "still logged in"
+    else:
+        mins = int(s["logout"] - s["login"]) // 60
+        end = f"- {time.strftime('%H:%M', time.localtime(s['logout']))}  ({mins // 60:02d}:{mins % 60:02d})"
+    return f"{s['user']:<8} {s['line']:<12} {s['host']:<16} {login} {end}"
+
+
+class LoginIndex:
+    def __init__(self, limit: int = 10):
+        self.limit = limit
+        self.sessions: Dict[str, deque] = {}
+        self.failed_count: Dict[str, int] = {}
+        self.failed_recent: Dict[str, deque] = {}
+
+    @classmethod
+    def load(cls, limit: int = 10, wtmp: Optional[str] = None, btmp: Optional[str] = None,
+             only: Optional[str] = None) -> "LoginIndex":
+        """One pass over wtmp and btmp; ``only`` restricts the index to one user."""
+        idx = cls(limit)
+        idx._load_wtmp(wtmp or rooted(WTMP_PATH), only)
+        idx._load_btmp(btmp or rooted(BTMP_PATH), only)
+        return idx
+
+    def _load_wtmp(self, path: str, only: Optional[str]):
+        open_by_line: Dict[str, Dict[str, Any]] = {}
+        for r in iter_records(path):
+            if r["type"] == USER_PROCESS and r["user"]:
+                if only and r["user"] != only:
+                    open_by_line.pop(r["line"], None)
+                    continue
+                s = {"user": r["user"], "line": r["line"], "host": r["host"], "addr": r["addr"],
+                     "login": r["time"], "logout": None}
+                open_by_line[r["line"]] = s
+                self.sessions.setdefault(r["user"], deque(maxlen=self.limit)).append(s)
+            elif r["type"] == DEAD_PROCESS:
+                s = open_by_line.pop(r["line"], None)
+                if s is not None:
+                    s["logout"] = r["time"]
+            elif r["type"] == BOOT_TIME:
+                # a reboot ends every open session
+                for s in open_by_line.values():
+                    s["logout"] = r["time"]
+                open_by_line.clear()
+
+    def _load_btmp(self, path: str, only: Optional[str]):
+        for r in iter_records(path):
+            user = r["user"]
+            if not user or (only and user != only):
+                continue
+            self.failed_count[user] = self.failed_count.get(user, 0) + 1
+            self.failed_recent.setdefault(user, deque(maxlen=self.limit)).append(
+                {"host": r["host"], "line": r["line"], "time": r["time"]})
+
+    def last(self, username: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Most recent sessions first."""
+        sessions = list(self.sessions.get(username, ()))[::-1]
+        return sessions[:limit] if limit else sessions
+
+    def failed(self, username: str) -> Dict[str, Any]:
+        return {
+            "count": self.failed_count.get(username, 0),
+            "recent": list(self.failed_recent.get(username, ()))[::-1],
+        }
+
+
+def lastlog_entry(uid: int, path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """The lastlog record of ``uid`` (seek to uid * record size), None if never logged in."""
+    try:
+        with open(path or rooted(LASTLOG_PATH), "rb") as fh:
+            fh.seek(uid * LASTLOG.size)
+            raw = fh.read(LASTLOG.size)
+    except (OSError, OverflowError):
+        return None
+    if len(raw) < LASTLOG.size:
+        return None
+    ll_time, line, host = LASTLOG.unpack(raw)
+    if not ll_time:
+        return None
+    return {"time": ll_time, "line": _str(line), "host": _str(host)}
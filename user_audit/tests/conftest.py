@@ -0,0 +1,28 @@
+import pytest
+
+from src.bench import make_fake_root
+from src.utils import set_root
+
+USERS = 60
+
+
+@pytest.fixture(scope="session")
+def fake_root(tmp_path_factory):
+    """A synthetic host (see bench.make_fake_root), built once per session."""
+    root = str(tmp_path_factory.mktemp("root"))
+    make_fake_root(root, users=USERS, procs_per_user=1, auth_mb=0.05, logins_per_user=3,
+                   history_lines=40, home_depth=1, home_fanout=1, files_per_dir=1)
+    return root
+
+
+@pytest.fixture
+def rooted_at(fake_root):
+    """Point the audit at ``fake_root`` for one test."""
+    set_root(fake_root)
+    yield fake_root
+    set_root(None)
+
+
+@pytest.fixture
+def names():
+    return [f"user{i:05d}" for i in range(USERS)]
@@ -0,0 +1,60 @@
+import gzip
+import time
+
+import pytest
+
+from src.authlog import parse_event, parse_since, reverse_lines, tail_log, user_events
+
+
+def _stamp(t: float) -> str:
+    return time.strftime("%b %d %H:%M:%S", time.localtime(t))
+
+
+def test_reverse_lines_small_blocks(tmp_path):
+    lines = [f"line {i} " + "x" * (i % 7) for i in range(50)]
+    path = tmp_path / "log"
+    path.write_text("\n".join(lines) + "\n")
+    assert list(reverse_lines(str(path), block_size=5)) == lines[::-1]
+    path.write_text("only\n\nno newline")
+    assert list(reverse_lines(str(path), block_size=3)) == ["no newline", "only"]
+
+
+def test_tail_log_rotations(tmp_path):
+    now = time.time()
+    # 30 lines a minute apart, oldest in the .2.gz rotation, newest in auth.log
+    lines = [f"{_stamp(now - (30 - i) * 60)} host sshd[1]: event {i}" for i in range(30)]
+    base = tmp_path / "auth.log"
+    with gzip.open(f"{base}.2.gz", "wt") as fh:
+        fh.write("\n".join(lines[:10]) + "\n")
+    (tmp_path / "auth.log.1").write_text("\n".join(lines[10:20]) + "\n")
+    base.write_text("\n".join(lines[20:]) + "\n")
+    assert tail_log(str(base)) == lines
+    assert tail_log(str(base), max_lines=15) == lines[15:]
+    # the window ends at the first line older than it
+    assert tail_log(str(base), since=now - 25.5 * 60) == lines[5:]
+
+
+def test_parse_since():
+    assert parse_since(None) is None
+    assert abs(parse_since("2h") - (time.time() - 7200)) < 5
+    assert abs(parse_since("90") - (time.time() - 90)) < 5
+    for bad in ("abc", "-1d", "3x", "infd"):
+        with pytest.raises(ValueError):
+            parse_since(bad)
+
+
+def test_parse_event():
+    assert parse_event("sshd[1]: Failed password for invalid user bob from 203.0.113.4 port 22 ssh2") is not None
+    ev = parse_event("Jan  1 00:00:00 host sshd[1]: Accepted publickey for alice from 10.0.0.9 port 22 ssh2")
+    assert ev == {"user": "alice", "ip": "10.0.0.9", "result": "accepted", "method": "publickey"}
+    assert parse_event("sshd[1]: Invalid user eve from 198.51.100.2 port 22") == {
+        "user": "eve", "ip": "198.51.100.2", "result": "invalid_user", "method": None}
+    assert parse_event("CRON[2]: pam_unix(cron:session): session opened") is None
+
+
+def test_fake_root_auth_log(fake_root, names):
+    lines = tail_log(f"{fake_root}/var/log/auth.log")
+    events = [e for n in names for e in user_events(lines, n)]
+    assert len(events) == len(lines)
+    assert {e["result"] for e in events} == {"accepted", "failed"}
+    assert all(e["time"] for e in events)
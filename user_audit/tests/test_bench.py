@@ -0,0 +1,13 @@
+import pytest
+
+from src.audit import iter_audit_all_users
+from .conftest import USERS
+
+pytest.importorskip("pytest_benchmark")
+
+
+def test_audit_all_users(benchmark, rooted_at):
+    reports = benchmark(lambda: list(iter_audit_all_users(jobs=1)))
+    # the system accounts plus the generated ones
+    assert len(reports) == USERS + 4
+    assert all("errors" not in r["report"] for r in reports)
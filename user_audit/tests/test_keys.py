@@ -0,0 +1,73 @@
+import base64
+import hashlib
+import struct
+
+from src.keys import KeyIndex, key_problems, parse_authorized_keys, parse_key_line, read_user_keys
+
+
+def _string(b: bytes) -> bytes:
+    return struct.pack(">I", len(b)) + b
+
+
+def _ed25519(pub: bytes = b"\x01" * 32, extra: bytes = b"") -> bytes:
+    return _string(b"ssh-ed25519") + _string(pub) + extra
+
+
+def _line(blob: bytes, ktype: str = "ssh-ed25519", rest: str = "alice@laptop") -> str:
+    return f"{ktype} {base64.b64encode(blob).decode()} {rest}"
+
+
+def test_fingerprint_and_bits():
+    blob = _ed25519()
+    k = parse_key_line(_line(blob))
+    assert k["type"] == "ssh-ed25519"
+    assert k["bits"] == 256
+    assert k["comment"] == "alice@laptop"
+    assert k["fingerprint"] == "SHA256:" + base64.b64encode(hashlib.sha256(blob).digest()).decode().rstrip("=")
+
+
+def test_rsa_bits_from_modulus():
+    n = (1 << 2047) | 1
+    blob = _string(b"ssh-rsa") + _string(b"\x01\x00\x01") + _string(b"\x00" + n.to_bytes(256, "big"))
+    k = parse_key_line(_line(blob, "ssh-rsa"))
+    assert k["bits"] == 2048
+    assert key_problems(k) == []
+
+
+def test_bad_blobs():
+    assert parse_key_line(_line(_ed25519()[:-4]))["error"] == "truncated key blob"
+    assert parse_key_line(_line(_ed25519(extra=b"junk")))["error"] == "trailing data in key blob"
+    assert parse_key_line(_line(_ed25519(pub=b"\x01" * 16)))["error"] == "bad public key length"
+    assert "error" in parse_key_line(_line(_ed25519(), "ssh-rsa"))
+    assert parse_key_line("ssh-ed25519 !!notbase64!!")["error"] == "bad base64 key blob"
+    assert parse_key_line("# comment") is None
+    assert parse_key_line("   ") is None
+
+
+def test_options():
+    line = 'command="/usr/bin/rrsync \\"/backup\\"",no-pty,permitopen="a:1",permitopen="b:2" ' + _line(_ed25519())
+    k = parse_key_line(line)
+    assert k["options"] == {"command": '/usr/bin/rrsync "/backup"', "no-pty": True, "permitopen": ["a:1", "b:2"]}
+    assert key_problems(k) == ["forced command '/usr/bin/rrsync \"/backup\"'"]
+
+
+def test_invalid_line_numbers():
+    keys, invalid = parse_authorized_keys("\n".join(["# keys", _line(_ed25519()), "garbage", ""]))
+    assert [k["line"] for k in keys] == [2]
+    assert invalid == [3]
+
+
+def test_fake_root_keys(fake_root, names):
+    entry = read_user_keys(f"{fake_root}/home/user00031")
+    assert [k["comment"] for k in entry["keys"]] == ["user00031@laptop", "backup"]
+    assert entry["keys"][1]["options"] == {"command": "/usr/bin/rrsync /backup", "no-pty": True}
+    assert all(k["file"] == "authorized_keys" and k["bits"] == 256 for k in entry["keys"])
+    assert entry["invalid"] == []
+
+
+def test_key_index_shared(fake_root, names):
+    idx = KeyIndex.load({n: f"{fake_root}/home/{n}" for n in names})
+    assert list(idx.shared().values()) == [names[::7]]
+    shared = [k for k in idx.annotate("user00007", idx.for_user("user00007")["keys"]) if "shared_with" in k]
+    assert [k["comment"] for k in shared] == ["deploy@ci"]
+    assert shared[0]["shared_with"] == [n for n in names[::7] if n != "user00007"]
@@ -0,0 +1,55 @@
+import os
+
+from src.privileges import PrivilegeIndex, staleness
+
+
+def _users(names):
+    users = {"root": (0, 0), "daemon": (1, 1)}
+    users.update({n: (1000 + i, 1000 + i) for i, n in enumerate(names)})
+    return users
+
+
+def test_groups_and_sudo(rooted_at, names):
+    idx = PrivilegeIndex.load(_users(names))
+    assert idx.groups["sudo"]["members"] == set(names[::50])
+    assert idx.groups_of("user00050") == ["sudo", "user00050"]
+    assert idx.sudoers_files == [os.path.join(rooted_at, "etc/sudoers"), os.path.join(rooted_at, "etc/sudoers.d/app")]
+    assert idx.user_aliases == {"DEPLOY": names[1::40]}
+    [rule] = idx.sudo_of("user00050")
+    assert (rule["via"], rule["all_commands"], rule["nopasswd"]) == ("group sudo", True, False)
+    [rule] = idx.sudo_of("user00041")
+    assert rule["nopasswd"] and not rule["all_commands"]
+    assert rule["commands"] == "/usr/bin/systemctl restart app"
+    assert rule["source"].endswith("sudoers.d/app:2")
+    assert idx.sudo_of("user00002") == []
+    assert idx.shadow_of("root")["password"] == "locked"
+    assert idx.shadow_of("user00002")["password"] == "set"
+
+
+def test_gshadow_admins(rooted_at, names):
+    path = os.path.join(rooted_at, "etc/gshadow")
+    with open(path, "w") as fh:
+        fh.write("sudo:!:user00003:user00004\nmissing:!:user00005:\n")
+    try:
+        idx = PrivilegeIndex.load(_users(names))
+    finally:
+        os.remove(path)
+    assert idx.admin_groups_of("user00003") == ["sudo"]
+    assert idx.admin_groups_of("user00005") == []
+    # gshadow members count as members
+    assert "user00004" in idx.groups["sudo"]["members"]
+    assert "sudo" in idx.groups_of("user00004")
+
+
+def test_staleness():
+    now = 100 * 86400.0
+    shadow = {"password": "set", "last_change": 10}
+    out = staleness(shadow, now - 5 * 86400, 30, now=now)
+    assert out["reasons"] == ["password unchanged for 90 days"]
+    assert out["days_since_login"] == 5 and out["stale"]
+    out = staleness({"password": "set", "last_change": 95}, now - 40 * 86400, 30, now=now)
+    assert out["reasons"] == ["no login for 40 days"]
+    assert not staleness({"password": "set", "last_change": 95}, None, 30, now=now)["stale"]
+    out = staleness({"password": "set", "last_change": 95}, None, 30, now=now, privileged=True)
+    assert out["reasons"] == ["privileged account has never logged in"]
+    assert not staleness({"password": "locked", "last_change": 95}, None, 30, now=now, privileged=True)["stale"]
@@ -0,0 +1,67 @@
+from src.wtmp import (BOOT_TIME, DEAD_PROCESS, LASTLOG, USER_PROCESS, UTMP, LoginIndex, iter_records,
+                      lastlog_entry)
+
+T = 1_700_000_000
+
+
+def _rec(kind, user, line, host, t, addr=b""):
+    return UTMP.pack(kind, 42, line.encode(), b"", user.encode(), host.encode(), 0, 0, 0, t, 500000, addr, b"")
+
+
+def _write(path, records):
+    path.write_bytes(b"".join(records))
+    return str(path)
+
+
+def test_iter_records(tmp_path):
+    path = _write(tmp_path / "wtmp", [_rec(USER_PROCESS, "alice", "pts/0", "10.0.0.9", T, b"\x0a\x00\x00\x09"),
+                                      b"\0" * 10])
+    recs = list(iter_records(path))
+    # the partial trailing record is ignored
+    assert recs == [{"type": USER_PROCESS, "pid": 42, "line": "pts/0", "user": "alice", "host": "10.0.0.9",
+                     "time": T + 0.5, "addr": "10.0.0.9"}]
+    assert list(iter_records(str(tmp_path / "missing"))) == []
+
+
+def test_sessions(tmp_path):
+    wtmp = _write(tmp_path / "wtmp", [
+        _rec(USER_PROCESS, "alice", "pts/0", "a", T),
+        _rec(DEAD_PROCESS, "", "pts/0", "", T + 60),
+        _rec(USER_PROCESS, "alice", "pts/1", "b", T + 100),
+        _rec(USER_PROCESS, "bob", "pts/2", "c", T + 200),
+        _rec(BOOT_TIME, "reboot", "~", "", T + 300),
+        _rec(USER_PROCESS, "bob", "pts/2", "d", T + 400),
+    ])
+    idx = LoginIndex.load(wtmp=wtmp, btmp=str(tmp_path / "btmp"))
+    assert [(s["host"], s["logout"]) for s in idx.last("alice")] == [("b", T + 300.5), ("a", T + 60.5)]
+    assert [(s["host"], s["logout"]) for s in idx.last("bob")] == [("d", None), ("c", T + 300.5)]
+    assert len(idx.last("alice", 1)) == 1
+    only = LoginIndex.load(wtmp=wtmp, btmp=str(tmp_path / "btmp"), only="bob")
+    assert set(only.sessions) == {"bob"}
+
+
+def test_failed(tmp_path):
+    btmp = _write(tmp_path / "btmp", [_rec(6, "alice", "ssh:notty", f"h{i}", T + i) for i in range(4)])
+    idx = LoginIndex.load(limit=2, wtmp=str(tmp_path / "wtmp"), btmp=btmp)
+    failed = idx.failed("alice")
+    assert failed["count"] == 4
+    assert [f["host"] for f in failed["recent"]] == ["h3", "h2"]
+    assert idx.failed("bob") == {"count": 0, "recent": []}
+
+
+def test_lastlog(tmp_path):
+    path = tmp_path / "lastlog"
+    with open(path, "wb") as fh:
+        fh.seek(1001 * LASTLOG.size)
+        fh.write(LASTLOG.pack(T, b"pts/3", b"10.0.0.9"))
+    assert lastlog_entry(1001, str(path)) == {"time": T, "line": "pts/3", "host": "10.0.0.9"}
+    assert lastlog_entry(1000, str(path)) is None
+    assert lastlog_entry(5000, str(path)) is None
+
+
+def test_fake_root_logins(rooted_at, names):
+    idx = LoginIndex.load()
+    assert all(len(idx.last(n)) == 3 and all(s["logout"] for s in idx.last(n)) for n in names)
+    assert {n for n in names if idx.failed(n)["count"]} == set(names[::13])
+    assert idx.failed("user00013")["count"] == 6
+    assert lastlog_entry(1005)["host"] == "10.0.0.9"